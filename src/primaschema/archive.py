@@ -0,0 +1,201 @@
+"""Single-file indexed zip archives of built scheme trees"""
+import hashlib
+import io
+import json
+import logging
+import mmap
+import shutil
+import struct
+import zipfile
+from pathlib import Path
+
+import primaschema.lib as lib
+from primaschema import __version__
+from primaschema.store import atomic_path
+
+
+ARCHIVE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+OBJECTS_DIR = "objects"
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)  # Fixed so that archives are reproducible
+LOCAL_HEADER = struct.Struct("<4s22xHH")  # signature, name length, extra length
+
+
+def collect_files(root_dir: Path) -> dict[str, dict[str, Path]]:
+    """Return paths of the files of each bundle in a tree, keyed by bundle path"""
+    root_dir = Path(root_dir)
+    return {
+        scheme_dir.relative_to(root_dir).as_posix(): {
+            path.name: path
+            for path in sorted(scheme_dir.iterdir())
+            if path.is_file()
+            and not path.name.startswith(".")
+            and not path.name.endswith(lib.INDEX_SUFFIXES)
+        }
+        for scheme_dir in lib.find_scheme_dirs(root_dir)
+    }
+
+
+def data_offsets(archive_path: Path, infos: list[zipfile.ZipInfo]) -> dict[str, int]:
+    """Return the offset of each member's data, found from its local header"""
+    offsets = {}
+    with open(archive_path, "rb") as fh:
+        for info in infos:
+            fh.seek(info.header_offset)
+            signature, name_length, extra_length = LOCAL_HEADER.unpack(
+                fh.read(LOCAL_HEADER.size)
+            )
+            if signature != b"PK\x03\x04":
+                raise RuntimeError(f"Bad local header for {info.filename}")
+            offsets[info.filename] = (
+                info.header_offset + LOCAL_HEADER.size + name_length + extra_length
+            )
+    return offsets
+
+
+def pack(root_dir: Path, archive_path: Path, compress: bool = False) -> dict:
+    """
+    Pack the bundles of a built tree into a zip archive holding one member per
+    distinct file, named by its SHA256 digest, so that a reference shared by
+    many bundles is stored once. A manifest member maps each bundle's file
+    names to digests, and each digest to the byte offset and size of its data.
+    Members are stored uncompressed unless compress=True, so that readers can
+    slice them straight out of the archive. Returns the manifest
+    """
+    files = collect_files(root_dir)
+    if not files:
+        raise RuntimeError(f"No schemes found in {root_dir}")
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    schemes, paths = {}, {}
+    for scheme, scheme_files in files.items():
+        schemes[scheme] = {}
+        for name, path in scheme_files.items():
+            digest = lib.file_digest(path)
+            schemes[scheme][name] = digest
+            paths.setdefault(digest, path)
+    with atomic_path(archive_path) as temp_path:
+        with zipfile.ZipFile(temp_path, "w") as zf:
+            for digest, path in paths.items():
+                info = zipfile.ZipInfo(f"{OBJECTS_DIR}/{digest}", ZIP_DATE_TIME)
+                info.compress_type = compression
+                info.file_size = path.stat().st_size
+                with open(path, "rb") as src_fh, zf.open(info, "w") as dest_fh:
+                    shutil.copyfileobj(src_fh, dest_fh, 1 << 20)
+            infos = zf.infolist()
+        offsets = data_offsets(temp_path, infos)
+        manifest = {
+            "primaschema_version": __version__,
+            "format": ARCHIVE_FORMAT,
+            "schemes": schemes,
+            "objects": {
+                info.filename.removeprefix(f"{OBJECTS_DIR}/"): {
+                    "member": info.filename,
+                    "offset": offsets[info.filename],
+                    "size": info.file_size,
+                    "compressed_size": info.compress_size,
+                    "compression": "deflate" if compress else "stored",
+                }
+                for info in infos
+            },
+        }
+        with zipfile.ZipFile(temp_path, "a") as zf:
+            info = zipfile.ZipInfo(MANIFEST_NAME, ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zf.writestr(info, json.dumps(manifest, indent=1))
+    n_files = sum(map(len, schemes.values()))
+    logging.info(
+        f"Packed {len(schemes)} schemes ({n_files} files, {len(paths)} distinct) into {archive_path}"
+    )
+    return manifest
+
+
+class SchemeArchive:
+    """
+    Read-only access to the bundles of a packed archive without unpacking it.
+    Stored members are sliced from a memory map of the archive using the
+    offsets in its manifest, and compressed members are inflated on demand
+    """
+
+    def __init__(self, archive_path: Path):
+        self.path = Path(archive_path)
+        self._zip = zipfile.ZipFile(self.path)
+        try:
+            manifest = json.loads(self._zip.read(MANIFEST_NAME))
+        except KeyError:
+            self._zip.close()
+            raise RuntimeError(f"{self.path} is not a primaschema archive")
+        if manifest.get("format") != ARCHIVE_FORMAT:
+            self._zip.close()
+            raise RuntimeError(
+                f"Unsupported archive format {manifest.get('format')} in {self.path}"
+            )
+        self.manifest = manifest
+        self._fh = open(self.path, "rb")
+        self._data = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __repr__(self):
+        return f"SchemeArchive({str(self.path)!r}, {len(self.schemes())} schemes)"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._data.close()
+        self._fh.close()
+        self._zip.close()
+
+    def schemes(self) -> list[str]:
+        """Return the paths of bundles in the archive"""
+        return list(self.manifest["schemes"])
+
+    def files(self, scheme: str) -> list[str]:
+        """Return the names of a bundle's files"""
+        return list(self._scheme(scheme))
+
+    def _scheme(self, scheme: str) -> dict[str, str]:
+        try:
+            return self.manifest["schemes"][scheme]
+        except KeyError:
+            raise RuntimeError(f"Scheme {scheme} not found in {self.path}")
+
+    def object(self, scheme: str, name: str) -> dict:
+        """Return the manifest entry of a bundle file, including its digest"""
+        try:
+            digest = self._scheme(scheme)[name]
+        except KeyError:
+            raise RuntimeError(f"File {name} not found in scheme {scheme}")
+        return {"digest": digest, **self.manifest["objects"][digest]}
+
+    def read(self, scheme: str, name: str, verify: bool = False) -> bytes:
+        """Return the contents of a bundle file, optionally checking its digest"""
+        obj = self.object(scheme, name)
+        if obj["compression"] == "stored":
+            data = self._data[obj["offset"] : obj["offset"] + obj["size"]]
+        else:
+            data = self._zip.read(obj["member"])
+        if verify and hashlib.sha256(data).hexdigest() != obj["digest"]:
+            raise RuntimeError(f"Checksum mismatch for {scheme}/{name}")
+        return data
+
+    def open(self, scheme: str, name: str):
+        """Open a bundle file for binary reading"""
+        obj = self.object(scheme, name)
+        if obj["compression"] == "stored":
+            return io.BytesIO(self.read(scheme, name))
+        return self._zip.open(obj["member"])
+
+    def info(self, scheme: str) -> dict:
+        """Return the parsed info.yml of a bundle"""
+        import yaml
+
+        return yaml.safe_load(self.read(scheme, "info.yml"))
+
+    def extract(self, scheme: str, out_dir: Path):
+        """Write the files of one bundle to out_dir"""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name in self.files(scheme):
+            lib.write_bytes_atomic(out_dir / name, self.read(scheme, name, verify=True))
@@ -0,0 +1,199 @@
+import csv
+import sys
+from array import array
+from itertools import chain, islice
+from operator import itemgetter
+from pathlib import Path
+
+from primaschema import metrics
+from primaschema.compression import open_text
+
+
+SCHEME_BED_FIELDS = ["chrom", "chromStart", "chromEnd", "name", "poolName", "strand"]
+PRIMER_BED_FIELDS = SCHEME_BED_FIELDS + ["sequence"]
+BED_FIELD_TYPES = dict(
+    chrom=str,
+    chromStart=int,
+    chromEnd=int,
+    name=str,
+    poolName=int,
+    strand=str,
+    sequence=str,
+)
+INTERNED_FIELDS = {"chrom", "name", "strand"}
+
+
+class BedParseError(RuntimeError):
+    """Invalid record in a bed file, reporting its line number"""
+
+    def __init__(self, bed_path: Path, line_num: int, message: str):
+        self.bed_path = bed_path
+        self.line_num = line_num
+        super().__init__(f"Invalid record at line {line_num} of {bed_path}: {message}")
+
+
+def _new_column(field: str):
+    return array("q") if BED_FIELD_TYPES[field] is int else []
+
+
+class BedTable:
+    """
+    Columnar bed table with coordinates and pools held in array('q') columns and
+    interned chrom, name and strand strings. column_count is the number of
+    columns found in the first record of the file the table was read from
+    """
+
+    def __init__(self, columns: dict, column_count: int | None = None):
+        self.columns = columns
+        self.column_count = len(columns) if column_count is None else column_count
+
+    @classmethod
+    def from_records(cls, records, fields: list[str] = PRIMER_BED_FIELDS):
+        table = cls({field: _new_column(field) for field in fields})
+        for record in records:
+            table.append(record)
+        return table
+
+    def __repr__(self):
+        return f"BedTable({len(self)} records, fields={self.fields})"
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def __iter__(self):
+        return zip(*self.columns.values())
+
+    def __getitem__(self, field: str):
+        return self.columns[field]
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self.columns)
+
+    def append(self, record: tuple):
+        for column, value in zip(self.columns.values(), record):
+            column.append(value)
+
+    def records(self, fields: list[str] | None = None):
+        """Yield record tuples, optionally of a subset of fields"""
+        if fields is None:
+            return iter(self)
+        return zip(*(self.columns[field] for field in fields))
+
+    def select(self, fields: list[str]) -> "BedTable":
+        """Return a table sharing the columns of a subset of fields"""
+        return BedTable({field: self.columns[field] for field in fields})
+
+    def assign(self, **columns) -> "BedTable":
+        """Return a table with columns added or replaced"""
+        return BedTable(self.columns | columns)
+
+    def write(self, bed_path: Path):
+        """Write a headerless tab separated bed file"""
+        with open(bed_path, "w", newline="") as fh:
+            csv.writer(fh, delimiter="\t", lineterminator="\n").writerows(self)
+
+    def to_pandas(self):
+        """Return a DataFrame with the dtypes of parse_primer_bed()"""
+        import numpy as np
+        import pandas as pd
+
+        return pd.DataFrame(
+            {
+                field: (
+                    np.array(column, dtype=np.int64)
+                    if isinstance(column, array)
+                    else pd.Series(column, dtype=object)
+                )
+                for field, column in self.columns.items()
+            }
+        )
+
+
+def _iter_rows(fh):
+    """Yield line numbers and fields of non-empty tab separated rows"""
+    reader = csv.reader(fh, delimiter="\t")
+    for row in reader:
+        if row:
+            yield reader.line_num, row
+
+
+def _converters(fields: list[str]):
+    return [
+        sys.intern if field in INTERNED_FIELDS else BED_FIELD_TYPES[field]
+        for field in fields
+    ]
+
+
+def _convert_row(bed_path, line_num, row, fields, converters) -> tuple:
+    """
+    Return a typed record from row fields, treating missing trailing columns as
+    empty strings as pandas did
+    """
+    if len(row) > len(fields):
+        raise BedParseError(
+            bed_path, line_num, f"expected {len(fields)} columns, found {len(row)}"
+        )
+    row += [""] * (len(fields) - len(row))
+    try:
+        return tuple(convert(value) for convert, value in zip(converters, row))
+    except ValueError as e:
+        raise BedParseError(bed_path, line_num, str(e)) from e
+
+
+def iter_bed_records(bed_path: Path, fields: list[str] = PRIMER_BED_FIELDS):
+    """Lazily yield typed tuples of bed records"""
+    converters = _converters(fields)
+    with open_text(bed_path, newline="") as fh:
+        for line_num, row in _iter_rows(fh):
+            yield _convert_row(bed_path, line_num, row, fields, converters)
+
+
+def _extend_columns(table: BedTable, rows: list[list[str]], converters) -> bool:
+    """
+    Append a chunk of rows to the columns of a table, column by column. Returns
+    False if a row has too many columns or a value cannot be converted
+    """
+    n_fields = len(table.columns)
+    widths = set(map(len, rows))
+    if max(widths) > n_fields:
+        return False
+    elif widths != {n_fields}:
+        rows = [row + [""] * (n_fields - len(row)) for row in rows]
+    try:
+        for i, (column, convert) in enumerate(zip(table.columns.values(), converters)):
+            column.extend(map(convert, map(itemgetter(i), rows)))
+    except ValueError:
+        return False
+    return True
+
+
+@metrics.timed
+def read_bed(
+    bed_path: Path, fields: list[str] | None = None, chunk_size: int = 8192
+) -> BedTable:
+    """
+    Read a bed file into a BedTable in a single pass, converting chunks of rows
+    a column at a time. Without fields, the 6 or 7 column layout is chosen by
+    the column count of the first record. Invalid records raise BedParseError
+    """
+    with open_text(bed_path, newline="") as fh:
+        rows = filter(None, csv.reader(fh, delimiter="\t"))
+        first = next(rows, None)
+        column_count = len(first) if first else 0
+        if fields is None:
+            fields = PRIMER_BED_FIELDS if column_count >= 7 else SCHEME_BED_FIELDS
+        table = BedTable(
+            {field: _new_column(field) for field in fields}, column_count=column_count
+        )
+        converters = _converters(fields)
+        rows = chain([first], rows) if first else rows
+        while chunk := list(islice(rows, chunk_size)):
+            if not _extend_columns(table, chunk, converters):
+                break
+        else:
+            return table
+    # Reread the file record by record to report the line of the invalid record
+    for _ in iter_bed_records(bed_path, fields):
+        pass
+    raise BedParseError(bed_path, 0, "unknown error")
@@ -0,0 +1,329 @@
+"""Benchmarks of primaschema operations on synthetic primer scheme bundles"""
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import primaschema.lib as lib
+from primaschema import __version__
+
+
+BENCHMARKS = [
+    "hash_bed",
+    "hash_ref",
+    "convert_scheme_bed_to_primer_bed",
+    "diff",
+    "validate",
+    "build_recursive",
+]
+
+# Coordinates are kept this far from contig ends
+CONTIG_MARGIN = 30
+
+
+def generate_reference(
+    out_path: Path, genome_length: int, contigs: int = 1, seed: int = 0
+) -> list[str]:
+    """Write a random multi-record FASTA reference, returning its contig names"""
+    rng = random.Random(seed)
+    names = [f"contig_{i + 1}" for i in range(contigs)]
+    contig_length = genome_length // contigs
+    with open(out_path, "w") as fh:
+        for name in names:
+            sequence = "".join(rng.choices("ACGT", k=contig_length))
+            fh.write(f">{name}\n")
+            for i in range(0, contig_length, 60):
+                fh.write(sequence[i : i + 60] + "\n")
+    return names
+
+
+def tiling_step(contig_length: int, amplicons_per_contig: int) -> int:
+    """Return the distance between starts of consecutive half-overlapping amplicons"""
+    step = (contig_length - 2 * CONTIG_MARGIN) // (amplicons_per_contig + 1)
+    if step < 60:
+        raise RuntimeError(
+            f"Contig length {contig_length} too short for {amplicons_per_contig} amplicons"
+        )
+    return step
+
+
+def generate_scheme_records(
+    contig_names: list[str],
+    contig_length: int,
+    amplicons: int,
+    alt_fraction: float = 0.0,
+    pools: int = 2,
+    seed: int = 0,
+) -> list[tuple]:
+    """
+    Return scheme.bed records tiling amplicons across contigs, with overlapping
+    amplicons assigned to pools in rotation and alt primers offset by a few bases
+    """
+    rng = random.Random(seed)
+    per_contig = -(-amplicons // len(contig_names))
+    step = tiling_step(contig_length, per_contig)
+    records = []
+    for n in range(amplicons):
+        chrom = contig_names[n // per_contig]
+        start = CONTIG_MARGIN + n % per_contig * step
+        end = start + 2 * step
+        pool = n % pools + 1
+        for side, strand in (("LEFT", "+"), ("RIGHT", "-")):
+            name = f"SYN_{n + 1}_{side}"
+            length = rng.randint(20, 28)
+            if strand == "+":
+                records.append((chrom, start, start + length, name, pool, strand))
+            else:
+                records.append((chrom, end - length, end, name, pool, strand))
+            if rng.random() < alt_fraction:
+                offset = rng.randint(1, 5)
+                offset = offset if strand == "+" else -offset
+                _, alt_start, alt_end, *_ = records[-1]
+                records.append(
+                    (
+                        chrom,
+                        alt_start + offset,
+                        alt_end + offset,
+                        f"{name}_alt1",
+                        pool,
+                        strand,
+                    )
+                )
+    return records
+
+
+def generate_scheme(
+    out_dir: Path,
+    amplicons: int = 100,
+    genome_length: int | None = None,
+    alt_fraction: float = 0.1,
+    contigs: int = 1,
+    pools: int = 2,
+    seed: int = 0,
+) -> Path:
+    """
+    Write a synthetic scheme bundle with info.yml, reference.fasta, scheme.bed
+    and primer.bed. Genome length defaults to 400bp per amplicon
+    """
+    import yaml
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    genome_length = genome_length or amplicons * 400 + 2 * CONTIG_MARGIN * contigs
+    ref_path = out_dir / "reference.fasta"
+    names = generate_reference(ref_path, genome_length, contigs=contigs, seed=seed)
+    records = generate_scheme_records(
+        names,
+        genome_length // contigs,
+        amplicons,
+        alt_fraction=alt_fraction,
+        pools=pools,
+        seed=seed,
+    )
+    lib.write_bed_records(records, out_dir / "scheme.bed")
+    lib.convert_scheme_bed_to_primer_bed(out_dir / "scheme.bed", ref_path, out_dir)
+    info = {
+        "schema_version": "0.9.0",
+        "name": f"synthetic-{out_dir.name}",
+        "organism": "sars-cov-2",  # Must be an organism known to the schema
+        "developers": [{"person_name": "Primaschema Benchmark"}],
+        "amplicon_size": 2
+        * tiling_step(genome_length // contigs, -(-amplicons // contigs)),
+        "primer_checksum": lib.hash_bed(out_dir / "primer.bed"),
+        "reference_checksum": lib.hash_ref(ref_path),
+    }
+    with open(out_dir / "info.yml", "w") as fh:
+        yaml.dump(info, fh, sort_keys=False)
+    return out_dir
+
+
+def time_call(func, repeats: int = 3, setup=None) -> dict:
+    """
+    Return the minimum and mean wall time in seconds of repeated calls, after an
+    untimed call which loads lazily imported dependencies
+    """
+    if setup:
+        setup()
+    func()
+    timings = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "min": min(timings),
+        "mean": sum(timings) / len(timings),
+        "repeats": repeats,
+    }
+
+
+def benchmark_scheme(
+    scheme_dir: Path, work_dir: Path, repeats: int = 3, benchmarks=BENCHMARKS
+) -> dict:
+    """
+    Time primaschema operations on a scheme bundle, using work_dir for outputs.
+    build_recursive is timed on the directory containing the bundle
+    """
+    primer_bed_path = scheme_dir / "primer.bed"
+    scheme_bed_path = scheme_dir / "scheme.bed"
+    ref_path = scheme_dir / "reference.fasta"
+    # A second primer.bed with every tenth record removed for diffing
+    other_bed_path = work_dir / "other.bed"
+    records = list(lib.iter_bed_records(primer_bed_path))
+    lib.write_bed_records((r for i, r in enumerate(records) if i % 10), other_bed_path)
+
+    def build_recursive():
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            lib.build_recursive(
+                scheme_dir.parent,
+                force=True,
+                state_path=work_dir / "state.json",
+                full=True,
+            )
+        finally:
+            os.chdir(cwd)
+
+    calls = {
+        "hash_bed": (lambda: lib.hash_bed(primer_bed_path), None),
+        "hash_ref": (lambda: lib.hash_ref(ref_path), None),
+        "convert_scheme_bed_to_primer_bed": (
+            lambda: lib.convert_scheme_bed_to_primer_bed(
+                scheme_bed_path, ref_path, work_dir
+            ),
+            None,
+        ),
+        "diff": (lambda: lib.diff(primer_bed_path, other_bed_path), None),
+        "validate": (lambda: lib.validate(scheme_dir), None),
+        "build_recursive": (
+            build_recursive,
+            lambda: shutil.rmtree(work_dir / "built", ignore_errors=True),
+        ),
+    }
+    timings = {}
+    for name in benchmarks:
+        func, setup = calls[name]
+        logging.info(f"Timing {name} on {scheme_dir.name}")
+        timings[name] = time_call(func, repeats=repeats, setup=cold_start(setup))
+    return timings
+
+
+def cold_start(setup=None):
+    """
+    Return a setup function which forgets in-process file digests before
+    calling setup, so that timed calls reread their inputs
+    """
+
+    def func():
+        lib._file_digest.cache_clear()
+        if setup:
+            setup()
+
+    return func
+
+
+def run_benchmarks(
+    amplicons: list[int],
+    genome_length: int | None = None,
+    alt_fraction: float = 0.1,
+    contigs: int = 1,
+    pools: int = 2,
+    repeats: int = 3,
+    work_dir: Path | None = None,
+    benchmarks: list[str] = BENCHMARKS,
+    seed: int = 0,
+) -> dict:
+    """
+    Generate a synthetic scheme for each amplicon count and time it, with the
+    persistent checksum cache disabled so that checksums are computed each time
+    """
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        raise RuntimeError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    cache_size = os.environ.get("PRIMASCHEMA_CHECKSUM_CACHE_SIZE")
+    os.environ["PRIMASCHEMA_CHECKSUM_CACHE_SIZE"] = "0"
+    try:
+        results = _run_benchmarks(
+            amplicons,
+            genome_length=genome_length,
+            alt_fraction=alt_fraction,
+            contigs=contigs,
+            pools=pools,
+            repeats=repeats,
+            work_dir=work_dir,
+            benchmarks=benchmarks,
+            seed=seed,
+        )
+    finally:
+        if cache_size is None:
+            del os.environ["PRIMASCHEMA_CHECKSUM_CACHE_SIZE"]
+        else:
+            os.environ["PRIMASCHEMA_CHECKSUM_CACHE_SIZE"] = cache_size
+    return {
+        "primaschema_version": __version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "results": results,
+    }
+
+
+def _run_benchmarks(
+    amplicons: list[int],
+    genome_length: int | None,
+    alt_fraction: float,
+    contigs: int,
+    pools: int,
+    repeats: int,
+    work_dir: Path | None,
+    benchmarks: list[str],
+    seed: int,
+) -> list[dict]:
+    with tempfile.TemporaryDirectory(prefix="primaschema-benchmark-") as tmp_dir:
+        work_dir = Path(work_dir or tmp_dir).resolve()
+        results = []
+        for n_amplicons in amplicons:
+            scale = {
+                "amplicons": n_amplicons,
+                "genome_length": genome_length,
+                "alt_fraction": alt_fraction,
+                "contigs": contigs,
+                "pools": pools,
+            }
+            scale_dir = work_dir / f"a{n_amplicons}"
+            scheme_dir = generate_scheme(
+                scale_dir / "scheme" / f"a{n_amplicons}",
+                amplicons=n_amplicons,
+                genome_length=genome_length,
+                alt_fraction=alt_fraction,
+                contigs=contigs,
+                pools=pools,
+                seed=seed,
+            )
+            with lib.Reference(scheme_dir / "reference.fasta") as reference:
+                scale["genome_length"] = sum(
+                    r.length for r in reference.records.values()
+                )
+            scale["records"] = sum(
+                1 for _ in lib.iter_bed_records(scheme_dir / "primer.bed")
+            )
+            timings = benchmark_scheme(
+                scheme_dir, scale_dir, repeats=repeats, benchmarks=benchmarks
+            )
+            results.append({"scale": scale, "timings": timings})
+    return results
+
+
+def write_report(report: dict, out_path: Path):
+    with open(out_path, "w") as fh:
+        json.dump(report, fh, indent=2)
+    logging.info(f"Wrote benchmark results to {out_path}")
@@ -0,0 +1,165 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class ChecksumCache:
+    """
+    Persistent SQLite mapping of cache keys (raw file digests) to normalised
+    primaschema checksums, evicting least recently used entries beyond
+    max_entries. Each process holds one connection, shared by its threads
+    under a lock. Hits only record their use if the entry was last used over
+    touch_interval seconds ago, and such updates are written in batches, so
+    lookups rarely take the write lock.
+    Eviction runs every evict_every inserts. Database errors are logged and
+    treated as cache misses, so that concurrent workers never fail because
+    of the cache
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int = 100000,
+        touch_interval: float = 3600,
+        touch_batch: int = 100,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+        self.evict_every = max(1, min(1000, max_entries // 10))
+        self._connection = None
+        self._pid = None
+        self._inherited = []
+        self._touched = {}
+        self._puts = 0
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return f"ChecksumCache({str(self.path)!r}, max_entries={self.max_entries})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+        if self._connection is not None:
+            # Inherited from a parent process, so must be neither used nor
+            # closed here, as closing it would release the parent's locks
+            self._inherited.append(self._connection)
+            self._connection = None
+            self._touched = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        try:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS checksums (key TEXT PRIMARY KEY, "
+                    "checksum TEXT NOT NULL, last_used REAL NOT NULL)"
+                )
+        except sqlite3.Error:
+            connection.close()
+            raise
+        self._connection, self._pid = connection, os.getpid()
+        return connection
+
+    def close(self):
+        """Write pending usage updates and close the connection"""
+        with self._lock:
+            if self._connection is None or self._pid != os.getpid():
+                return
+            try:
+                self.flush()
+            finally:
+                self._connection.close()
+                self._connection = None
+
+    def flush(self):
+        """Write batched last_used updates of cache hits"""
+        with self._lock:
+            if not self._touched:
+                return
+            touched, self._touched = self._touched, {}
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.executemany(
+                        "UPDATE checksums SET last_used = ? WHERE key = ?",
+                        [(last_used, key) for key, last_used in touched.items()],
+                    )
+            except sqlite3.Error as e:
+                logging.debug(f"Checksum cache {self.path} unavailable: {e}")
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            try:
+                row = (
+                    self._connect()
+                    .execute(
+                        "SELECT checksum, last_used FROM checksums WHERE key = ?",
+                        (key,),
+                    )
+                    .fetchone()
+                )
+            except sqlite3.Error as e:
+                logging.debug(f"Checksum cache {self.path} unavailable: {e}")
+                return None
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > self.touch_interval:
+                self._touched[key] = now
+                if len(self._touched) >= self.touch_batch:
+                    self.flush()
+            return row[0]
+
+    def put(self, key: str, checksum: str):
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO checksums VALUES (?, ?, ?)",
+                        (key, checksum, time.time()),
+                    )
+                self._puts += 1
+                if self._puts % self.evict_every == 0:
+                    self.evict()
+            except sqlite3.Error as e:
+                logging.debug(f"Checksum cache {self.path} unavailable: {e}")
+
+    def evict(self):
+        """Delete least recently used entries beyond max_entries"""
+        with self._lock:
+            self.flush()
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "DELETE FROM checksums WHERE key IN (SELECT key FROM checksums "
+                    "ORDER BY last_used DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def get_or_compute(self, key: str, compute) -> str:
+        """Return the cached checksum for key, computing and storing it if absent"""
+        checksum = self.get(key)
+        if checksum is None:
+            checksum = compute()
+            self.put(key, checksum)
+        else:
+            logging.debug(f"Using cached checksum {checksum} for {key}")
+        return checksum
+
+    def __len__(self) -> int:
+        with self._lock:
+            (n_entries,) = (
+                self._connect().execute("SELECT COUNT(*) FROM checksums").fetchone()
+            )
+            return n_entries
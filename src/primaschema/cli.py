@@ -1,35 +1,68 @@
+import argparse
 import logging
 import sys
 from pathlib import Path
 
 import defopt
 
+import primaschema.archive as archive_lib
+import primaschema.benchmark as benchmark_lib
+import primaschema.db as db_lib
+import primaschema.diff as diff_lib
+import primaschema.identify as identify_lib
 import primaschema.lib as lib
+import primaschema.merkle as merkle_lib
+import primaschema.metrics as metrics
+import primaschema.qc as qc_lib
+import primaschema.serve as serve_lib
 
 
 logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
 
 
-def hash_bed(bed_path: Path):
+def hash_bed(*bed_paths: Path, jobs: int = 1, json: bool = False):
     """
-    Generate a bed file checksum
+    Generate bed file checksums
 
-    :arg ref_path: Path of bed file
+    :arg bed_paths: Paths of bed files, directories containing them or glob patterns
+    :arg jobs: Number of files to hash in parallel (0 uses all CPUs)
+    :arg json: Output a JSON line per file (the default for several files)
     """
-    hex_digest = lib.hash_bed(bed_path)
-    print("BED checksum:", file=sys.stderr)
-    print(hex_digest)
+    _hash_paths("bed", bed_paths, jobs=jobs, json=json)
 
 
-def hash_ref(ref_path: Path):
+def hash_ref(*ref_paths: Path, jobs: int = 1, json: bool = False):
     """
-    Generate reference sequence checksum
+    Generate reference sequence checksums
 
-    :arg ref_path: Path of reference sequence
+    :arg ref_paths: Paths of reference sequences, directories containing them or glob patterns
+    :arg jobs: Number of files to hash in parallel (0 uses all CPUs)
+    :arg json: Output a JSON line per file (the default for several files)
     """
-    hex_digest = lib.hash_ref(ref_path)
-    print("Reference checksum:", file=sys.stderr)
-    print(hex_digest)
+    _hash_paths("reference", ref_paths, jobs=jobs, json=json)
+
+
+def _hash_paths(kind: str, paths: tuple[Path], jobs: int, json: bool):
+    """Print the checksum of one file, or JSON lines of checksums of many"""
+    import json as json_lib
+
+    patterns = lib.BED_PATTERNS if kind == "bed" else lib.REFERENCE_PATTERNS
+    expanded = lib.expand_paths(paths, patterns)
+    if len(paths) == 1 and expanded == [Path(paths[0])] and not json:
+        if kind == "bed":
+            checksum = lib.hash_bed(expanded[0])
+            print("BED checksum:", file=sys.stderr)
+        else:
+            checksum = lib.hash_ref(expanded[0])
+            print("Reference checksum:", file=sys.stderr)
+        print(checksum)
+        return
+    failures = 0
+    for record in lib.hash_paths(kind, expanded, jobs=jobs):
+        print(json_lib.dumps(record), flush=True)
+        failures += bool(record["error"])
+    if failures:
+        raise RuntimeError(f"Failed to hash {failures} of {len(expanded)} files")
 
 
 def validate(scheme_dir: Path):
@@ -43,14 +76,53 @@ def validate(scheme_dir: Path):
     return lib.validate(scheme_dir)
 
 
-def validate_recursive(root_dir: Path, force: bool = False):
+def validate_recursive(
+    root_dir: Path,
+    force: bool = False,
+    jobs: int = 1,
+    state_file: Path | None = None,
+    full: bool = False,
+):
     """
     Recursively validate primer scheme bundles in the specified directory
 
     :arg root_dir: Path in which to search for schemes
     :arg force: Overwrite existing schemes and ignore hash check failures
+    :arg jobs: Number of schemes to validate in parallel (0 uses all CPUs)
+    :arg state_file: Path of state file recording previously validated bundles
+    :arg full: Validate all bundles, including those unchanged since the last run
     """
-    lib.validate_recursive(root_dir=root_dir, force=force)
+    lib.validate_recursive(
+        root_dir=root_dir, force=force, jobs=jobs, state_path=state_file, full=full
+    )
+
+
+def serve(
+    root_dir: Path,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket: Path | None = None,
+    interval: float = 1.0,
+    force: bool = False,
+):
+    """
+    Serve validation results for a directory tree as JSON, revalidating schemes as they change
+
+    :arg root_dir: Path in which to search for schemes
+    :arg host: Address on which to listen
+    :arg port: Port on which to listen
+    :arg socket: Path of a Unix socket on which to listen instead of a port
+    :arg interval: Seconds between checks for changed files
+    :arg force: Allow checksums to differ from those documented in info.yml
+    """
+    serve_lib.serve(
+        root_dir=root_dir,
+        host=host,
+        port=port,
+        socket_path=socket,
+        interval=interval,
+        force=force,
+    )
 
 
 def build(scheme_dir: Path, out_dir: Path = Path(), force: bool = False):
@@ -64,26 +136,155 @@ def build(scheme_dir: Path, out_dir: Path = Path(), force: bool = False):
     lib.build(scheme_dir=scheme_dir, out_dir=out_dir, force=force)
 
 
-def build_recursive(root_dir: Path, force: bool = False, nested: bool = False):
+def build_recursive(
+    root_dir: Path,
+    force: bool = False,
+    nested: bool = False,
+    jobs: int = 1,
+    state_file: Path | None = None,
+    full: bool = False,
+):
     """
     Recursively build primer scheme bundles in the specified directory
 
     :arg root_dir: Path in which to search for schemes
     :arg force: Overwrite existing schemes and ignore hash check failures
     :arg nested: Build definitions inside a nested dir structure of family/version
+    :arg jobs: Number of schemes to build in parallel (0 uses all CPUs)
+    :arg state_file: Path of state file recording previously built bundles
+    :arg full: Build all bundles, including those unchanged since the last build
     """
-    lib.build_recursive(root_dir=root_dir, force=force, nested=nested)
+    lib.build_recursive(
+        root_dir=root_dir,
+        force=force,
+        nested=nested,
+        jobs=jobs,
+        state_path=state_file,
+        full=full,
+    )
+
 
+def export(
+    root_dir: Path = Path("built"),
+    out: Path = Path("built.zip"),
+    compress: bool = False,
+):
+    """
+    Pack a built scheme tree into a single zip archive indexed by a manifest
 
-def build_manifest(root_dir: Path, schema_dir: Path = Path(), out_dir: Path = Path()):
+    :arg root_dir: Path of built scheme tree
+    :arg out: Path of output archive
+    :arg compress: Deflate files, saving space at the cost of slower random access
+    """
+    archive_lib.pack(root_dir=root_dir, archive_path=out, compress=compress)
+
+
+def build_manifest(
+    root_dir: Path,
+    schema_dir: Path = Path(),
+    out_dir: Path = Path(),
+    jobs: int = 1,
+    state_file: Path | None = None,
+    full: bool = False,
+):
     """
     Build a complete manifest of schemes contained in the specified directory
 
     :arg root_dir: Path in which to search for schemes
     :arg schema_dir: Path of schema directory
     :arg out_dir: Path of directory in which to save manifest
+    :arg jobs: Number of info.yml files to parse in parallel (0 uses all CPUs)
+    :arg state_file: Path of state file caching previously parsed scheme metadata
+    :arg full: Parse all info.yml files, ignoring cached scheme metadata
     """
-    lib.build_manifest(root_dir=root_dir, schema_dir=schema_dir, out_dir=out_dir)
+    lib.build_manifest(
+        root_dir=root_dir,
+        schema_dir=schema_dir,
+        out_dir=out_dir,
+        jobs=jobs,
+        state_path=state_file,
+        full=full,
+    )
+
+
+def tree_hash(
+    root_dir: Path,
+    nodes: Path | None = None,
+    compare: Path | None = None,
+    jobs: int = 1,
+    full: bool = False,
+):
+    """
+    Compute a Merkle digest of all schemes in a directory, optionally comparing with another tree
+
+    :arg root_dir: Path in which to search for schemes
+    :arg nodes: Path of JSON node file to reuse and update
+    :arg compare: Path of another scheme directory or node file to compare against
+    :arg jobs: Number of schemes to hash in parallel (0 uses all CPUs)
+    :arg full: Rehash all schemes, ignoring the node file
+    """
+    tree = merkle_lib.tree_hash(root_dir, nodes_path=nodes, jobs=jobs, full=full)
+    print(tree.digest)
+    if compare:
+        changes = tree.compare(merkle_lib.load_tree(compare, jobs=jobs))
+        for change, path in changes:
+            print(f"{change}\t{path}")
+        if changes:
+            raise RuntimeError(f"Trees differ in {len(changes)} schemes")
+
+
+def index(
+    root_dir: Path, db: Path = Path("schemes.db"), jobs: int = 1, full: bool = False
+):
+    """
+    Build or update a SQLite index of scheme metadata, checksums and primers
+
+    :arg root_dir: Path in which to search for schemes
+    :arg db: Path of SQLite index
+    :arg jobs: Number of schemes to read in parallel (0 uses all CPUs)
+    :arg full: Reindex all schemes, including those unchanged since the last run
+    """
+    counts = db_lib.index_schemes(root_dir=root_dir, db_path=db, jobs=jobs, full=full)
+    logging.info(
+        f"Indexed {counts['indexed']} schemes ({counts['unchanged']} unchanged, {counts['removed']} removed)"
+    )
+
+
+def query(
+    db: Path = Path("schemes.db"),
+    sequence: str | None = None,
+    pool: int | None = None,
+    primer_name: str | None = None,
+    reference_checksum: str | None = None,
+    primer_checksum: str | None = None,
+    scheme_name: str | None = None,
+    schemes: bool = False,
+):
+    """
+    Query a SQLite scheme index for schemes and primers matching all criteria
+
+    :arg db: Path of SQLite index
+    :arg sequence: Primer sequence (case insensitive)
+    :arg pool: Primer pool
+    :arg primer_name: Primer name
+    :arg reference_checksum: Reference checksum
+    :arg primer_checksum: Primer checksum
+    :arg scheme_name: Scheme name
+    :arg schemes: List matching schemes rather than primer records
+    """
+    fields, rows = db_lib.query(
+        db_path=db,
+        sequence=sequence,
+        pool=pool,
+        primer_name=primer_name,
+        reference_checksum=reference_checksum,
+        primer_checksum=primer_checksum,
+        scheme_name=scheme_name,
+        schemes_only=schemes,
+    )
+    print("\t".join(fields))
+    for row in rows:
+        print("\t".join(map(str, row)))
 
 
 def seven_to_six(bed_path: Path, out_dir: Path = Path()):
@@ -109,28 +310,174 @@ def six_to_seven(bed_path: Path, fasta_path: Path, out_dir: Path = Path()):
     )
 
 
-def diff(bed1_path: Path, bed2_path: Path):
+def diff(
+    bed1_path: Path, bed2_path: Path, structural: bool = False, json: bool = False
+):
     """
     Show the symmetric difference of records in two bed files
 
     :arg bed_path1: Path of first bed file
     :arg bed_path2: Path of second bed file
+    :arg structural: Classify records as added, removed, moved, resequenced, repooled or renamed
+    :arg json: Output structural differences as JSON
     """
+    if structural or json:
+        changes = diff_lib.diff_structural(bed1_path, bed2_path)
+        if json:
+            print(diff_lib.to_json(changes))
+        elif changes:
+            print(diff_lib.format_changes(changes))
+        return
     df = lib.diff(bed1_path, bed2_path)
     if not df.empty:
         print(df.to_string(index=False))
 
 
-def show_non_ref_alts(scheme_dir: Path):
+def audit(baseline_path: Path, *bed_paths: Path, jobs: int = 1):
+    """
+    Compare many primer.bed files against a baseline, reporting structural differences as JSON
+
+    :arg baseline_path: Path of baseline primer.bed file
+    :arg bed_paths: Paths of primer.bed files, or directories containing them
+    :arg jobs: Number of comparisons to run in parallel (0 uses all CPUs)
+    """
+    report = diff_lib.audit(baseline_path, list(bed_paths), jobs=jobs)
+    print(diff_lib.to_json(report))
+
+
+def identify_scheme(
+    root_dir: Path,
+    *read_paths: Path,
+    k: int = 16,
+    window: int = 100,
+    jobs: int = 1,
+    batch_size: int = 10000,
+):
+    """
+    Identify the primer schemes used to amplify reads by matching primer ends near read ends
+
+    :arg root_dir: Path in which to search for schemes
+    :arg read_paths: Paths of FASTA or FASTQ read files, optionally gzipped
+    :arg k: Length of primer 3' ends to match
+    :arg window: Number of bases at each end of reads to search (0 searches whole reads)
+    :arg jobs: Number of processes matching reads (0 uses all CPUs)
+    :arg batch_size: Number of reads sent to a process at once
+    """
+    scores = identify_lib.identify_scheme(
+        root_dir=root_dir,
+        read_paths=list(read_paths),
+        k=k,
+        window=window,
+        jobs=jobs,
+        batch_size=batch_size,
+    )
+    print("\t".join(identify_lib.IDENTIFY_FIELDS))
+    for score in scores:
+        print("\t".join(str(score[field]) for field in identify_lib.IDENTIFY_FIELDS))
+
+
+def show_non_ref_alts(scheme_dir: Path, recursive: bool = False, jobs: int = 1):
     """
     Show primer records with sequences not matching the reference sequence
 
     :arg scheme_dir: Path of input scheme directory
+    :arg recursive: Scan all schemes in the directory tree of scheme_dir
+    :arg jobs: Number of schemes to scan in parallel (0 uses all CPUs)
+    """
+    if recursive:
+        df = lib.show_non_ref_alts_recursive(root_dir=scheme_dir, jobs=jobs)
+    else:
+        df = lib.show_non_ref_alts(scheme_dir=scheme_dir)
+    if not df.empty:
+        print(df.to_string(index=False))
+
+
+def qc(
+    scheme_path: Path,
+    out: Path | None = None,
+    dimers: Path | None = None,
+    min_overlap: int = 8,
+    jobs: int = 1,
+):
+    """
+    Report GC content, melting temperature, homopolymer runs and 3' dimers of primers
+
+    :arg scheme_path: Path of primer.bed file or scheme directory
+    :arg out: Path of TSV report (printed if omitted)
+    :arg dimers: Path of TSV table of 3' complementary primer pairs
+    :arg min_overlap: Minimum length of 3' complementarity reported as a dimer
+    :arg jobs: Number of pools to screen in parallel (0 uses all CPUs)
+    """
+    df, dimers_df = qc_lib.qc(scheme_path, min_overlap=min_overlap, jobs=jobs)
+    df.to_csv(out or sys.stdout, sep="\t", index=False)
+    if dimers:
+        dimers_df.to_csv(dimers, sep="\t", index=False)
+    logging.info(f"Found {len(dimers_df)} 3' dimers of {min_overlap}+ bases")
+
+
+def benchmark(
+    amplicons: list[int] = [100, 1000, 10000],
+    genome_length: int | None = None,
+    alt_fraction: float = 0.1,
+    contigs: int = 1,
+    pools: int = 2,
+    repeats: int = 3,
+    benchmarks: list[str] = benchmark_lib.BENCHMARKS,
+    work_dir: Path | None = None,
+    out: Path = Path("benchmark.json"),
+    seed: int = 0,
+):
+    """
+    Time operations on synthetic primer schemes of increasing size
+
+    :arg amplicons: Amplicon counts of the generated schemes
+    :arg genome_length: Total reference length (default 400bp per amplicon)
+    :arg alt_fraction: Fraction of primers with an alt primer
+    :arg contigs: Number of reference contigs
+    :arg pools: Number of primer pools
+    :arg repeats: Number of timed runs per operation
+    :arg benchmarks: Operations to time
+    :arg work_dir: Path in which to keep generated schemes (default temporary)
+    :arg out: Path of JSON results file
+    :arg seed: Random seed for scheme generation
     """
-    print(lib.show_non_ref_alts(scheme_dir=scheme_dir))
+    report = benchmark_lib.run_benchmarks(
+        amplicons=amplicons,
+        genome_length=genome_length,
+        alt_fraction=alt_fraction,
+        contigs=contigs,
+        pools=pools,
+        repeats=repeats,
+        work_dir=work_dir,
+        benchmarks=benchmarks,
+        seed=seed,
+    )
+    benchmark_lib.write_report(report, out)
+    for result in report["results"]:
+        for name, timing in result["timings"].items():
+            print(f"{result['scale']['amplicons']}\t{name}\t{timing['min']:.4f}")
+
+
+def parse_instrumentation_args(argv: list[str]):
+    """
+    Extract the --metrics and --profile options accepted by every subcommand,
+    returning them and the remaining arguments
+    """
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--metrics", type=Path)
+    parser.add_argument("--profile", type=Path)
+    return parser.parse_known_args(argv)
 
 
 def main():
+    options, argv = parse_instrumentation_args(sys.argv[1:])
+    with metrics.session(
+        metrics_path=options.metrics, profile_path=options.profile, argv=argv
+    ):
+        run(argv)
+
+
+def run(argv: list[str]):
     defopt.run(
         {
             "hash-ref": hash_ref,
@@ -140,14 +487,24 @@ def main():
             "build": build,
             "build-recursive": build_recursive,
             "build-manifest": build_manifest,
+            "export": export,
+            "serve": serve,
+            "tree-hash": tree_hash,
+            "index": index,
+            "query": query,
             "diff": diff,
+            "audit": audit,
+            "identify-scheme": identify_scheme,
             "6to7": six_to_seven,
             "7to6": seven_to_six,
             "show-non-ref-alts": show_non_ref_alts,
+            "qc": qc,
+            "benchmark": benchmark,
         },
         no_negated_flags=True,
         strict_kwonly=False,
         short={},
+        argv=argv,
     )
 
 
@@ -0,0 +1,119 @@
+"""Transparent reading of gzip and BGZF (bgzip) compressed input files"""
+import gzip
+import io
+import os
+import struct
+import zlib
+from pathlib import Path
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+COMPRESSED_SUFFIXES = [".gz", ".bgz"]
+BGZF_HEADER = struct.Struct("<4sIBBH")  # magic and flags, mtime, xfl, os, xlen
+
+
+def is_gzip(path: Path) -> bool:
+    """Return True if a file starts with the gzip magic number"""
+    with open(path, "rb") as fh:
+        return fh.read(2) == GZIP_MAGIC
+
+
+def find_compressed(path: Path) -> Path:
+    """
+    Return path if it exists, otherwise the first existing path with a
+    compressed suffix (.gz or .bgz) appended, falling back to path itself
+    """
+    path = Path(path)
+    if path.exists():
+        return path
+    for suffix in COMPRESSED_SUFFIXES:
+        compressed_path = path.with_name(path.name + suffix)
+        if compressed_path.exists():
+            return compressed_path
+    return path
+
+
+def uncompressed_name(path: Path) -> str:
+    """Return the name of a file without any compressed suffix"""
+    path = Path(path)
+    return path.stem if path.suffix in COMPRESSED_SUFFIXES else path.name
+
+
+def open_text(path: Path, newline: str | None = None):
+    """Open a text file for reading, decompressing it on the fly if gzipped"""
+    if is_gzip(path):
+        return gzip.open(path, "rt", newline=newline)
+    return open(path, "r", newline=newline)
+
+
+def bgzf_blocks(data) -> list[tuple[int, int]] | None:
+    """
+    Return (offset, size) of each BGZF block of gzip data, or None if the data
+    is not entirely BGZF, in which case it must be decompressed serially
+    """
+    blocks = []
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < BGZF_HEADER.size:
+            return None
+        magic, _, _, _, xlen = BGZF_HEADER.unpack_from(data, offset)
+        if magic != b"\x1f\x8b\x08\x04":
+            return None
+        extra_start = offset + BGZF_HEADER.size
+        extra_end = extra_start + xlen
+        block_size = None
+        while extra_start + 4 <= extra_end:
+            si = bytes(data[extra_start : extra_start + 2])
+            slen = struct.unpack_from("<H", data, extra_start + 2)[0]
+            if si == b"BC" and slen == 2:
+                block_size = struct.unpack_from("<H", data, extra_start + 4)[0] + 1
+            extra_start += 4 + slen
+        if block_size is None or offset + block_size > len(data):
+            return None
+        blocks.append((offset, block_size))
+        offset += block_size
+    return blocks
+
+
+def _inflate_block(data, offset: int, size: int) -> bytes:
+    xlen = struct.unpack_from("<H", data, offset + 10)[0]
+    return zlib.decompress(data[offset + 12 + xlen : offset + size - 8], wbits=-15)
+
+
+def decompress_bgzf(data, blocks: list[tuple[int, int]], threads: int = 0) -> bytes:
+    """
+    Inflate BGZF blocks in parallel threads (0 uses all CPUs), which run
+    concurrently as zlib releases the GIL
+    """
+    threads = threads or os.cpu_count() or 1
+    if threads == 1 or len(blocks) < 2:
+        return b"".join(_inflate_block(data, *block) for block in blocks)
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        chunks = executor.map(
+            lambda block: _inflate_block(data, *block), blocks, chunksize=64
+        )
+        return b"".join(chunks)
+
+
+def read_bytes(path: Path, threads: int = 0) -> bytes:
+    """
+    Return the contents of a file, decompressing gzip data. BGZF files are
+    inflated block-parallel using threads (0 uses all CPUs)
+    """
+    data = Path(path).read_bytes()
+    if data[:2] != GZIP_MAGIC:
+        return data
+    view = memoryview(data)
+    blocks = bgzf_blocks(view)
+    if blocks is None:
+        return gzip.decompress(data)
+    return decompress_bgzf(view, blocks, threads=threads)
+
+
+def open_bytes(path: Path):
+    """Open a file for binary reading, decompressing it on the fly if gzipped"""
+    if is_gzip(path):
+        return io.BufferedReader(gzip.open(path, "rb"), buffer_size=1 << 20)
+    return open(path, "rb", buffering=1 << 20)
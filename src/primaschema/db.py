@@ -0,0 +1,215 @@
+"""SQLite index of scheme metadata, checksums and primer records"""
+import json
+import logging
+import sqlite3
+from pathlib import Path
+
+import primaschema.lib as lib
+from primaschema import __version__
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS schemes (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT,
+    organism TEXT,
+    family TEXT,
+    version TEXT,
+    display_name TEXT,
+    primer_checksum TEXT,
+    reference_checksum TEXT,
+    fingerprint TEXT NOT NULL,
+    info TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS primers (
+    scheme_id INTEGER NOT NULL REFERENCES schemes(id),
+    chrom TEXT,
+    chromStart INTEGER,
+    chromEnd INTEGER,
+    name TEXT,
+    poolName INTEGER,
+    strand TEXT,
+    sequence TEXT COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS schemes_name ON schemes(name);
+CREATE INDEX IF NOT EXISTS schemes_primer_checksum ON schemes(primer_checksum);
+CREATE INDEX IF NOT EXISTS schemes_reference_checksum ON schemes(reference_checksum);
+CREATE INDEX IF NOT EXISTS primers_scheme ON primers(scheme_id);
+CREATE INDEX IF NOT EXISTS primers_name ON primers(name);
+CREATE INDEX IF NOT EXISTS primers_pool ON primers(poolName, scheme_id);
+CREATE INDEX IF NOT EXISTS primers_sequence ON primers(sequence);
+"""
+
+SCHEME_COLUMNS = ["name", "organism", "family", "version", "display_name"]
+QUERY_SCHEME_FIELDS = ["scheme", "path", "primer_checksum", "reference_checksum"]
+QUERY_PRIMER_FIELDS = ["scheme"] + lib.PRIMER_BED_FIELDS
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    """Open a scheme index, recreating it if built by another primaschema version"""
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    row = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if row and row[0] != __version__:
+        logging.info(f"Rebuilding index {db_path} made by primaschema {row[0]}")
+        connection.executescript("DELETE FROM primers; DELETE FROM schemes;")
+    connection.execute(
+        "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (__version__,)
+    )
+    return connection
+
+
+def _index_scheme_task(scheme_dir: Path) -> dict:
+    with lib.SchemeBundle(scheme_dir) as bundle:
+        return {
+            "info": bundle.info,
+            "primer_checksum": bundle.primer_checksum,
+            "reference_checksum": bundle.reference_checksum,
+            "primers": list(bundle.primer_table.records(lib.PRIMER_BED_FIELDS)),
+        }
+
+
+def _delete_scheme(connection: sqlite3.Connection, scheme_id: int):
+    connection.execute("DELETE FROM primers WHERE scheme_id = ?", (scheme_id,))
+    connection.execute("DELETE FROM schemes WHERE id = ?", (scheme_id,))
+
+
+def _insert_scheme(
+    connection: sqlite3.Connection, path: str, fingerprint: dict, result: dict
+):
+    info = result["info"]
+    family, _, version = str(info.get("name", "")).partition("-")
+    values = dict(
+        name=info.get("name"),
+        organism=info.get("organism"),
+        family=family,
+        version=version,
+        display_name=info.get("display_name"),
+    )
+    cursor = connection.execute(
+        "INSERT INTO schemes (path, name, organism, family, version, display_name, "
+        "primer_checksum, reference_checksum, fingerprint, info) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            path,
+            *(values[column] for column in SCHEME_COLUMNS),
+            result["primer_checksum"],
+            result["reference_checksum"],
+            json.dumps(fingerprint),
+            json.dumps(info, default=str),
+        ),
+    )
+    connection.executemany(
+        "INSERT INTO primers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((cursor.lastrowid, *record) for record in result["primers"]),
+    )
+
+
+def index_schemes(
+    root_dir: Path, db_path: Path, jobs: int = 1, full: bool = False
+) -> dict:
+    """
+    Index all schemes in a directory tree into a SQLite database. Only schemes
+    whose files changed since they were last indexed are read, using a pool of
+    worker processes if jobs > 1, and removed schemes are dropped from the
+    index. Returns counts of indexed, unchanged and removed schemes
+    """
+    root_dir = Path(root_dir)
+    connection = connect(db_path)
+    indexed = {
+        path: (scheme_id, json.loads(fingerprint))
+        for scheme_id, path, fingerprint in connection.execute(
+            "SELECT id, path, fingerprint FROM schemes"
+        )
+    }
+    scheme_dirs = lib.find_scheme_dirs(root_dir)
+    changed, fingerprints = [], {}
+    for scheme_dir in scheme_dirs:
+        path = str(scheme_dir.relative_to(root_dir))
+        previous = indexed.get(path, (None, {}))[1]
+        fingerprints[path] = lib.fingerprint_dir(scheme_dir, previous)
+        if (
+            full
+            or path not in indexed
+            or not lib.fingerprints_match(fingerprints[path], previous)
+        ):
+            changed.append(scheme_dir)
+    removed = indexed.keys() - fingerprints.keys()
+    logging.info(f"{len(changed)} of {len(scheme_dirs)} schemes changed")
+    results = lib.run_recursive(_index_scheme_task, changed, jobs=jobs)
+    with connection:
+        for path in removed:
+            _delete_scheme(connection, indexed[path][0])
+        for scheme_dir, result in results.items():
+            path = str(scheme_dir.relative_to(root_dir))
+            if path in indexed:
+                _delete_scheme(connection, indexed[path][0])
+            if not result["error"]:
+                _insert_scheme(connection, path, fingerprints[path], result)
+    connection.close()
+    lib.summarise_results(results, action="index")
+    return {
+        "indexed": len(changed),
+        "unchanged": len(scheme_dirs) - len(changed),
+        "removed": len(removed),
+    }
+
+
+def query(
+    db_path: Path,
+    sequence: str | None = None,
+    pool: int | None = None,
+    primer_name: str | None = None,
+    reference_checksum: str | None = None,
+    primer_checksum: str | None = None,
+    scheme_name: str | None = None,
+    schemes_only: bool = False,
+) -> tuple[list[str], list[tuple]]:
+    """
+    Query a scheme index, combining criteria with AND. Returns field names and
+    rows of matching primer records, or of matching schemes if no primer
+    criteria are given or if schemes_only=True. Sequences match ignoring case
+    """
+    if not Path(db_path).exists():
+        raise RuntimeError(f"Scheme index {db_path} not found")
+    scheme_criteria = {
+        "schemes.reference_checksum": reference_checksum,
+        "schemes.primer_checksum": primer_checksum,
+        "schemes.name": scheme_name,
+    }
+    primer_criteria = {
+        "primers.sequence": sequence,
+        "primers.poolName": pool,
+        "primers.name": primer_name,
+    }
+    criteria = {
+        column: value
+        for column, value in (scheme_criteria | primer_criteria).items()
+        if value is not None
+    }
+    where = " AND ".join(f"{column} = ?" for column in criteria) or "1"
+    by_primer = any(v is not None for v in primer_criteria.values())
+    if by_primer and not schemes_only:
+        fields = QUERY_PRIMER_FIELDS
+        columns = ", ".join(f"primers.{field}" for field in lib.PRIMER_BED_FIELDS)
+        sql = (
+            f"SELECT schemes.name, {columns} FROM primers "
+            f"JOIN schemes ON schemes.id = primers.scheme_id WHERE {where} "
+            "ORDER BY schemes.name, primers.chrom, primers.chromStart"
+        )
+    else:
+        fields = QUERY_SCHEME_FIELDS
+        join = "JOIN primers ON schemes.id = primers.scheme_id " if by_primer else ""
+        sql = (
+            "SELECT DISTINCT schemes.name, schemes.path, schemes.primer_checksum, "
+            f"schemes.reference_checksum FROM schemes {join}WHERE {where} "
+            "ORDER BY schemes.name"
+        )
+    connection = sqlite3.connect(
+        f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True
+    )
+    rows = connection.execute(sql, tuple(criteria.values())).fetchall()
+    connection.close()
+    return fields, rows
@@ -0,0 +1,231 @@
+"""Structural comparison of primer.bed files using hash indexes of their records"""
+import json
+from collections import Counter, defaultdict
+from itertools import repeat
+from pathlib import Path
+
+from primaschema.bed import PRIMER_BED_FIELDS, BedTable, read_bed
+from primaschema.compression import find_compressed, uncompressed_name
+
+
+CHANGE_TYPES = ["added", "removed", "moved", "resequenced", "repooled", "renamed"]
+
+
+def coordinates_key(record: tuple) -> tuple:
+    """Return the chrom, chromStart, chromEnd and strand of a primer.bed record"""
+    return record[:3] + record[5:6]
+
+
+class BedIndex:
+    """
+    Hash index of primer.bed records by whole record, primer name and
+    coordinates. Build once for a baseline scheme and reuse it to compare many
+    other schemes without reindexing
+    """
+
+    def __init__(self, table: BedTable, path: Path | None = None):
+        self.path = path
+        self.records = list(table.records(PRIMER_BED_FIELDS))
+        self.counts = Counter(self.records)
+        self.by_name = defaultdict(list)
+        self.by_coordinates = defaultdict(list)
+        for i, record in enumerate(self.records):
+            self.by_name[record[3]].append(i)
+            self.by_coordinates[coordinates_key(record)].append(i)
+
+    @classmethod
+    def from_bed(cls, bed_path: Path):
+        return cls(read_bed(bed_path, PRIMER_BED_FIELDS), path=bed_path)
+
+    def __repr__(self):
+        return f"BedIndex({str(self.path)!r}, {len(self.records)} records)"
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+def classify_change(before: tuple, after: tuple) -> list[str]:
+    """Return the kinds of change between two versions of a primer record"""
+    changes = []
+    if coordinates_key(before) != coordinates_key(after):
+        changes.append("moved")
+    if before[6] != after[6]:
+        changes.append("resequenced")
+    if before[4] != after[4]:
+        changes.append("repooled")
+    if before[3] != after[3]:
+        changes.append("renamed")
+    return changes
+
+
+def _unmatched(index: BedIndex, matched: Counter) -> list[int]:
+    """Return positions of records in an index not consumed by exact matches"""
+    matched = matched.copy()
+    unmatched = []
+    for i, record in enumerate(index.records):
+        if matched[record]:
+            matched[record] -= 1
+        else:
+            unmatched.append(i)
+    return unmatched
+
+
+def _pair_by(keys, baseline_lookup, baseline_left: dict, other_left: list[int]):
+    """
+    Pair unmatched other records with the first unmatched baseline record
+    sharing a key, removing paired records from baseline_left and other_left
+    """
+    pairs = []
+    still_unmatched = []
+    for j, key in zip(other_left, keys):
+        i = next((i for i in baseline_lookup.get(key, ()) if i in baseline_left), None)
+        if i is None:
+            still_unmatched.append(j)
+        else:
+            del baseline_left[i]
+            pairs.append((i, j))
+    other_left[:] = still_unmatched
+    return pairs
+
+
+def _as_dict(record: tuple | None) -> dict | None:
+    return dict(zip(PRIMER_BED_FIELDS, record)) if record else None
+
+
+def compare(baseline: BedIndex, other: BedIndex) -> list[dict]:
+    """
+    Classify differences between a baseline and another primer.bed index.
+    Identical records are matched first, then remaining records are paired by
+    primer name and then by coordinates. Paired records are reported as moved,
+    resequenced, repooled and/or renamed; unpaired records as added or removed
+    """
+    matched = baseline.counts & other.counts
+    baseline_left = dict.fromkeys(_unmatched(baseline, matched))
+    other_left = _unmatched(other, matched)
+    pairs = _pair_by(
+        (other.records[j][3] for j in other_left),
+        baseline.by_name,
+        baseline_left,
+        other_left,
+    )
+    pairs += _pair_by(
+        (coordinates_key(other.records[j]) for j in other_left),
+        baseline.by_coordinates,
+        baseline_left,
+        other_left,
+    )
+    changes = []
+    for i, j in pairs:
+        kinds = classify_change(baseline.records[i], other.records[j])
+        if kinds:
+            changes.append((kinds, baseline.records[i], other.records[j]))
+    changes += [(["removed"], baseline.records[i], None) for i in baseline_left]
+    changes += [(["added"], None, other.records[j]) for j in other_left]
+    changes.sort(key=lambda c: (c[2] or c[1])[:4])
+    return [
+        {
+            "changes": kinds,
+            "name": (after or before)[3],
+            "before": _as_dict(before),
+            "after": _as_dict(after),
+        }
+        for kinds, before, after in changes
+    ]
+
+
+def summarise_changes(changes: list[dict]) -> dict:
+    """Count changed records by kind of change"""
+    counts = Counter(kind for change in changes for kind in change["changes"])
+    return {kind: counts[kind] for kind in CHANGE_TYPES}
+
+
+def diff_structural(bed1_path: Path, bed2_path: Path) -> list[dict]:
+    """Classify differences between two primer.bed files"""
+    return compare(BedIndex.from_bed(bed1_path), BedIndex.from_bed(bed2_path))
+
+
+def format_changes(changes: list[dict]) -> str:
+    """
+    Format changes as a tab separated table, showing changed values of paired
+    records as before->after
+    """
+    lines = ["\t".join(["change"] + PRIMER_BED_FIELDS)]
+    for change in changes:
+        before, after = change["before"] or {}, change["after"] or {}
+        values = []
+        for field in PRIMER_BED_FIELDS:
+            old, new = before.get(field), after.get(field)
+            if old is None or new is None or old == new:
+                values.append(str(new if old is None else old))
+            else:
+                values.append(f"{old}->{new}")
+        lines.append("\t".join([",".join(change["changes"])] + values))
+    return "\n".join(lines)
+
+
+def find_primer_beds(paths: list[Path]) -> list[Path]:
+    """
+    Expand directories into the primer.bed files they contain, or compressed
+    primer.bed.gz or primer.bed.bgz files where there is no primer.bed
+    """
+    bed_paths = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            bed_dirs = {
+                bed_path.parent
+                for bed_path in path.rglob("primer.bed*")
+                if uncompressed_name(bed_path) == "primer.bed"
+            }
+            bed_paths += [find_compressed(d / "primer.bed") for d in sorted(bed_dirs)]
+        else:
+            bed_paths.append(path)
+    return bed_paths
+
+
+_baseline = None  # Baseline index of audit worker processes
+
+
+def _set_baseline(baseline: BedIndex):
+    global _baseline
+    _baseline = baseline
+
+
+def _audit_bed(bed_path: Path, baseline: BedIndex | None = None) -> dict:
+    baseline = baseline or _baseline
+    other = BedIndex.from_bed(bed_path)
+    changes = compare(baseline, other)
+    return {
+        "bed": str(bed_path),
+        "records": len(other),
+        "summary": summarise_changes(changes),
+        "changes": changes,
+    }
+
+
+def audit(baseline_path: Path, bed_paths: list[Path], jobs: int = 1) -> dict:
+    """
+    Compare many primer.bed files (or directories containing them) against a
+    baseline, indexing the baseline once. Comparisons run in parallel if jobs
+    is not 1, with 0 using all CPUs. Worker processes receive the baseline index
+    once on startup
+    """
+    baseline = BedIndex.from_bed(baseline_path)
+    bed_paths = find_primer_beds(bed_paths)
+    if jobs == 1:
+        comparisons = list(map(_audit_bed, bed_paths, repeat(baseline)))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=jobs or None, initializer=_set_baseline, initargs=(baseline,)
+        ) as executor:
+            comparisons = list(executor.map(_audit_bed, bed_paths))
+    return {
+        "baseline": str(baseline_path),
+        "baseline_records": len(baseline),
+        "comparisons": comparisons,
+    }
+
+
+def to_json(data) -> str:
+    return json.dumps(data, indent=2)
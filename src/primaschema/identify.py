@@ -0,0 +1,216 @@
+"""Identification of the primer scheme used to amplify sequencing reads"""
+import logging
+from collections import Counter, deque
+from pathlib import Path
+
+import primaschema.lib as lib
+from primaschema.compression import open_bytes
+
+
+IDENTIFY_FIELDS = [
+    "scheme",
+    "reads",
+    "read_fraction",
+    "primers_hit",
+    "primers_total",
+    "primer_fraction",
+]
+_COMPLEMENT = bytes.maketrans(b"ACGT", b"TGCA")
+
+
+def reverse_complement(sequence: bytes) -> bytes:
+    return sequence.translate(_COMPLEMENT)[::-1]
+
+
+class PrimerMatcher:
+    """
+    Hash index of the 3' terminal k-mers of primers (and their reverse
+    complements) from many schemes. Each distinct k-mer is a primer end, which
+    may be shared by several schemes. Primers shorter than k or containing
+    ambiguous bases are not indexed
+    """
+
+    def __init__(self, scheme_primers: dict[str, list[str]], k: int = 16):
+        self.k = k
+        self.schemes = list(scheme_primers)
+        self.kmer_ids = {}  # k-mer (either orientation) -> primer end id
+        self.id_schemes = []  # primer end id -> indices of schemes
+        for scheme_idx, sequences in enumerate(scheme_primers.values()):
+            for sequence in sequences:
+                kmer = sequence.strip().upper().encode()[-k:]
+                if len(kmer) < k or kmer.strip(b"ACGT"):
+                    continue
+                if kmer not in self.kmer_ids:
+                    self.kmer_ids[kmer] = self.kmer_ids[reverse_complement(kmer)] = len(
+                        self.id_schemes
+                    )
+                    self.id_schemes.append(set())
+                self.id_schemes[self.kmer_ids[kmer]].add(scheme_idx)
+        self.id_schemes = [tuple(sorted(s)) for s in self.id_schemes]
+        self.primers_total = Counter(i for s in self.id_schemes for i in s)
+
+    @classmethod
+    def from_dir(cls, root_dir: Path, k: int = 16):
+        """Index primers of all schemes in a directory tree"""
+        scheme_primers = {}
+        for scheme_dir in lib.find_scheme_dirs(root_dir):
+            with lib.SchemeBundle(scheme_dir) as bundle:
+                name = bundle.info.get("name") or str(scheme_dir.relative_to(root_dir))
+                scheme_primers[name] = list(bundle.primer_table["sequence"])
+        return cls(scheme_primers, k=k)
+
+    def __repr__(self):
+        return f"PrimerMatcher({len(self.schemes)} schemes, {len(self.id_schemes)} primer ends)"
+
+    def match(self, sequence: bytes, window: int = 100) -> set[int]:
+        """
+        Return ids of primer ends found in a read, searching the first and last
+        window bases (the whole read if window is 0)
+        """
+        k, kmer_ids = self.k, self.kmer_ids
+        if window and len(sequence) > 2 * window:
+            regions = (sequence[:window], sequence[-window:])
+        else:
+            regions = (sequence,)
+        ids = set()
+        for region in regions:
+            ids.update(
+                map(
+                    kmer_ids.get,
+                    [region[i : i + k] for i in range(len(region) - k + 1)],
+                )
+            )
+        ids.discard(None)
+        return ids
+
+    def score(self, reads: list[bytes], window: int = 100) -> dict:
+        """Count reads and primer ends matched per scheme for a batch of reads"""
+        scheme_reads, primer_reads = Counter(), Counter()
+        matched = 0
+        for read in reads:
+            ids = self.match(read.upper(), window=window)
+            if ids:
+                matched += 1
+                primer_reads.update(ids)
+                scheme_reads.update(
+                    set().union(*(self.id_schemes[primer_id] for primer_id in ids))
+                )
+        return {
+            "reads": len(reads),
+            "matched": matched,
+            "scheme_reads": scheme_reads,
+            "primer_reads": primer_reads,
+        }
+
+
+def iter_reads(path: Path):
+    """Yield read sequences from a FASTA or FASTQ file as bytes"""
+    with open_bytes(path) as fh:
+        first = fh.readline()
+        if first.startswith(b"@"):
+            for i, line in enumerate(fh, 1):
+                if i % 4 == 1:
+                    yield line.rstrip()
+        elif first.startswith(b">"):
+            chunks = []
+            for line in fh:
+                if line.startswith(b">"):
+                    yield b"".join(chunks)
+                    chunks = []
+                else:
+                    chunks.append(line.rstrip())
+            yield b"".join(chunks)
+        elif first.strip():
+            raise RuntimeError(f"Unrecognised read format in {path}")
+
+
+def iter_batches(read_paths: list[Path], batch_size: int):
+    batch = []
+    for read_path in read_paths:
+        for read in iter_reads(read_path):
+            batch.append(read)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+_matcher = None  # PrimerMatcher of identification worker processes
+
+
+def _set_matcher(matcher: PrimerMatcher):
+    global _matcher
+    _matcher = matcher
+
+
+def _score_batch(reads: list[bytes], window: int) -> dict:
+    return _matcher.score(reads, window=window)
+
+
+def identify_scheme(
+    root_dir: Path,
+    read_paths: list[Path],
+    k: int = 16,
+    window: int = 100,
+    jobs: int = 1,
+    batch_size: int = 10000,
+) -> list[dict]:
+    """
+    Score the schemes in a directory tree by the primers found at the ends of
+    reads, streaming batches of reads to worker processes if jobs > 1 (0 uses
+    all CPUs) with at most two batches in flight per worker. Returns
+    per-scheme scores ordered by the fraction of the scheme's primers seen,
+    then by reads matched
+    """
+    matcher = PrimerMatcher.from_dir(root_dir, k=k)
+    logging.info(f"Indexed {matcher}")
+    totals = {"reads": 0, "matched": 0}
+    scheme_reads, primer_reads = Counter(), Counter()
+
+    def add(result):
+        totals["reads"] += result["reads"]
+        totals["matched"] += result["matched"]
+        scheme_reads.update(result["scheme_reads"])
+        primer_reads.update(result["primer_reads"])
+
+    batches = iter_batches(read_paths, batch_size)
+    if jobs == 1:
+        for batch in batches:
+            add(matcher.score(batch, window=window))
+    else:
+        import os
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = jobs or os.cpu_count()
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_set_matcher, initargs=(matcher,)
+        ) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(_score_batch, batch, window))
+                if len(pending) >= 2 * workers:
+                    add(pending.popleft().result())
+            while pending:
+                add(pending.popleft().result())
+    logging.info(f"Matched primers in {totals['matched']} of {totals['reads']} reads")
+    primers_hit = Counter(i for p in primer_reads for i in matcher.id_schemes[p])
+    scores = []
+    for scheme_idx, scheme in enumerate(matcher.schemes):
+        primers_total = matcher.primers_total[scheme_idx]
+        scores.append(
+            {
+                "scheme": scheme,
+                "reads": scheme_reads[scheme_idx],
+                "read_fraction": round(
+                    scheme_reads[scheme_idx] / max(totals["reads"], 1), 4
+                ),
+                "primers_hit": primers_hit[scheme_idx],
+                "primers_total": primers_total,
+                "primer_fraction": round(
+                    primers_hit[scheme_idx] / max(primers_total, 1), 4
+                ),
+            }
+        )
+    scores.sort(key=lambda s: (-s["primer_fraction"], -s["reads"], s["scheme"]))
+    return scores
@@ -0,0 +1,253 @@
+"""Interval index of primers and amplicons for vectorised lookup of read alignments"""
+import logging
+import re
+from pathlib import Path
+
+import numpy as np
+
+from primaschema import __version__
+from primaschema.bed import SCHEME_BED_FIELDS, BedTable, read_bed
+from primaschema.store import atomic_path, hash_file
+
+
+PRIMER_NAME_RE = re.compile(r"^(?P<amplicon>.+)_(?P<side>LEFT|RIGHT)(?:_.+)?$")
+INDEX_ARRAYS = [
+    "chroms",
+    "primer_names",
+    "primer_chroms",
+    "primer_starts",
+    "primer_ends",
+    "primer_pools",
+    "primer_amplicons",
+    "amplicon_names",
+    "amplicon_chroms",
+    "amplicon_starts",
+    "amplicon_ends",
+    "amplicon_pools",
+]
+
+
+def parse_primer_name(name: str) -> tuple[str, str] | tuple[None, None]:
+    """Return the amplicon name and side (LEFT or RIGHT) of a primer name"""
+    match = PRIMER_NAME_RE.match(name)
+    return (match["amplicon"], match["side"]) if match else (None, None)
+
+
+class IntervalArrays:
+    """
+    Half-open intervals sorted by start on one coordinate axis, with contigs
+    laid end to end, answering batches of overlap queries with searchsorted.
+    Empty intervals, whether indexed or queried, overlap nothing
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray):
+        self.order = np.argsort(starts, kind="stable")
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        self.max_length = int((ends - starts).max()) if len(starts) else 0
+
+    def overlaps(self, starts: np.ndarray, ends: np.ndarray):
+        """
+        Return arrays of query positions and ids of the intervals they overlap,
+        ordered by query and then by interval start
+        """
+        lo = np.searchsorted(self.starts, starts - self.max_length, side="right")
+        hi = np.searchsorted(self.starts, ends, side="left")
+        counts = np.where(ends > starts, np.maximum(hi - lo, 0), 0)
+        queries = np.repeat(np.arange(len(starts)), counts)
+        candidates = (
+            np.arange(counts.sum())
+            - np.repeat(np.cumsum(counts) - counts, counts)
+            + np.repeat(lo, counts)
+        )
+        hits = (self.ends[candidates] > starts[queries]) & (
+            self.ends[candidates] > self.starts[candidates]
+        )
+        return queries[hits], self.order[candidates[hits]]
+
+
+class PrimerIndex:
+    """
+    Primers and amplicons of a scheme bed table with interval indexes for batch
+    queries. Amplicons are formed from primers named <amplicon>_LEFT and
+    <amplicon>_RIGHT (with optional suffixes such as _alt1), spanning the
+    outermost primers of each side in any pool, with the lowest pool of their
+    primers; other primers have amplicon id -1. Primer ids are row positions in
+    the bed table
+    """
+
+    def __init__(self, arrays: dict):
+        for name in INDEX_ARRAYS:
+            setattr(self, name, arrays[name])
+        contig_lengths = np.zeros(len(self.chroms), dtype=np.int64)
+        np.maximum.at(contig_lengths, self.primer_chroms, self.primer_ends)
+        self._contig_offsets = np.concatenate([[0], np.cumsum(contig_lengths + 1)])
+        self._primer_intervals = IntervalArrays(
+            *self._global(self.primer_chroms, self.primer_starts, self.primer_ends)
+        )
+        self._amplicon_intervals = IntervalArrays(
+            *self._global(
+                self.amplicon_chroms, self.amplicon_starts, self.amplicon_ends
+            )
+        )
+
+    @classmethod
+    def from_table(cls, table: BedTable):
+        chroms = sorted(set(table["chrom"]))
+        chrom_ids = {chrom: i for i, chrom in enumerate(chroms)}
+        amplicons = {}  # (chrom, amplicon name) -> [start, end, pools, primer ids]
+        primer_amplicons = np.full(len(table), -1, dtype=np.int64)
+        for i, (chrom, start, end, name, pool, _) in enumerate(
+            table.records(SCHEME_BED_FIELDS)
+        ):
+            amplicon_name, side = parse_primer_name(name)
+            if amplicon_name is None:
+                continue
+            amplicon = amplicons.setdefault(
+                (chrom, amplicon_name), [None, None, set(), []]
+            )
+            if side == "LEFT":
+                amplicon[0] = start if amplicon[0] is None else min(amplicon[0], start)
+            else:
+                amplicon[1] = end if amplicon[1] is None else max(amplicon[1], end)
+            amplicon[2].add(pool)
+            amplicon[3].append(i)
+        paired = sorted(
+            ((chrom_ids[chrom], start, end, name, pools, primer_ids))
+            for (chrom, name), (start, end, pools, primer_ids) in amplicons.items()
+            if start is not None and end is not None
+        )
+        for amplicon_id, (*_, primer_ids) in enumerate(paired):
+            primer_amplicons[primer_ids] = amplicon_id
+        if len(paired) < len(amplicons):
+            logging.info(f"Ignoring {len(amplicons) - len(paired)} unpaired amplicons")
+        multi_pool = sum(len(pools) > 1 for *_, pools, _ in paired)
+        if multi_pool:
+            logging.info(f"{multi_pool} amplicons have primers in several pools")
+        return cls(
+            {
+                "chroms": np.array(chroms, dtype=str),
+                "primer_names": np.array(table["name"], dtype=str),
+                "primer_chroms": np.array(
+                    [chrom_ids[c] for c in table["chrom"]], dtype=np.int64
+                ),
+                "primer_starts": np.array(table["chromStart"], dtype=np.int64),
+                "primer_ends": np.array(table["chromEnd"], dtype=np.int64),
+                "primer_pools": np.array(table["poolName"], dtype=np.int64),
+                "primer_amplicons": primer_amplicons,
+                "amplicon_names": np.array([a[3] for a in paired], dtype=str),
+                "amplicon_chroms": np.array([a[0] for a in paired], dtype=np.int64),
+                "amplicon_starts": np.array([a[1] for a in paired], dtype=np.int64),
+                "amplicon_ends": np.array([a[2] for a in paired], dtype=np.int64),
+                "amplicon_pools": np.array([min(a[4]) for a in paired], dtype=np.int64),
+            }
+        )
+
+    @classmethod
+    def from_bed(cls, bed_path: Path):
+        return cls.from_table(read_bed(bed_path))
+
+    @classmethod
+    def load(cls, index_path: Path):
+        with np.load(index_path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in INDEX_ARRAYS})
+
+    def save(self, index_path: Path, **metadata):
+        """Atomically write index arrays and string metadata to an npz file"""
+        arrays = {name: getattr(self, name) for name in INDEX_ARRAYS}
+        arrays |= {f"meta_{k}": np.array(str(v)) for k, v in metadata.items()}
+        with atomic_path(index_path) as temp_path:
+            with open(temp_path, "wb") as fh:
+                np.savez(fh, **arrays)
+
+    @classmethod
+    def cached(cls, bed_path: Path, index_path: Path | None = None):
+        """
+        Load the index of a bed file from index_path (default <bed_path>.npz),
+        rebuilding and saving it if the bed file or primaschema version changed
+        """
+        bed_path = Path(bed_path)
+        index_path = index_path or bed_path.with_name(bed_path.name + ".npz")
+        digest = hash_file(bed_path)
+        try:
+            with np.load(index_path, allow_pickle=False) as data:
+                if (
+                    data["meta_digest"] == digest
+                    and data["meta_version"] == __version__
+                ):
+                    return cls({name: data[name] for name in INDEX_ARRAYS})
+        except (OSError, KeyError, ValueError):
+            pass
+        logging.info(f"Indexing {bed_path}")
+        index = cls.from_bed(bed_path)
+        index.save(index_path, digest=digest, version=__version__)
+        return index
+
+    def __repr__(self):
+        return (
+            f"PrimerIndex({len(self.primer_names)} primers, "
+            f"{len(self.amplicon_names)} amplicons)"
+        )
+
+    def _global(self, chrom_ids, starts, ends):
+        """Convert contig coordinates to positions on one axis of all contigs"""
+        offsets = self._contig_offsets[chrom_ids]
+        return starts + offsets, ends + offsets
+
+    def _chrom_ids(self, chroms, n: int) -> np.ndarray:
+        if chroms is None:
+            if len(self.chroms) > 1:
+                raise RuntimeError("chroms must be given for multi-contig schemes")
+            return np.zeros(n, dtype=np.int64)
+        if not n:
+            return np.zeros(0, dtype=np.int64)
+        chroms = np.broadcast_to(np.asarray(chroms, dtype=str), (n,))
+        chrom_ids = np.searchsorted(self.chroms, chroms)
+        known = (chrom_ids < len(self.chroms)) & (
+            self.chroms[np.minimum(chrom_ids, len(self.chroms) - 1)] == chroms
+        )
+        if not known.all():
+            raise RuntimeError(f"Unknown chrom {chroms[~known][0]}")
+        return chrom_ids
+
+    def _query(self, intervals: IntervalArrays, starts, ends, chroms):
+        chrom_ids = self._chrom_ids(chroms, len(starts))
+        lengths = np.diff(self._contig_offsets)[chrom_ids] - 1
+        starts = np.clip(np.asarray(starts, dtype=np.int64), 0, lengths)
+        ends = np.clip(np.asarray(ends, dtype=np.int64), 0, lengths)
+        return intervals.overlaps(*self._global(chrom_ids, starts, ends))
+
+    def primers_overlapping(self, starts, ends, chroms=None):
+        """
+        Find primers overlapping half-open alignment intervals. Returns arrays
+        of query positions and primer ids, with one element per overlap. chroms
+        may be one name for all queries or one per query
+        """
+        return self._query(self._primer_intervals, starts, ends, chroms)
+
+    def amplicons_overlapping(self, starts, ends, chroms=None):
+        """
+        Find amplicons overlapping half-open alignment intervals. Returns arrays
+        of query positions and amplicon ids, with one element per overlap
+        """
+        return self._query(self._amplicon_intervals, starts, ends, chroms)
+
+    def assign_amplicons(self, starts, ends, chroms=None) -> np.ndarray:
+        """
+        Return the id of the amplicon best matching each alignment, being the
+        overlapping amplicon whose ends are nearest those of the alignment, or
+        -1 for alignments overlapping no amplicon
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        queries, amplicons = self.amplicons_overlapping(starts, ends, chroms)
+        distances = np.abs(self.amplicon_starts[amplicons] - starts[queries]) + np.abs(
+            self.amplicon_ends[amplicons] - ends[queries]
+        )
+        order = np.lexsort((distances, queries))
+        queries, amplicons = queries[order], amplicons[order]
+        first = np.ones(len(queries), dtype=bool)
+        first[1:] = queries[1:] != queries[:-1]
+        assigned = np.full(len(starts), -1, dtype=np.int64)
+        assigned[queries[first]] = amplicons[first]
+        return assigned
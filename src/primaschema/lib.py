@@ -1,24 +1,62 @@
+from __future__ import annotations
+
+import atexit
+import copy
+import csv
+import glob
 import hashlib
+import importlib.util
 import json
 import logging
 import os
+import pickle
 import shutil
-from collections import defaultdict
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from functools import cached_property, lru_cache
+from itertools import repeat
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
+
+from primaschema import __version__, metrics
+from primaschema.bed import (
+    PRIMER_BED_FIELDS,
+    SCHEME_BED_FIELDS,
+    BedTable,
+    iter_bed_records,
+    read_bed,
+)
+from primaschema.cache import ChecksumCache
+from primaschema.compression import (
+    find_compressed,
+    is_gzip,
+    open_bytes,
+    open_text,
+    uncompressed_name,
+)
+from primaschema.reference import Reference
+from primaschema.store import ObjectStore, atomic_path, hash_file
+
+# Heavy dependencies (pandas, numpy, Biopython, jsonschema, linkml and yaml) are
+# imported inside the functions that use them to keep CLI startup fast
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+INDEX_SUFFIXES = (".fai", ".npz")  # Files derived from and cached alongside inputs
+PRIMER_HASH_FIELDS = ["chromStart", "chromEnd", "poolName", "strand", "sequence"]
 
-import jsonschema
-import pandas as pd
-import yaml
-from Bio import SeqIO
-from linkml.generators.pythongen import PythonGenerator
-from linkml.validators import JsonSchemaDataValidator
-from linkml_runtime.utils.schemaview import SchemaView
+# IUPAC DNA complements as used by Biopython's Seq.reverse_complement()
+_COMPLEMENT_TABLE = bytes.maketrans(
+    b"ACGTUMRWSYKVHDBXNacgtumrwsykvhdbxn", b"TGCAAKYWSRMBDHVXNtgcaakywsrmbdhvxn"
+)
 
 
-SCHEME_BED_FIELDS = ["chrom", "chromStart", "chromEnd", "name", "poolName", "strand"]
-PRIMER_BED_FIELDS = SCHEME_BED_FIELDS + ["sequence"]
+def reverse_complement(sequence: str) -> str:
+    """Return the IUPAC reverse complement of a DNA sequence"""
+    return sequence.encode().translate(_COMPLEMENT_TABLE)[::-1].decode()
 
 
 def scan(path):
@@ -43,6 +81,74 @@ def get_primer_schemes_path():
     return Path(os.environ[env_var]).resolve()
 
 
+def get_cache_dir() -> Path:
+    """Locate primaschema cache directory using environment variables, creating it if needed"""
+    env_var = "PRIMASCHEMA_CACHE_DIR"
+    if os.environ.get(env_var):
+        cache_dir = Path(os.environ[env_var])
+    else:
+        xdg_cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        cache_dir = Path(xdg_cache_home) / "primaschema"
+    cache_dir = cache_dir.resolve()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+_checksum_caches = {}  # (path, max_entries, pid) -> ChecksumCache
+
+
+def _close_checksum_caches():
+    for cache in _checksum_caches.values():
+        cache.close()
+
+
+atexit.register(_close_checksum_caches)
+
+
+def get_checksum_cache() -> ChecksumCache | None:
+    """
+    Return the persistent checksum cache of this process, holding up to
+    PRIMASCHEMA_CHECKSUM_CACHE_SIZE entries (0 disables caching)
+    """
+    max_entries = int(os.environ.get("PRIMASCHEMA_CHECKSUM_CACHE_SIZE", 100000))
+    if max_entries <= 0:
+        return None
+    path = get_cache_dir() / "checksums.sqlite"
+    key = (path, max_entries, os.getpid())
+    if key not in _checksum_caches:
+        _checksum_caches[key] = ChecksumCache(path, max_entries=max_entries)
+    return _checksum_caches[key]
+
+
+@metrics.timed
+def cached_checksum(kind: str, paths: list[Path], compute) -> str:
+    """
+    Return a checksum of kind ("reference", "primer" or "scheme") for files,
+    looked up in the checksum cache by the raw digests of the files and the
+    primaschema version, and calling compute() upon a miss
+    """
+    cache = get_checksum_cache()
+    if cache is None:
+        return compute()
+    key = ":".join([kind, __version__, *map(file_digest, paths)])
+    return cache.get_or_compute(key, compute)
+
+
+@lru_cache(maxsize=1024)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    return hash_file(path)
+
+
+def file_digest(path: Path) -> str:
+    """
+    Return the SHA256 hex digest of a file, remembered in-process while its
+    size and mtime are unchanged, so that a reference shared by many bed files
+    is read once
+    """
+    stat = os.stat(path)
+    return _file_digest(os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+
 def hash_string(string: str) -> str:
     """Normalise case, sorting, terminal spaces & return prefixed 64b of SHA256 hex"""
     checksum = hashlib.sha256(str(string).strip().upper().encode()).hexdigest()[:16]
@@ -51,37 +157,12 @@ def hash_string(string: str) -> str:
 
 def parse_scheme_bed(bed_path: Path) -> pd.DataFrame:
     """Parse a 6 column scheme.bed bed file"""
-    return pd.read_csv(
-        bed_path,
-        sep="\t",
-        names=SCHEME_BED_FIELDS,
-        dtype=dict(
-            chrom=str,
-            chromStart=int,
-            chromEnd=int,
-            name=str,
-            poolName=int,
-            strand=str,
-        ),
-    )
+    return read_bed(bed_path, SCHEME_BED_FIELDS).to_pandas()
 
 
 def parse_primer_bed(bed_path: Path) -> pd.DataFrame:
     """Parse a 7 column primer.bed bed file"""
-    return pd.read_csv(
-        bed_path,
-        sep="\t",
-        names=PRIMER_BED_FIELDS,
-        dtype=dict(
-            chrom=str,
-            chromStart=int,
-            chromEnd=int,
-            name=str,
-            poolName=int,
-            strand=str,
-            sequence=str,
-        ),
-    )
+    return read_bed(bed_path, PRIMER_BED_FIELDS).to_pandas()
 
 
 def normalise_primer_bed_df(df: pd.DataFrame) -> pd.DataFrame:
@@ -98,108 +179,397 @@ def normalise_primer_bed_df(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+class _HashSink:
+    """
+    Write-only file object feeding CSV lines to SHA256 as hash_string would see
+    them, holding back the last line so terminal whitespace can be stripped
+    """
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+        self.pending = ""
+
+    def write(self, line: str):
+        self.hasher.update(self.pending.upper().encode())
+        self.pending = line
+
+    def checksum(self) -> str:
+        self.hasher.update(self.pending.rstrip().upper().encode())
+        return f"primaschema:{self.hasher.hexdigest()[:16]}"
+
+
+def hash_primer_records(records) -> str:
+    """
+    Returns prefixed SHA256 digest of an iterable of (chromStart, chromEnd,
+    poolName, strand, sequence) records. Records are rendered and hashed one
+    line at a time, yielding the same checksum as hashing the whole CSV string
+    """
+    sink = _HashSink()
+    writer = csv.writer(sink, lineterminator="\n")
+    writer.writerow(PRIMER_HASH_FIELDS)
+    writer.writerows(records)
+    return sink.checksum()
+
+
+def write_bed_records(records, bed_path: Path):
+    """Write tuples of bed records to a headerless tab separated bed file"""
+    with open(bed_path, "w", newline="") as fh:
+        csv.writer(fh, delimiter="\t", lineterminator="\n").writerows(records)
+
+
 def hash_primer_bed_df(df: pd.DataFrame) -> str:
     """
     Returns prefixed SHA256 digest from stringified dataframe
     """
-    string = df[["chromStart", "chromEnd", "poolName", "strand", "sequence"]].to_csv(
-        index=False
+    import pandas as pd
+
+    records = df[PRIMER_HASH_FIELDS].itertuples(index=False, name=None)
+    return hash_primer_records(
+        tuple("" if pd.isna(v) else v for v in record) for record in records
     )
-    return hash_string(string)
 
 
+@metrics.timed
+def hash_primer_table(table: BedTable) -> str:
+    """Returns prefixed SHA256 digest of a 7 column BedTable"""
+    return hash_primer_records(table.records(PRIMER_HASH_FIELDS))
+
+
+@metrics.timed
 def hash_primer_bed(bed_path: Path):
-    """Hash a 7 column primer.bed file"""
-    df = parse_primer_bed(bed_path)
-    return hash_primer_bed_df(df)
+    """Hash a 7 column primer.bed file, streaming records in bounded memory"""
+    records = iter_bed_records(bed_path, PRIMER_BED_FIELDS)
+    return hash_primer_records(r[1:3] + r[4:] for r in records)
 
 
+@metrics.timed
 def hash_scheme_bed(bed_path: Path, fasta_path: Path) -> str:
     """
     Hash a 6 column scheme.bed file by first converting to 7 column primer.bed
     """
     logging.info(f"Hashing scheme.bed using reference backfill")
-    ref_record = SeqIO.read(fasta_path, "fasta")
-    df = parse_scheme_bed(bed_path)
-    records = df.to_dict("records")
-    for r in records:
-        start_pos, end_pos = r["chromStart"], r["chromEnd"]
-        if r["strand"] == "+":
-            r["sequence"] = str(ref_record.seq[start_pos:end_pos])
-        elif r["strand"] == "-":
-            r["sequence"] = str(ref_record.seq[start_pos:end_pos].reverse_complement())
+    table = read_bed(bed_path, SCHEME_BED_FIELDS)
+    with Reference(fasta_path) as reference:
+        return hash_primer_table(backfill_table(table, reference))
+
+
+@metrics.timed
+def backfill_table(table: BedTable, reference: Reference) -> BedTable:
+    """Add a sequence column to a 6 column BedTable using a reference"""
+    columns = (table[field] for field in SCHEME_BED_FIELDS)
+    return table.assign(sequence=backfill_columns(reference, *columns))
+
+
+def backfill_columns(
+    reference: Reference, chroms, starts, ends, names, pools, strands
+) -> list[str]:
+    """
+    Return primer sequences for columns of scheme.bed records, selecting
+    reference records by chrom and reading only the span covered by primers
+    """
+    import numpy as np
+
+    chroms = np.asarray(chroms, dtype=object)
+    starts, ends = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+    strands = np.asarray(strands, dtype=object)
+    invalid_strands = np.flatnonzero((strands != "+") & (strands != "-"))
+    if len(invalid_strands):
+        i = invalid_strands[0]
+        r = dict(zip(SCHEME_BED_FIELDS, (chroms[i], int(starts[i]), int(ends[i]))))
+        r |= dict(name=names[i], poolName=int(pools[i]), strand=strands[i])
+        raise RuntimeError(f"Invalid strand for BED record {r}")
+    sequences = np.empty(len(starts), dtype=object)
+    unique_chroms = dict.fromkeys(chroms.tolist())
+    for chrom in unique_chroms:
+        if len(unique_chroms) == 1:
+            idxs = np.arange(len(chroms))
         else:
-            raise RuntimeError(f"Invalid strand for BED record {r}")
-    bed7_df = pd.DataFrame(records)
-    return hash_primer_bed_df(bed7_df)
+            idxs = np.flatnonzero(chroms == chrom)
+        span_start = max(int(starts[idxs].min()), 0)
+        span_end = int(ends[idxs].max())
+        span = reference.fetch(reference.contig_name(chrom), span_start, span_end)
+        sequences[idxs] = backfill_sequences(
+            span,
+            starts=starts[idxs] - span_start,
+            ends=ends[idxs] - span_start,
+            reverse=strands[idxs] == "-",
+        )
+    return sequences.tolist()
+
+
+def backfill_sequences(ref_seq: bytes, starts, ends, reverse) -> list[str]:
+    """
+    Return the reference slices [start, end) for arrays of coordinates,
+    reverse complementing those flagged in reverse. The reference is
+    concatenated with its reverse complement (made with a translation table) so
+    that every record maps to a single forward slice, with slice bounds for all
+    records computed in one vectorised step
+    """
+    import numpy as np
+
+    ref_len = len(ref_seq)
+    starts = np.clip(np.asarray(starts, dtype=np.int64), 0, ref_len)
+    ends = np.maximum(np.clip(np.asarray(ends, dtype=np.int64), 0, ref_len), starts)
+    reverse = np.asarray(reverse, dtype=bool)
+    if reverse.any():
+        ref_seq = ref_seq + ref_seq.translate(_COMPLEMENT_TABLE)[::-1]
+    slice_starts = np.where(reverse, 2 * ref_len - ends, starts).tolist()
+    slice_ends = np.where(reverse, 2 * ref_len - starts, ends).tolist()
+    sequence = ref_seq.decode("latin-1")
+    return [sequence[i:j] for i, j in zip(slice_starts, slice_ends)]
 
 
 def convert_primer_bed_to_scheme_bed(bed_path: Path, out_dir: Path = Path()):
-    df = parse_primer_bed(bed_path).drop("sequence", axis=1)
-    df.to_csv(Path(out_dir) / "scheme.bed", sep="\t", header=False, index=False)
+    table = read_bed(bed_path, PRIMER_BED_FIELDS)
+    table.select(SCHEME_BED_FIELDS).write(Path(out_dir) / "scheme.bed")
 
 
 def convert_scheme_bed_to_primer_bed(
     bed_path: Path, fasta_path: Path, out_dir: Path = Path()
 ):
-    ref_record = SeqIO.read(fasta_path, "fasta")
-    df = parse_scheme_bed(bed_path)
-    records = df.to_dict("records")
-    for r in records:
-        start_pos, end_pos = r["chromStart"], r["chromEnd"]
-        if r["strand"] == "+":
-            r["sequence"] = str(ref_record.seq[start_pos:end_pos])
-        else:
-            r["sequence"] = str(ref_record.seq[start_pos:end_pos].reverse_complement())
-    df = pd.DataFrame(records)
-    df.to_csv(Path(out_dir) / "primer.bed", sep="\t", header=False, index=False)
+    table = read_bed(bed_path, SCHEME_BED_FIELDS)
+    with Reference(fasta_path) as reference:
+        backfill_table(table, reference).write(Path(out_dir) / "primer.bed")
 
 
-def hash_bed(bed_path: Path) -> str:
-    bed_type = infer_bed_type(bed_path)
+def hash_bed(bed_path: Path, bed_type: str | None = None) -> str:
+    bed_path = Path(bed_path)
+    bed_type = bed_type or infer_bed_type(bed_path)
     if bed_type == "primer":
-        checksum = hash_primer_bed(bed_path)
+        checksum = cached_checksum(
+            "primer", [bed_path], lambda: hash_primer_bed(bed_path)
+        )
     else:  # bed_type == "scheme"
-        checksum = hash_scheme_bed(
-            bed_path=bed_path, fasta_path=bed_path.parent / "reference.fasta"
+        fasta_path = find_compressed(bed_path.parent / "reference.fasta")
+        checksum = cached_checksum(
+            "scheme",
+            [bed_path, fasta_path],
+            lambda: hash_scheme_bed(bed_path=bed_path, fasta_path=fasta_path),
         )
     return checksum
 
 
 def hash_ref(ref_path: Path):
-    record = SeqIO.read(ref_path, "fasta")
-    return hash_string(record.seq)
+    return cached_checksum("reference", [ref_path], lambda: _hash_ref(ref_path))
+
+
+BED_PATTERNS = ["*.bed", "*.bed.gz", "*.bed.bgz"]
+REFERENCE_PATTERNS = [
+    f"*{extension}{suffix}"
+    for extension in (".fasta", ".fa", ".fna")
+    for suffix in ("", ".gz", ".bgz")
+]
+
+
+def expand_paths(paths: list[Path], patterns: list[str]) -> list[Path]:
+    """
+    Expand directories into the files within them matching any of patterns,
+    and glob patterns into the files they match, removing duplicates
+    """
+    expanded = []
+    for path in map(str, paths):
+        if os.path.isdir(path):
+            expanded += sorted(
+                p for pattern in patterns for p in Path(path).rglob(pattern)
+            )
+        elif not os.path.exists(path) and glob.has_magic(path):
+            expanded += sorted(map(Path, glob.glob(path, recursive=True)))
+        else:
+            expanded.append(Path(path))
+    return list(dict.fromkeys(expanded))
+
+
+def _hash_path_task(kind: str, path: Path) -> dict:
+    start = time.perf_counter()
+    record = {"path": str(path), "type": None, "checksum": None, "error": None}
+    try:
+        if kind == "bed":
+            record["type"] = infer_bed_type(path)
+            record["checksum"] = hash_bed(path, bed_type=record["type"])
+        else:
+            record["type"] = "reference"
+            record["checksum"] = hash_ref(path)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 6)
+    return record
+
 
+def hash_paths(kind: Literal["bed", "reference"], paths: list[Path], jobs: int = 1):
+    """
+    Yield a record of the path, type, checksum, error message (None upon
+    success) and elapsed seconds for each bed or reference file, in order,
+    hashing files in a pool of worker processes if jobs > 1 (0 uses all CPUs)
+    """
+    if jobs == 1 or len(paths) < 2:
+        yield from map(_hash_path_task, repeat(kind), paths)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            yield from executor.map(_hash_path_task, repeat(kind), paths, chunksize=16)
+
+
+def _hash_ref(ref_path: Path) -> str:
+    with Reference(ref_path) as reference:
+        return hash_reference(reference)
+
+
+@metrics.timed
+def hash_reference(reference: Reference) -> str:
+    """
+    Hash the sequence of a single record reference. Multi-record references are
+    hashed as their sequences in file order joined by newlines, so that the
+    checksum of a single record reference is unchanged
+    """
+    sequences = [reference.sequence(name) for name in reference.names]
+    return hash_string(b"\n".join(sequences).decode("latin-1"))
 
+
+@metrics.timed
 def count_tsv_columns(bed_path: Path) -> int:
-    return len(pd.read_csv(bed_path, sep="\t").columns)
+    """Count the columns of the first non-empty line of a tab separated file"""
+    with open_text(bed_path, newline="") as fh:
+        for row in csv.reader(fh, delimiter="\t"):
+            if row:
+                return len(row)
+    return 0
+
+
+def write_bytes_atomic(path: Path, data: bytes):
+    """Write bytes to a temporary file alongside path before renaming into place"""
+    with atomic_path(path) as temp_path:
+        temp_path.write_bytes(data)
 
 
+@metrics.timed
 def parse_yaml(path) -> dict:
+    """Safely parse a YAML file, using libyaml if available"""
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(path, "r") as fh:
-        return yaml.safe_load(fh)
+        return yaml.load(fh, Loader=loader)
 
 
 def validate_yaml_with_json_schema(yaml_path: Path, schema_path: Path):
-    yaml_data = parse_yaml(yaml_path)
+    return validate_with_json_schema(parse_yaml(yaml_path), schema_path)
+
+
+def validate_with_json_schema(data, schema_path: Path):
+    import jsonschema
+
     with open(schema_path, "r") as schema_fh:
         schema = json.load(schema_fh)
-    return jsonschema.validate(yaml_data, schema=schema)
+    return jsonschema.validate(data, schema=schema)
+
+
+_linkml_schemas = {}
+LINKML_TARGET_CLASS = "PrimerScheme"
 
 
-def validate_with_linkml_schema(yaml_path: Path, schema_path: Path):
-    schema_view = SchemaView(schema_path)
-    schema_gen = PythonGenerator(schema_view.schema)
-    schema_compiled = schema_gen.compile_module()
-    data = parse_yaml(yaml_path)
+def linkml_schema_key(schema_path: Path) -> str:
+    """Return SHA256 hex digest of LinkML schema content and installed linkml version"""
+    import importlib.metadata
+
+    hasher = hashlib.sha256(Path(schema_path).read_bytes())
+    hasher.update(importlib.metadata.version("linkml").encode())
+    return hasher.hexdigest()
+
+
+@metrics.timed
+def load_linkml_schema(schema_path: Path):
+    """
+    Return compiled Python module and data validator for a LinkML schema.
+    Compiled artifacts, including the JSON schema the validator checks data
+    against, are cached in-process and on disk, keyed by schema content and
+    linkml version, so the generators run once per schema revision
+    """
+    from linkml.generators.jsonschemagen import JsonSchemaGenerator
+    from linkml.generators.pythongen import PythonGenerator
+    from linkml.validators import JsonSchemaDataValidator
+    from linkml_runtime.utils.schemaview import SchemaView
+
+    key = linkml_schema_key(schema_path)
+    if key in _linkml_schemas:
+        return _linkml_schemas[key]
+    cache_dir = get_cache_dir() / "linkml"
+    cache_dir.mkdir(exist_ok=True)
+    module_path = cache_dir / f"{key}.py"
+    schema_pickle_path = cache_dir / f"{key}.pickle"
+    schema = None
+    if schema_pickle_path.exists():
+        try:
+            with open(schema_pickle_path, "rb") as fh:
+                schema = pickle.load(fh)
+        except Exception:
+            logging.warning(f"Ignoring unreadable cached schema {schema_pickle_path}")
+    if schema is None:
+        schema = SchemaView(str(schema_path)).schema
+        try:
+            write_bytes_atomic(schema_pickle_path, pickle.dumps(schema))
+        except Exception:
+            logging.debug("LinkML schema definition is not picklable; skipping")
+    if not module_path.exists():
+        logging.info(f"Compiling LinkML schema {schema_path}")
+        write_bytes_atomic(module_path, PythonGenerator(schema).serialize().encode())
+    module_name = f"primaschema_linkml_{key[:16]}"
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    json_schema_path = cache_dir / f"{key}.schema.json"
+    json_schema = None
+    if json_schema_path.exists():
+        try:
+            json_schema = json.loads(json_schema_path.read_bytes())
+        except ValueError:
+            logging.warning(f"Ignoring unreadable cached schema {json_schema_path}")
+    if json_schema is None:
+        json_schema = json.loads(
+            JsonSchemaGenerator(
+                schema,
+                mergeimports=True,
+                top_class=LINKML_TARGET_CLASS,
+                not_closed=False,
+            ).serialize()
+        )
+        write_bytes_atomic(json_schema_path, json.dumps(json_schema).encode())
+    validator = JsonSchemaDataValidator(schema)
+    # Seed the validator's per-class cache, which it would otherwise fill by
+    # generating the JSON schema upon first use
+    validator.jsonschema_objs = {
+        frozenset([schema.id, LINKML_TARGET_CLASS, True]): json_schema
+    }
+    _linkml_schemas[key] = module, validator
+    return module, validator
+
+
+@metrics.timed
+def validate_with_linkml_schema(yaml_path: Path, schema_path: Path, data=None):
+    """Validate YAML file (or its already parsed data) using a LinkML schema"""
+    schema_compiled, validator = load_linkml_schema(schema_path)
+    if data is None:
+        data = parse_yaml(yaml_path)
+    else:
+        data = copy.deepcopy(data)
     data_instance = schema_compiled.PrimerScheme(**data)
     # print(yaml_dumper.dumps(data_instance))
-    validator = JsonSchemaDataValidator(schema_view.schema)
     validator.validate_object(data_instance)
 
 
 def validate_bed(bed_path: Path, bed_type=Literal["primer", "scheme"]):
-    bed_columns = count_tsv_columns(bed_path)
+    check_bed_columns(count_tsv_columns(bed_path), bed_type=bed_type)
+    if bed_type == "primer":
+        hash_primer_bed(bed_path)
+    elif bed_type == "scheme":
+        hash_scheme_bed(
+            bed_path=bed_path,
+            fasta_path=find_compressed(bed_path.parent / "reference.fasta"),
+        )
+
+
+def check_bed_columns(bed_columns: int, bed_type=Literal["primer", "scheme"]):
     if bed_type == "primer" and bed_columns != 7:
         raise RuntimeError(
             f"Primer bed files should have 7 columns: {PRIMER_BED_FIELDS}"
@@ -211,16 +581,12 @@ def validate_bed(bed_path: Path, bed_type=Literal["primer", "scheme"]):
     else:
         logging.info(f"Detected {bed_type} bed file with {bed_columns} columns")
 
-    if bed_type == "primer":
-        hash_primer_bed(bed_path)
-    elif bed_type == "scheme":
-        hash_scheme_bed(
-            bed_path=bed_path, fasta_path=bed_path.parent / "reference.fasta"
-        )
-
 
 def infer_bed_type(bed_path: Path) -> str:
-    bed_columns = count_tsv_columns(bed_path)
+    return bed_type_from_columns(count_tsv_columns(bed_path))
+
+
+def bed_type_from_columns(bed_columns: int) -> str:
     if bed_columns == 7:
         bed_type = "primer"
     elif bed_columns == 6:
@@ -232,64 +598,522 @@ def infer_bed_type(bed_path: Path) -> str:
     return bed_type
 
 
-def validate(scheme_dir: Path, force: bool = False):
-    # schema_path = get_primer_schemes_path() / "schema/scheme_schema.latest.json"
-    logging.info(f"Validating {scheme_dir}")
-    validate_bed(scheme_dir / "primer.bed", bed_type="primer")
-    # validate_yaml_with_json_schema(
-    #     yaml_path=scheme_dir / "info.yml", schema_path=schema_path
-    # )
-    schema_path = get_primer_schemes_path() / "schema/primer_scheme.yml"
-    validate_with_linkml_schema(
-        yaml_path=scheme_dir / "info.yml", schema_path=schema_path
+class SchemeBundle:
+    """
+    Primer scheme directory containing info.yml, reference.fasta and primer.bed
+    (or scheme.bed). Each file is read at most once; parsed tables and checksums
+    are computed on first access and memoised
+    """
+
+    def __init__(self, scheme_dir: Path):
+        self.scheme_dir = Path(scheme_dir)
+
+    def __repr__(self):
+        return f"SchemeBundle({str(self.scheme_dir)!r})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the reference if it was opened"""
+        reference = self.__dict__.pop("reference", None)
+        if reference is not None:
+            reference.close()
+
+    @property
+    def info_path(self) -> Path:
+        return self.scheme_dir / "info.yml"
+
+    @cached_property
+    def reference_path(self) -> Path:
+        """Path of reference.fasta, or of reference.fasta.gz or .bgz if absent"""
+        return find_compressed(self.scheme_dir / "reference.fasta")
+
+    @cached_property
+    def bed_path(self) -> Path:
+        """
+        Path of primer.bed, or of scheme.bed if the bundle has no primer.bed,
+        either of which may be compressed
+        """
+        primer_bed_path = find_compressed(self.scheme_dir / "primer.bed")
+        scheme_bed_path = find_compressed(self.scheme_dir / "scheme.bed")
+        if not primer_bed_path.exists() and scheme_bed_path.exists():
+            return scheme_bed_path
+        return primer_bed_path
+
+    @property
+    def bed_file_type(self) -> str:
+        """Bed type implied by the bed file's name, primer or scheme"""
+        return (
+            "scheme" if uncompressed_name(self.bed_path) == "scheme.bed" else "primer"
+        )
+
+    @cached_property
+    def info(self) -> dict:
+        return parse_yaml(self.info_path)
+
+    @cached_property
+    def bed_columns(self) -> int:
+        return count_tsv_columns(self.bed_path)
+
+    @cached_property
+    def bed_type(self) -> str:
+        return bed_type_from_columns(self.bed_columns)
+
+    @cached_property
+    def bed_table(self) -> BedTable:
+        """Bed table as parsed from disk, with 6 or 7 columns"""
+        if self.bed_type == "primer":
+            return read_bed(self.bed_path, PRIMER_BED_FIELDS)
+        else:
+            return read_bed(self.bed_path, SCHEME_BED_FIELDS)
+
+    @cached_property
+    def primer_table(self) -> BedTable:
+        """7 column bed table, backfilling sequences from the reference if needed"""
+        if self.bed_type == "primer":
+            return self.bed_table
+        else:
+            logging.info(f"Backfilling {self.bed_path} using {self.reference_path}")
+            return backfill_table(self.bed_table, self.reference)
+
+    @cached_property
+    def bed_df(self) -> pd.DataFrame:
+        return self.bed_table.to_pandas()
+
+    @cached_property
+    def primer_df(self) -> pd.DataFrame:
+        if self.bed_type == "primer":
+            return self.bed_df
+        else:
+            return self.primer_table.to_pandas()
+
+    @cached_property
+    def primer_checksum(self) -> str:
+        if self.bed_type == "primer":
+            paths = [self.bed_path]
+        else:
+            paths = [self.bed_path, self.reference_path]
+        return cached_checksum(
+            self.bed_type, paths, lambda: hash_primer_table(self.primer_table)
+        )
+
+    @cached_property
+    def reference(self) -> Reference:
+        return Reference(self.reference_path)
+
+    @cached_property
+    def reference_record(self):
+        """Biopython SeqRecord of a single record reference"""
+        from Bio import SeqIO
+
+        with open_text(self.reference_path) as fh:
+            return SeqIO.read(fh, "fasta")
+
+    @cached_property
+    def reference_checksum(self) -> str:
+        return cached_checksum(
+            "reference", [self.reference_path], lambda: hash_reference(self.reference)
+        )
+
+
+def open_bundle(scheme_dir: Path | SchemeBundle):
+    """
+    Return a context manager yielding a bundle for a scheme directory, which
+    is closed on exit unless it was passed in already open
+    """
+    if isinstance(scheme_dir, SchemeBundle):
+        return nullcontext(scheme_dir)
+    return SchemeBundle(scheme_dir)
+
+
+@metrics.timed
+def validate(scheme_dir: Path | SchemeBundle, force: bool = False):
+    with open_bundle(scheme_dir) as bundle:
+        # schema_path = get_primer_schemes_path() / "schema/scheme_schema.latest.json"
+        logging.info(f"Validating {bundle.scheme_dir}")
+        check_bed_columns(bundle.bed_columns, bed_type=bundle.bed_file_type)
+        # validate_yaml_with_json_schema(
+        #     yaml_path=scheme_dir / "info.yml", schema_path=schema_path
+        # )
+        schema_path = get_primer_schemes_path() / "schema/primer_scheme.yml"
+        validate_with_linkml_schema(
+            yaml_path=bundle.info_path, schema_path=schema_path, data=bundle.info
+        )
+        scheme = bundle.info
+        existing_primer_checksum = scheme.get("primer_checksum")
+        existing_reference_checksum = scheme.get("reference_checksum")
+        primer_checksum = bundle.primer_checksum
+        reference_checksum = bundle.reference_checksum
+        if (
+            existing_primer_checksum
+            and not primer_checksum == existing_primer_checksum
+            and not force
+        ):
+            raise RuntimeError(
+                f"Calculated and documented primer checksums do not match ({primer_checksum} and {existing_primer_checksum})"
+            )
+        elif not primer_checksum == existing_primer_checksum:
+            logging.warning(
+                f"Calculated and documented primer checksums do not match ({primer_checksum} and {existing_primer_checksum})"
+            )
+        if (
+            existing_reference_checksum
+            and not reference_checksum == existing_reference_checksum
+            and not force
+        ):
+            raise RuntimeError(
+                f"Calculated and documented reference checksums do not match ({reference_checksum} and {existing_reference_checksum})"
+            )
+        elif not reference_checksum == existing_reference_checksum:
+            logging.warning(
+                f"Calculated and documented reference checksums do not match ({reference_checksum} and {existing_reference_checksum})"
+            )
+        logging.info(f"Validation successful for {scheme.get('name')} ")
+        return {
+            "primer_checksum": primer_checksum,
+            "reference_checksum": reference_checksum,
+        }
+
+
+def find_scheme_dirs(root_dir: Path) -> list[Path]:
+    """Return sorted paths of directories containing an info.yml"""
+    return sorted(
+        Path(entry.path).parent
+        for entry in scan(root_dir)
+        if entry.is_file() and entry.name == "info.yml"
     )
-    scheme = parse_yaml(scheme_dir / "info.yml")
-    existing_primer_checksum = scheme.get("primer_checksum")
-    existing_reference_checksum = scheme.get("reference_checksum")
-    primer_checksum = hash_bed(scheme_dir / "primer.bed")
-    reference_checksum = hash_ref(scheme_dir / "reference.fasta")
-    if (
-        existing_primer_checksum
-        and not primer_checksum == existing_primer_checksum
-        and not force
-    ):
+
+
+def run_scheme_task(func, scheme_dir: Path, kwargs: dict) -> dict:
+    """
+    Call func for a single scheme, returning a dict of its return value, an
+    error message, which is None upon success, and stage metrics if enabled
+    """
+    with metrics.collect_scheme() as scheme_metrics:
+        try:
+            result = {"error": None, **(func(scheme_dir=scheme_dir, **kwargs) or {})}
+        except Exception as e:
+            logging.error(f"Failed to process {scheme_dir}: {e}")
+            result = {"error": f"{type(e).__name__}: {e}"}
+    if scheme_metrics:
+        result["metrics"] = scheme_metrics
+    return result
+
+
+def run_recursive(
+    func,
+    scheme_dirs: list[Path],
+    jobs: int = 1,
+    scheme_kwargs: dict[Path, dict] | None = None,
+    **kwargs,
+) -> dict[Path, dict]:
+    """
+    Call func for each scheme directory, using a pool of worker processes if jobs > 1.
+    Returns a dict of results containing an error message (None upon success) in
+    scheme_dirs order. scheme_kwargs optionally adds per-scheme keyword arguments.
+    jobs=0 uses all available CPUs
+    """
+    scheme_kwargs = scheme_kwargs or {}
+    kwargs_list = [{**kwargs, **scheme_kwargs.get(p, {})} for p in scheme_dirs]
+    if jobs == 1 or len(scheme_dirs) < 2:
+        results = list(map(run_scheme_task, repeat(func), scheme_dirs, kwargs_list))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            results = list(
+                executor.map(run_scheme_task, repeat(func), scheme_dirs, kwargs_list)
+            )
+    for scheme_dir, result in zip(scheme_dirs, results):
+        if "metrics" in result:
+            metrics.record_scheme(str(scheme_dir), result.pop("metrics"))
+    return dict(zip(scheme_dirs, results))
+
+
+def summarise_results(results: dict[Path, dict], action: str):
+    """Log per-scheme outcomes, raising RuntimeError if any scheme failed"""
+    for path, result in results.items():
+        if result["error"]:
+            logging.info(f"FAILED {path}: {result['error']}")
+        elif result.get("skipped"):
+            logging.info(f"UNCHANGED {path}")
+        else:
+            logging.info(f"OK {path}")
+    failures = [str(path) for path, result in results.items() if result["error"]]
+    skipped = [path for path, result in results.items() if result.get("skipped")]
+    logging.info(
+        f"{action.capitalize()} succeeded for {len(results) - len(failures)} of {len(results)} schemes ({len(skipped)} unchanged)"
+    )
+    if failures:
         raise RuntimeError(
-            f"Calculated and documented primer checksums do not match ({primer_checksum} and {existing_primer_checksum})"
-        )
-    elif not primer_checksum == existing_primer_checksum:
-        logging.warning(
-            f"Calculated and documented primer checksums do not match ({primer_checksum} and {existing_primer_checksum})"
+            f"{action.capitalize()} failed for {len(failures)} schemes: {', '.join(failures)}"
         )
+
+
+def fingerprint_file(path: Path, previous: dict | None = None) -> dict:
+    """
+    Return size, mtime and SHA256 digest of a file, reusing the previous digest
+    if size and mtime are unchanged
+    """
+    stat = os.stat(path)
     if (
-        existing_reference_checksum
-        and not reference_checksum == existing_reference_checksum
-        and not force
+        previous
+        and previous["size"] == stat.st_size
+        and previous["mtime_ns"] == stat.st_mtime_ns
     ):
-        raise RuntimeError(
-            f"Calculated and documented reference checksums do not match ({reference_checksum} and {existing_reference_checksum})"
-        )
-    elif not reference_checksum == existing_reference_checksum:
-        logging.warning(
-            f"Calculated and documented reference checksums do not match ({reference_checksum} and {existing_reference_checksum})"
-        )
-    logging.info(f"Validation successful for {scheme.get('name')} ")
+        return previous
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": hash_file(path),
+    }
+
+
+@metrics.timed
+def fingerprint_dir(dir_path: Path, previous: dict | None = None) -> dict:
+    """
+    Fingerprint regular files in a directory (non-recursively) by file name,
+    ignoring index files derived from them
+    """
+    previous = previous or {}
+    return {
+        entry.name: fingerprint_file(entry.path, previous.get(entry.name))
+        for entry in sorted(os.scandir(dir_path), key=lambda e: e.name)
+        if entry.is_file() and not entry.name.endswith(INDEX_SUFFIXES)
+    }
+
+
+def fingerprints_match(fingerprints: dict, previous: dict) -> bool:
+    """Compare fingerprints by content digest, ignoring sizes and mtimes"""
+    return {k: v["sha256"] for k, v in fingerprints.items()} == {
+        k: v["sha256"] for k, v in previous.items()
+    }
+
+
+def get_state_path(root_dir: Path, action: str, out_dir: Path | None = None) -> Path:
+    """
+    Default state file location for a recursive action upon a directory tree,
+    distinct for each output directory the action writes to
+    """
+    key = str(Path(root_dir).resolve())
+    if out_dir is not None:
+        key += f"\n{Path(out_dir).resolve()}"
+    root_digest = hashlib.sha256(key.encode()).hexdigest()
+    return get_cache_dir() / "state" / f"{action}-{root_digest[:16]}.json"
+
+
+def load_state(state_path: Path) -> dict:
+    """Load bundle records from a state file, ignoring missing or unreadable files"""
+    try:
+        with open(state_path, "r") as fh:
+            return json.load(fh)["bundles"]
+    except FileNotFoundError:
+        return {}
+    except (ValueError, KeyError):
+        logging.warning(f"Ignoring unreadable state file {state_path}")
+        return {}
 
 
-def validate_recursive(root_dir: Path, force: bool = False):
-    """Validate all schemes in a directory tree"""
-    schemes_paths = {}
-    for entry in scan(root_dir):
-        if entry.is_file() and entry.name == "info.yml":
-            scheme_dir = Path(entry.path).parent
-            scheme = scheme_dir.name
-            schemes_paths[scheme] = scheme_dir
+def save_state(state_path: Path, bundles: dict):
+    state_path = Path(state_path)
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state = {"primaschema_version": __version__, "bundles": bundles}
+    write_bytes_atomic(state_path, json.dumps(state, indent=1).encode())
 
-    for scheme, path in schemes_paths.items():
-        validate(scheme_dir=path, force=force)
 
+def remove_stale_outputs(paths, out_dir: Path):
+    """
+    Delete output files no longer produced, and any directories below out_dir
+    which they leave empty
+    """
+    out_dir = Path(out_dir).resolve()
+    for path in sorted(map(Path, paths)):
+        logging.info(f"Removing stale output {path}")
+        path.unlink(missing_ok=True)
+        parent = path.parent
+        while parent != out_dir and parent.is_relative_to(out_dir):
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+
+def run_incremental(
+    func,
+    action: str,
+    root_dir: Path,
+    jobs: int = 1,
+    state_path: Path | None = None,
+    full: bool = False,
+    out_dir: Path | None = None,
+    **kwargs,
+) -> dict[Path, dict]:
+    """
+    Run func for scheme bundles in root_dir whose inputs or outputs changed since
+    their last successful run, as recorded in a state file of input and output
+    fingerprints and checksums. Unchanged bundles are reported as skipped.
+    out_dir is the directory func writes outputs to, if any. Outputs recorded
+    for a bundle but not produced again when it is rerun are deleted
+    """
+    scheme_dirs = find_scheme_dirs(root_dir)
+    state_path = state_path or get_state_path(root_dir, action, out_dir)
+    state = {} if full else load_state(state_path)
+    schema_path = get_primer_schemes_path() / "schema/primer_scheme.yml"
+    context = {"version": __version__, "schema": hash_file(schema_path), **kwargs}
+    if out_dir is not None:
+        context["out_dir"] = str(Path(out_dir).resolve())
+    bundles, inputs, pending, scheme_kwargs, results = {}, {}, [], {}, {}
+    for scheme_dir in scheme_dirs:
+        key = str(scheme_dir.resolve())
+        record = state.get(key, {})
+        inputs[scheme_dir] = fingerprint_dir(scheme_dir, record.get("inputs"))
+        if record and record["context"] == context:
+            outputs = record["outputs"]
+            try:
+                outputs = {
+                    path: fingerprint_file(path, fingerprint)
+                    for path, fingerprint in outputs.items()
+                }
+                unchanged = fingerprints_match(inputs[scheme_dir], record["inputs"])
+                unchanged = unchanged and fingerprints_match(outputs, record["outputs"])
+            except FileNotFoundError:
+                unchanged = False
+            if unchanged:
+                bundles[key] = {
+                    **record,
+                    "inputs": inputs[scheme_dir],
+                    "outputs": outputs,
+                }
+                results[scheme_dir] = {
+                    "error": None,
+                    "skipped": True,
+                    **record["checksums"],
+                }
+                continue
+        if record.get("outputs"):
+            scheme_kwargs[scheme_dir] = {"overwrite": True}
+        pending.append(scheme_dir)
+
+    logging.info(f"{len(pending)} of {len(scheme_dirs)} schemes changed")
+    if jobs != 1 and len(pending) > 1:  # Compile and warm validator before forking
+        load_linkml_schema(schema_path)
+    results |= run_recursive(
+        func, pending, jobs=jobs, scheme_kwargs=scheme_kwargs, **kwargs
+    )
+    for scheme_dir in pending:
+        result = results[scheme_dir]
+        if result["error"]:
+            continue
+        outputs = {}
+        if result.get("out_dir"):
+            outputs = {
+                str(Path(result["out_dir"]) / name): fingerprint
+                for name, fingerprint in fingerprint_dir(result["out_dir"]).items()
+            }
+        previous_outputs = state.get(str(scheme_dir.resolve()), {}).get("outputs", {})
+        if out_dir is not None:
+            remove_stale_outputs(previous_outputs.keys() - outputs.keys(), out_dir)
+        bundles[str(scheme_dir.resolve())] = {
+            "context": context,
+            "inputs": inputs[scheme_dir],
+            "outputs": outputs,
+            "checksums": {
+                "primer_checksum": result["primer_checksum"],
+                "reference_checksum": result["reference_checksum"],
+            },
+        }
+    save_state(state_path, bundles)
+    return {scheme_dir: results[scheme_dir] for scheme_dir in scheme_dirs}
+
+
+def validate_recursive(
+    root_dir: Path,
+    force: bool = False,
+    jobs: int = 1,
+    state_path: Path | None = None,
+    full: bool = False,
+):
+    """
+    Validate all schemes in a directory tree, skipping bundles unchanged since
+    their last successful validation unless full=True
+    """
+    results = run_incremental(
+        validate,
+        action="validate",
+        root_dir=root_dir,
+        jobs=jobs,
+        state_path=state_path,
+        full=full,
+        force=force,
+    )
+    summarise_results(results, action="validation")
+    return results
 
+
+def link_input(store: ObjectStore, path: Path, dest_path: Path):
+    """Place an input file in a built bundle via a store, decompressing gzip input"""
+    import tempfile
+
+    if not is_gzip(path):
+        return store.link(path, dest_path)
+    store.root_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=store.root_dir, suffix=".tmp") as temp_fh:
+        with open_bytes(path) as fh:
+            shutil.copyfileobj(fh, temp_fh, 1 << 20)
+        temp_fh.flush()
+        return store.link(temp_fh.name, dest_path)
+
+
+def get_built_dir(scheme: dict, nested: bool = True) -> Path:
+    """
+    Return the directory a scheme is built to, built/<name> or, if nested,
+    built/<organism>/<family>/<version>
+    """
+    if nested:
+        family, _, version = scheme["name"].partition("-")
+        return Path("built") / scheme["organism"] / family / version
+    return Path("built") / scheme["name"]
+
+
+def check_built_dirs(root_dir: Path, nested: bool = True, jobs: int = 1):
+    """
+    Raise RuntimeError if schemes in a directory tree would be built to the
+    same directory, reading names from the manifest's metadata state file
+    """
+    info_paths = [scheme_dir / "info.yml" for scheme_dir in find_scheme_dirs(root_dir)]
+    state_path = get_state_path(root_dir, "manifest")
+    schemes_dirs = defaultdict(list)
+    for info_path, scheme in zip(
+        info_paths, read_scheme_metadata(info_paths, jobs=jobs, state_path=state_path)
+    ):
+        try:
+            built_dir = get_built_dir(scheme, nested=nested)
+        except KeyError:
+            continue  # Reported when the scheme fails validation
+        schemes_dirs[built_dir].append(str(info_path.parent))
+    collisions = [
+        f"{built_dir} ({', '.join(dirs)})"
+        for built_dir, dirs in schemes_dirs.items()
+        if len(dirs) > 1
+    ]
+    if collisions:
+        raise RuntimeError(
+            f"Schemes would be built to the same directory: {'; '.join(collisions)}"
+        )
+
+
+@metrics.timed
 def build(
-    scheme_dir: Path, out_dir: Path = Path(), force: bool = False, nested: bool = True
+    scheme_dir: Path,
+    out_dir: Path = Path(),
+    force: bool = False,
+    nested: bool = True,
+    overwrite: bool = False,
 ):
     """
     Build a PHA4GE primer scheme bundle.
@@ -297,47 +1121,145 @@ def build(
     primer.bed or reference.bed, generate a directory containing info.yml including
     primer and reference checksums and a canonical primer.bed representation.
     """
-    validate(scheme_dir=scheme_dir, force=force)
-    scheme = parse_yaml(scheme_dir / "info.yml")
-    if nested:
-        family = Path(scheme["name"].partition("-")[0])
-        version = Path(scheme["name"].partition("-")[2])
-        out_dir = Path("built") / scheme["organism"] / family / version
+    import yaml
+
+    with SchemeBundle(scheme_dir) as bundle:
+        validate(bundle, force=force)
+        scheme = dict(bundle.info)
+        out_dir = get_built_dir(scheme, nested=nested)
+        try:
+            out_dir.mkdir(parents=True, exist_ok=force or overwrite)
+        except FileExistsError:
+            raise FileExistsError(f"Output directory {out_dir} already exists")
+        scheme["primer_checksum"] = bundle.primer_checksum
+        scheme["reference_checksum"] = bundle.reference_checksum
+
+        # Files are written under temporary names and renamed into place, with
+        # copied inputs linked from a store holding one copy of each distinct file
+        store = ObjectStore(Path("built") / ".objects")
+        with atomic_path(out_dir / "info.yml") as temp_path:
+            logging.info(f"Writing info.yml to {out_dir}/info.yml")
+            with open(temp_path, "w") as scheme_fh:
+                yaml.dump(scheme, scheme_fh, sort_keys=False)
+        with metrics.stage("build.link"):
+            if bundle.bed_type == "primer":
+                logging.info(f"Adding primer.bed to {out_dir}/primer.bed")
+                link_input(store, bundle.bed_path, out_dir / "primer.bed")
+            logging.info(f"Adding reference.fasta to {out_dir}/reference.fasta")
+            link_input(store, bundle.reference_path, out_dir / "reference.fasta")
+        if bundle.bed_type == "scheme":
+            logging.info(f"Writing primer.bed to {out_dir}/primer.bed")
+            with atomic_path(out_dir / "primer.bed") as temp_path:
+                bundle.primer_table.write(temp_path)
+        logging.info(f"Writing scheme.bed to {out_dir}/scheme.bed")
+        with atomic_path(out_dir / "scheme.bed") as temp_path:
+            bundle.bed_table.select(SCHEME_BED_FIELDS).write(temp_path)
+        return {
+            "primer_checksum": scheme["primer_checksum"],
+            "reference_checksum": scheme["reference_checksum"],
+            "out_dir": str(out_dir.resolve()),
+        }
+
+
+def build_recursive(
+    root_dir: Path,
+    force: bool = False,
+    nested: bool = False,
+    jobs: int = 1,
+    state_path: Path | None = None,
+    full: bool = False,
+):
+    """
+    Build all schemes in a directory tree, skipping bundles whose inputs and
+    built outputs are unchanged since their last successful build unless full=True.
+    Raises RuntimeError before building if any schemes share an output directory
+    """
+    check_built_dirs(root_dir, nested=nested, jobs=jobs)
+    results = run_incremental(
+        build,
+        action="build",
+        root_dir=root_dir,
+        jobs=jobs,
+        state_path=state_path,
+        full=full,
+        out_dir=Path("built"),
+        force=force,
+        nested=nested,
+    )
+    ObjectStore(Path("built") / ".objects").prune()
+    summarise_results(results, action="build")
+    return results
+
+
+MANIFEST_FIELDS = ["name", "organism", "display_name", "repository_url"]
+
+
+@metrics.timed
+def parse_scheme_metadata(info_path: Path) -> dict:
+    """Parse the fields of an info.yml needed for the manifest"""
+    scheme = parse_yaml(info_path)
+    return {field: scheme[field] for field in MANIFEST_FIELDS if field in scheme}
+
+
+def read_scheme_metadata(
+    info_paths: list[Path],
+    jobs: int = 1,
+    state_path: Path | None = None,
+) -> list[dict]:
+    """
+    Return manifest metadata for info.yml files, reusing metadata recorded in a
+    state file (keyed by resolved path) for files of unchanged size and mtime,
+    and parsing the rest in parallel if jobs > 1 (0 uses all CPUs)
+    """
+    previous = load_state(state_path) if state_path else {}
+    keys = [str(Path(info_path).resolve()) for info_path in info_paths]
+    entries, misses = {}, []
+    for info_path, key in zip(info_paths, keys):
+        stat = os.stat(info_path)
+        entry = previous.get(key)
+        if (
+            entry
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            entries[key] = entry
+        else:
+            misses.append((info_path, key, stat))
+    miss_paths = [info_path for info_path, _, _ in misses]
+    if jobs == 1 or len(misses) < 2:
+        parsed = list(map(parse_scheme_metadata, miss_paths))
     else:
-        out_dir = Path("built") / scheme["name"]
-    try:
-        out_dir.mkdir(parents=True, exist_ok=force)
-    except FileExistsError:
-        raise FileExistsError(f"Output directory {out_dir} already exists")
-    scheme["primer_checksum"] = hash_bed(scheme_dir / "primer.bed")
-    scheme["reference_checksum"] = hash_ref(scheme_dir / "reference.fasta")
-    with open(out_dir / "info.yml", "w") as scheme_fh:
-        logging.info(f"Writing info.yml to {out_dir}/info.yml")
-        yaml.dump(scheme, scheme_fh, sort_keys=False)
-    logging.info(f"Copying primer.bed to {out_dir}/primer.bed")
-    shutil.copy(scheme_dir / "primer.bed", out_dir)
-    logging.info(f"Copying reference.fasta to {out_dir}/reference.fasta")
-    shutil.copy(scheme_dir / "reference.fasta", out_dir)
-    logging.info(f"Writing scheme.bed to {out_dir}/scheme.bed")
-    convert_primer_bed_to_scheme_bed(bed_path=out_dir / "primer.bed")
-    shutil.copy("scheme.bed", out_dir.resolve())
-    os.remove("scheme.bed")
-
-
-def build_recursive(root_dir: Path, force: bool = False, nested: bool = False):
-    """Build all schemes in a directory tree"""
-    schemes_paths = {}
-    for entry in scan(root_dir):
-        if entry.is_file() and entry.name == "info.yml":
-            scheme = parse_yaml(entry.path)
-            scheme_dir = Path(entry.path).parent
-            schemes_paths[scheme.get("name")] = scheme_dir
-    for scheme, path in schemes_paths.items():
-        build(scheme_dir=path, force=force)
-
-
-def build_manifest(root_dir: Path, schema_dir: Path, out_dir: Path = Path()):
-    """Build manifest of schemes inside the specified directory"""
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            parsed = list(executor.map(parse_scheme_metadata, miss_paths, chunksize=16))
+    for (_, key, stat), metadata in zip(misses, parsed):
+        entries[key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "metadata": metadata,
+        }
+    logging.info(f"Parsed {len(misses)} of {len(info_paths)} info.yml files")
+    if state_path and (misses or entries.keys() != previous.keys()):
+        save_state(state_path, entries)
+    return [entries[key]["metadata"] for key in keys]
+
+
+def build_manifest(
+    root_dir: Path,
+    schema_dir: Path,
+    out_dir: Path = Path(),
+    jobs: int = 1,
+    state_path: Path | None = None,
+    full: bool = False,
+):
+    """
+    Build manifest of schemes inside the specified directory. Scheme metadata
+    is cached in a state file and only changed info.yml files are parsed unless
+    full=True
+    """
+    import yaml
+
     schema_path = get_primer_schemes_path() / "schema/manifest.json"
     organisms = parse_yaml(Path(schema_dir) / "organisms.yml")
     manifest = {
@@ -349,15 +1271,21 @@ def build_manifest(root_dir: Path, schema_dir: Path, out_dir: Path = Path()):
         "organisms": organisms,
     }
 
+    info_paths = [
+        Path(entry.path)
+        for entry in scan(root_dir)
+        if entry.is_file() and entry.name == "info.yml"
+    ]
+    state_path = state_path or get_state_path(root_dir, "manifest")
+    if full:
+        state_path.unlink(missing_ok=True)
     names_schemes = {}
     families_names = defaultdict(list)
-    for entry in scan(root_dir):
-        if entry.is_file() and entry.name == "info.yml":
-            scheme = parse_yaml(entry.path)
-            name = scheme["name"]
-            names_schemes[name] = scheme
-            family, _, version = scheme["name"].partition("-")
-            families_names[family].append(name)
+    for scheme in read_scheme_metadata(info_paths, jobs=jobs, state_path=state_path):
+        name = scheme["name"]
+        names_schemes[name] = scheme
+        family, _, version = scheme["name"].partition("-")
+        families_names[family].append(name)
 
     families_data = []
     for family, names in sorted(families_names.items()):
@@ -385,29 +1313,125 @@ def build_manifest(root_dir: Path, schema_dir: Path, out_dir: Path = Path()):
     manifest["schemes"] = families_data
 
     manifest_file_name = "index.yml"
-    with open(out_dir / manifest_file_name, "w") as fh:
+    with atomic_path(out_dir / manifest_file_name) as temp_path:
         logging.info(f"Writing {manifest_file_name} to {out_dir}/{manifest_file_name}")
-        yaml.dump(data=manifest, stream=fh, sort_keys=False)
-    validate_yaml_with_json_schema(
-        yaml_path=out_dir / manifest_file_name, schema_path=schema_path
-    )
+        with open(temp_path, "w") as fh:
+            yaml.dump(data=manifest, stream=fh, sort_keys=False)
+    validate_with_json_schema(manifest, schema_path=schema_path)
 
 
 def diff(bed1_path: Path, bed2_path: Path):
     """Show symmetric differences between records in two primer.bed files"""
-    df1 = parse_primer_bed(bed1_path).assign(origin="bed1")
-    df2 = parse_primer_bed(bed2_path).assign(origin="bed2")
-    return pd.concat([df1, df2]).drop_duplicates(subset=PRIMER_BED_FIELDS, keep=False)
+    return diff_tables(
+        read_bed(bed1_path, PRIMER_BED_FIELDS), read_bed(bed2_path, PRIMER_BED_FIELDS)
+    )
 
 
-def show_non_ref_alts(scheme_dir: Path):
-    """Show primer records with sequences not matching the reference sequence"""
-    bed_path = scheme_dir / "primer.bed"
-    fasta_path = scheme_dir / "reference.fasta"
-    with TemporaryDirectory() as temp_dir:
-        convert_scheme_bed_to_primer_bed(
-            bed_path=scheme_dir / "scheme.bed",
-            fasta_path=scheme_dir / "reference.fasta",
-            out_dir=temp_dir,
+def diff_tables(table1: BedTable, table2: BedTable) -> pd.DataFrame:
+    """
+    Show symmetric differences between records in two 7 column BedTables as a
+    dataframe. Records occurring more than once across both tables are dropped
+    """
+    records1 = list(table1.records(PRIMER_BED_FIELDS))
+    records2 = list(table2.records(PRIMER_BED_FIELDS))
+    counts = Counter(records1)
+    counts.update(records2)
+    table = BedTable.from_records([], PRIMER_BED_FIELDS)
+    index, origins = [], []
+    for origin, records in (("bed1", records1), ("bed2", records2)):
+        for i, record in enumerate(records):
+            if counts[record] == 1:
+                table.append(record)
+                index.append(i)
+                origins.append(origin)
+    df = table.to_pandas().assign(origin=origins)
+    df.index = index
+    return df
+
+
+NON_REF_ALT_FIELDS = PRIMER_BED_FIELDS + [
+    "reference_sequence",
+    "mismatches",
+    "edit_distance",
+]
+
+
+def mismatch_positions(sequence: str, ref_sequence: str) -> list[int]:
+    """
+    Return 0-based positions from the 5' end at which two sequences differ,
+    ignoring case. Positions beyond the shorter sequence count as mismatches
+    """
+    sequence, ref_sequence = sequence.upper(), ref_sequence.upper()
+    positions = [i for i, (a, b) in enumerate(zip(sequence, ref_sequence)) if a != b]
+    positions += range(
+        min(len(sequence), len(ref_sequence)), max(len(sequence), len(ref_sequence))
+    )
+    return positions
+
+
+def edit_distance(sequence: str, ref_sequence: str) -> int:
+    """Return the Levenshtein distance between two sequences, ignoring case"""
+    sequence, ref_sequence = sequence.upper(), ref_sequence.upper()
+    previous = list(range(len(ref_sequence) + 1))
+    for i, a in enumerate(sequence, 1):
+        current = [i]
+        for j, b in enumerate(ref_sequence, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b))
+            )
+        previous = current
+    return previous[-1]
+
+
+@metrics.timed
+def find_non_ref_alts(scheme_dir: Path | SchemeBundle) -> list[tuple]:
+    """
+    Compare each primer sequence of a scheme with its reference slice, returning
+    records of primers that differ with the reference sequence, 5' mismatch
+    positions and edit distance appended
+    """
+    with open_bundle(scheme_dir) as bundle:
+        table = bundle.primer_table
+        ref_sequences = backfill_columns(
+            bundle.reference, *(table[field] for field in SCHEME_BED_FIELDS)
         )
-        return diff(bed1_path=bed_path, bed2_path=Path(temp_dir) / "primer.bed")
+        alts = []
+        for record, ref_sequence in zip(
+            table.records(PRIMER_BED_FIELDS), ref_sequences
+        ):
+            sequence = record[6]
+            if sequence.upper() != ref_sequence.upper():
+                mismatches = ",".join(
+                    map(str, mismatch_positions(sequence, ref_sequence))
+                )
+                distance = edit_distance(sequence, ref_sequence)
+                alts.append(record + (ref_sequence, mismatches, distance))
+        return alts
+
+
+def show_non_ref_alts(scheme_dir: Path) -> pd.DataFrame:
+    """Show primer records with sequences not matching the reference sequence"""
+    import pandas as pd
+
+    return pd.DataFrame(find_non_ref_alts(scheme_dir), columns=NON_REF_ALT_FIELDS)
+
+
+def _non_ref_alts_task(scheme_dir: Path) -> dict:
+    return {"alts": find_non_ref_alts(scheme_dir)}
+
+
+def show_non_ref_alts_recursive(root_dir: Path, jobs: int = 1) -> pd.DataFrame:
+    """
+    Show primer records not matching the reference sequence for all schemes in a
+    directory tree as one table, scanning schemes in parallel if jobs > 1
+    """
+    import pandas as pd
+
+    results = run_recursive(_non_ref_alts_task, find_scheme_dirs(root_dir), jobs=jobs)
+    summarise_results(results, action="scan")
+    rows = [
+        (str(scheme_dir.relative_to(root_dir)),) + alt
+        for scheme_dir, result in results.items()
+        for alt in result["alts"]
+    ]
+    return pd.DataFrame(rows, columns=["scheme"] + NON_REF_ALT_FIELDS)
@@ -0,0 +1,189 @@
+"""Merkle tree digests of primer scheme trees for fast verification and comparison"""
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import primaschema.lib as lib
+from primaschema import __version__
+
+
+LEAF_FIELDS = ["primer_checksum", "reference_checksum", "info_sha256"]
+
+
+def leaf_digest(leaf: dict) -> str:
+    """Digest of a bundle's primer and reference checksums and info.yml digest"""
+    data = json.dumps({field: leaf[field] for field in LEAF_FIELDS}, sort_keys=True)
+    return hashlib.sha256(f"bundle\n{data}".encode()).hexdigest()
+
+
+def node_digest(children: dict[str, str]) -> str:
+    """Digest of a directory from the names and digests of its children"""
+    data = "".join(f"{name}\t{children[name]}\n" for name in sorted(children))
+    return hashlib.sha256(f"tree\n{data}".encode()).hexdigest()
+
+
+def _leaf_task(scheme_dir: Path) -> dict:
+    with lib.SchemeBundle(scheme_dir) as bundle:
+        return {
+            "primer_checksum": bundle.primer_checksum,
+            "reference_checksum": bundle.reference_checksum,
+            "info_sha256": lib.file_digest(bundle.info_path),
+        }
+
+
+class MerkleTree:
+    """
+    Digests of the bundles of a scheme tree (leaves) and of each directory
+    above them, such as organism and family directories, keyed by path
+    relative to the tree root ("" for the root). Leaves keep the fingerprints
+    of their bundle files so that unchanged bundles need not be rehashed
+    """
+
+    def __init__(self, nodes: dict[str, dict]):
+        self.nodes = nodes
+
+    def __repr__(self):
+        n_leaves = sum("leaf" in node for node in self.nodes.values())
+        return f"MerkleTree({self.digest[:16]}, {n_leaves} bundles)"
+
+    @property
+    def digest(self) -> str:
+        return self.nodes[""]["digest"]
+
+    @classmethod
+    def from_leaves(cls, leaves: dict[str, dict]):
+        """Build directory nodes above leaf records keyed by bundle path"""
+        nodes = {
+            path: {"digest": leaf_digest(leaf["leaf"]), **leaf}
+            for path, leaf in leaves.items()
+        }
+        children = {"": {}}
+        for path in leaves:
+            parts = path.split("/")
+            for depth in range(len(parts)):
+                parent = "/".join(parts[:depth])
+                children.setdefault(parent, {})[parts[depth]] = "/".join(
+                    parts[: depth + 1]
+                )
+        for path in sorted(children, key=lambda p: -p.count("/") - bool(p)):
+            child_paths = children[path]
+            nodes[path] = {
+                "digest": node_digest(
+                    {name: nodes[p]["digest"] for name, p in child_paths.items()}
+                ),
+                "children": sorted(child_paths),
+            }
+        return cls(nodes)
+
+    @classmethod
+    def from_dir(
+        cls,
+        root_dir: Path,
+        previous: "MerkleTree | None" = None,
+        jobs: int = 1,
+    ):
+        """
+        Hash the bundles of a tree, reusing leaves of a previous tree whose
+        bundle files are unchanged, and hashing the rest in parallel if jobs > 1
+        """
+        root_dir = Path(root_dir)
+        previous_nodes = previous.nodes if previous else {}
+        leaves, pending, fingerprints = {}, [], {}
+        for scheme_dir in lib.find_scheme_dirs(root_dir):
+            path = scheme_dir.relative_to(root_dir).as_posix()
+            old = previous_nodes.get(path, {})
+            fingerprints[path] = lib.fingerprint_dir(scheme_dir, old.get("fingerprint"))
+            if "leaf" in old and lib.fingerprints_match(
+                fingerprints[path], old["fingerprint"]
+            ):
+                leaves[path] = {"leaf": old["leaf"], "fingerprint": fingerprints[path]}
+            else:
+                pending.append(scheme_dir)
+        logging.info(f"Hashing {len(pending)} of {len(fingerprints)} bundles")
+        results = lib.run_recursive(_leaf_task, pending, jobs=jobs)
+        lib.summarise_results(results, action="hash")
+        for scheme_dir, result in results.items():
+            path = scheme_dir.relative_to(root_dir).as_posix()
+            leaves[path] = {
+                "leaf": {field: result[field] for field in LEAF_FIELDS},
+                "fingerprint": fingerprints[path],
+            }
+        return cls.from_leaves(dict(sorted(leaves.items())))
+
+    @classmethod
+    def load(cls, nodes_path: Path):
+        with open(nodes_path) as fh:
+            data = json.load(fh)
+        if data.get("primaschema_version") != __version__:
+            raise RuntimeError(
+                f"Node file {nodes_path} was written by primaschema {data.get('primaschema_version')}"
+            )
+        return cls(data["nodes"])
+
+    def save(self, nodes_path: Path):
+        data = {"primaschema_version": __version__, "nodes": self.nodes}
+        lib.write_bytes_atomic(nodes_path, json.dumps(data, indent=1).encode())
+
+    def compare(self, other: "MerkleTree") -> list[tuple[str, str]]:
+        """
+        Return (change, path) pairs of bundles added, removed or changed in
+        other, descending only into directories whose digests differ
+        """
+        changes = []
+        stack = [""]
+        while stack:
+            path = stack.pop()
+            node, other_node = self.nodes.get(path), other.nodes.get(path)
+            if node and other_node and node["digest"] == other_node["digest"]:
+                continue
+            elif other_node is None:
+                changes += [("removed", p) for p in self.leaf_paths(path)]
+            elif node is None:
+                changes += [("added", p) for p in other.leaf_paths(path)]
+            elif "leaf" in node and "leaf" in other_node:
+                changes.append(("changed", path))
+            elif "leaf" in node or "leaf" in other_node:
+                changes += [("removed", p) for p in self.leaf_paths(path)]
+                changes += [("added", p) for p in other.leaf_paths(path)]
+            else:
+                names = set(node["children"]) | set(other_node["children"])
+                stack += [f"{path}/{name}" if path else name for name in names]
+        return sorted(changes, key=lambda change: change[1])
+
+    def leaf_paths(self, path: str = "") -> list[str]:
+        """Return paths of bundles at or below a node"""
+        node = self.nodes[path]
+        if "leaf" in node:
+            return [path]
+        return [
+            leaf_path
+            for name in node["children"]
+            for leaf_path in self.leaf_paths(f"{path}/{name}" if path else name)
+        ]
+
+
+def tree_hash(
+    root_dir: Path, nodes_path: Path | None = None, jobs: int = 1, full: bool = False
+) -> MerkleTree:
+    """
+    Compute the Merkle tree of a scheme tree, reusing and then updating the
+    node file at nodes_path if given (unless full=True)
+    """
+    previous = None
+    if nodes_path and Path(nodes_path).exists() and not full:
+        try:
+            previous = MerkleTree.load(nodes_path)
+        except (RuntimeError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring node file: {e}")
+    tree = MerkleTree.from_dir(root_dir, previous=previous, jobs=jobs)
+    if nodes_path:
+        tree.save(nodes_path)
+    return tree
+
+
+def load_tree(path: Path, jobs: int = 1) -> MerkleTree:
+    """Load a Merkle tree from a node file, or compute it for a scheme tree"""
+    if Path(path).is_dir():
+        return MerkleTree.from_dir(path, jobs=jobs)
+    return MerkleTree.load(path)
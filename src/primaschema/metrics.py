@@ -0,0 +1,231 @@
+"""Wall time, call count and peak memory instrumentation of processing stages"""
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from primaschema import __version__
+
+
+ENV_VAR = "PRIMASCHEMA_METRICS"  # Set to enable collection in worker processes
+
+
+def peak_rss_kb(children: bool = False) -> int | None:
+    """Return peak resident set size of this process (or its children) in KiB"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def current_rss_kb() -> int | None:
+    """Return the current resident set size of this process in KiB (Linux only)"""
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            pages = int(fh.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def _new_stage() -> dict:
+    return {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rss_growth_kb": 0}
+
+
+class Collector:
+    """
+    Per-stage call counts, total and maximum wall time, and the largest growth
+    of RSS during a call above the RSS at its start. Nested stages each count
+    their inclusive time and memory
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.schemes = {}
+
+    def __repr__(self):
+        return f"Collector({len(self.stages)} stages, {len(self.schemes)} schemes)"
+
+    def add(self, name: str, seconds: float, rss_growth_kb: int = 0):
+        stage = self.stages.setdefault(name, _new_stage())
+        stage["calls"] += 1
+        stage["seconds"] += seconds
+        stage["max_seconds"] = max(stage["max_seconds"], seconds)
+        stage["rss_growth_kb"] = max(stage["rss_growth_kb"], rss_growth_kb)
+
+    def merge(self, stages: dict):
+        """Add stage metrics collected elsewhere, such as in a worker process"""
+        for name, other in stages.items():
+            stage = self.stages.setdefault(name, _new_stage())
+            stage["calls"] += other["calls"]
+            stage["seconds"] += other["seconds"]
+            stage["max_seconds"] = max(stage["max_seconds"], other["max_seconds"])
+            stage["rss_growth_kb"] = max(stage["rss_growth_kb"], other["rss_growth_kb"])
+
+    def add_scheme(self, scheme: str, scheme_metrics: dict):
+        """Record metrics of one scheme, adding its stages to the totals"""
+        self.schemes[scheme] = scheme_metrics
+        self.merge(scheme_metrics["stages"])
+
+
+_enabled = bool(os.environ.get(ENV_VAR))
+_collector = Collector()
+_scheme_collector = ContextVar("scheme_collector", default=None)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    """Enable collection in this process and in worker processes it starts"""
+    global _enabled
+    _enabled = True
+    os.environ[ENV_VAR] = "1"
+
+
+def reset():
+    global _collector
+    _collector = Collector()
+
+
+def current() -> Collector:
+    return _scheme_collector.get() or _collector
+
+
+def _start() -> tuple:
+    return time.perf_counter(), current_rss_kb(), peak_rss_kb()
+
+
+def _finish(name: str, start: tuple):
+    """
+    Record a call of a stage begun at start. If the process peak RSS rose
+    during the call then the call reached it, otherwise the RSS at the end of
+    the call is the best available bound on its peak
+    """
+    start_time, start_rss, start_peak = start
+    rss_growth_kb = 0
+    if start_rss is not None:
+        end_peak = peak_rss_kb()
+        if end_peak and start_peak and end_peak > start_peak:
+            end_rss = end_peak
+        else:
+            end_rss = current_rss_kb() or start_rss
+        rss_growth_kb = max(end_rss - start_rss, 0)
+    current().add(name, time.perf_counter() - start_time, rss_growth_kb)
+
+
+@contextmanager
+def stage(name: str):
+    """Record the wall time and memory growth of a block as a call of a stage"""
+    if not _enabled:
+        yield
+        return
+    start = _start()
+    try:
+        yield
+    finally:
+        _finish(name, start)
+
+
+def timed(func):
+    """Record each call of a function as a stage named after it"""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        start = _start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _finish(name, start)
+
+    return wrapper
+
+
+@contextmanager
+def collect_scheme():
+    """
+    Collect stage metrics of a block separately, yielding a dict which is
+    filled with its wall time, stages and process peak RSS on exit (and left
+    empty if collection is disabled)
+    """
+    scheme_metrics = {}
+    if not _enabled:
+        yield scheme_metrics
+        return
+    collector = Collector()
+    token = _scheme_collector.set(collector)
+    start = time.perf_counter()
+    try:
+        yield scheme_metrics
+    finally:
+        _scheme_collector.reset(token)
+        scheme_metrics |= {
+            "seconds": time.perf_counter() - start,
+            "pid": os.getpid(),
+            "peak_rss_kb": peak_rss_kb(),
+            "stages": collector.stages,
+        }
+
+
+def record_scheme(scheme: str, scheme_metrics: dict):
+    _collector.add_scheme(scheme, scheme_metrics)
+
+
+def report(wall_seconds: float, argv: list[str] | None = None) -> dict:
+    return {
+        "primaschema_version": __version__,
+        "argv": argv if argv is not None else sys.argv[1:],
+        "wall_seconds": wall_seconds,
+        "peak_rss_kb": peak_rss_kb(),
+        "children_peak_rss_kb": peak_rss_kb(children=True),
+        "stages": dict(
+            sorted(_collector.stages.items(), key=lambda s: -s[1]["seconds"])
+        ),
+        "schemes": _collector.schemes,
+    }
+
+
+@contextmanager
+def session(
+    metrics_path: Path | None = None,
+    profile_path: Path | None = None,
+    argv: list[str] | None = None,
+):
+    """
+    Write a JSON metrics report to metrics_path and/or cProfile statistics of
+    the main process to profile_path upon leaving the block
+    """
+    if metrics_path:
+        enable()
+        reset()
+    profiler = None
+    if profile_path:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall_seconds = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            logging.info(f"Wrote profile to {profile_path}")
+        if metrics_path:
+            with open(metrics_path, "w") as fh:
+                json.dump(report(wall_seconds, argv), fh, indent=2)
+            logging.info(f"Wrote metrics to {metrics_path}")
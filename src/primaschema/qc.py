@@ -0,0 +1,223 @@
+"""Primer quality control: GC content, melting temperature, homopolymers and dimers"""
+from __future__ import annotations
+
+import math
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import primaschema.lib as lib
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+
+# SantaLucia (1998) unified nearest-neighbour parameters, dH (kcal/mol) and
+# dS (cal/K/mol) for 5'-XY-3'/3'-X'Y'-5' stacks
+NN_PARAMS = {
+    "AA/TT": (-7.9, -22.2),
+    "AT/TA": (-7.2, -20.4),
+    "TA/AT": (-7.2, -21.3),
+    "CA/GT": (-8.5, -22.7),
+    "GT/CA": (-8.4, -22.4),
+    "CT/GA": (-7.8, -21.0),
+    "GA/CT": (-8.2, -22.2),
+    "CG/GC": (-10.6, -27.2),
+    "GC/CG": (-9.8, -24.4),
+    "GG/CC": (-8.0, -19.9),
+}
+NN_INIT_AT = (2.3, 4.1)
+NN_INIT_GC = (0.1, -2.8)
+NN_SYMMETRY = (0, -1.4)
+GAS_CONSTANT = 1.987  # cal/K/mol
+BASES = "ACGT"
+QC_FIELDS = lib.PRIMER_BED_FIELDS + [
+    "length",
+    "gc",
+    "tm",
+    "homopolymer",
+    "dimers",
+    "max_dimer_overlap",
+]
+DIMER_FIELDS = ["poolName", "name", "partner", "overlap", "partner_position"]
+_HOMOPOLYMER_RE = re.compile(r"A+|C+|G+|T+", re.IGNORECASE)
+
+
+def encode(sequences: list[str]) -> np.ndarray:
+    """
+    Encode sequences as rows of a uint8 matrix with A, C, G and T as 0-3 and
+    other bases and padding as 4
+    """
+    import numpy as np
+
+    lookup = np.full(256, 4, dtype=np.uint8)
+    for code, base in enumerate(BASES):
+        lookup[ord(base)] = lookup[ord(base.lower())] = code
+    width = max(map(len, sequences), default=0)
+    data = b"".join(s.encode().ljust(width, b"N") for s in sequences)
+    return lookup[np.frombuffer(data, dtype=np.uint8)].reshape(len(sequences), width)
+
+
+def _nn_tables() -> tuple[np.ndarray, np.ndarray]:
+    """Return dH and dS of each dinucleotide indexed by 4 * first + second base"""
+    import numpy as np
+
+    complement = dict(zip(BASES, "TGCA"))
+    dh, ds = np.zeros(16), np.zeros(16)
+    for i, x in enumerate(BASES):
+        for j, y in enumerate(BASES):
+            key = f"{x}{y}/{complement[x]}{complement[y]}"
+            dh[4 * i + j], ds[4 * i + j] = NN_PARAMS.get(key) or NN_PARAMS[key[::-1]]
+    return dh, ds
+
+
+def melting_temperatures(
+    sequences: list[str], na_mm: float = 50, primer_nm: float = 50
+) -> np.ndarray:
+    """
+    Nearest-neighbour melting temperatures (°C) of primers annealed to their
+    complements, computed for all primers at once, with the SantaLucia entropy
+    salt correction for na_mm mM of Na+ and a total strand concentration of
+    primer_nm nM. Primers containing ambiguous bases have a Tm of NaN
+    """
+    import numpy as np
+
+    codes = encode(sequences)
+    lengths = np.array([len(s) for s in sequences])
+    if not codes.size:
+        return np.full(len(sequences), np.nan)
+    dh_table, ds_table = _nn_tables()
+    first, second = codes[:, :-1].astype(np.int64), codes[:, 1:].astype(np.int64)
+    stacks = np.arange(codes.shape[1] - 1) < (lengths - 1)[:, None]
+    stacks &= (first < 4) & (second < 4)
+    pairs = np.where(stacks, 4 * first + second, 0)
+    dh = np.where(stacks, dh_table[pairs], 0).sum(axis=1)
+    ds = np.where(stacks, ds_table[pairs], 0).sum(axis=1)
+    rows = np.arange(len(sequences))
+    for terminal in (codes[:, 0], codes[rows, np.maximum(lengths - 1, 0)]):
+        gc = (terminal == 1) | (terminal == 2)
+        dh += np.where(gc, NN_INIT_GC[0], NN_INIT_AT[0])
+        ds += np.where(gc, NN_INIT_GC[1], NN_INIT_AT[1])
+    positions = np.arange(codes.shape[1])
+    in_sequence = positions < lengths[:, None]
+    complement = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
+    reverse_indices = np.maximum(lengths[:, None] - 1 - positions, 0)
+    reverse_complements = complement[np.take_along_axis(codes, reverse_indices, 1)]
+    symmetric = ((codes == reverse_complements) | ~in_sequence).all(axis=1)
+    dh += np.where(symmetric, NN_SYMMETRY[0], 0)
+    ds += np.where(symmetric, NN_SYMMETRY[1], 0)
+    ds += 0.368 * (lengths - 1) * math.log(na_mm / 1000)
+    strand_conc = primer_nm * 1e-9 / np.where(symmetric, 1, 4)
+    tm = dh * 1000 / (ds + GAS_CONSTANT * np.log(strand_conc)) - 273.15
+    ambiguous = ((codes == 4) & in_sequence).any(axis=1)
+    return np.where(ambiguous | (lengths < 2), np.nan, tm)
+
+
+def gc_fractions(sequences: list[str]) -> np.ndarray:
+    import numpy as np
+
+    codes = encode(sequences)
+    lengths = np.array([max(len(s), 1) for s in sequences])
+    return ((codes == 1) | (codes == 2)).sum(axis=1) / lengths
+
+
+def longest_homopolymer(sequence: str) -> int:
+    return max((len(m) for m in _HOMOPOLYMER_RE.findall(sequence)), default=0)
+
+
+def screen_pool(sequences: list[str], min_overlap: int = 8) -> list[tuple]:
+    """
+    Find primers whose 3' end is complementary to a region of a primer in the
+    same pool (including itself). The reverse complements of 3' terminal
+    k-mers (k = min_overlap) are looked up in an index of all k-mers of the
+    pool, and each candidate pair's contiguous complementarity from the 3' end
+    is then measured for all candidates at once. Returns tuples of primer
+    index, partner index, overlap and position in the partner
+    """
+    import numpy as np
+
+    k = min_overlap
+    upper = [s.upper() for s in sequences]
+    index = defaultdict(list)
+    for j, sequence in enumerate(upper):
+        for p in range(len(sequence) - k + 1):
+            index[sequence[p : p + k]].append((j, p))
+    candidates = [
+        (i, j, p)
+        for i, sequence in enumerate(upper)
+        if len(sequence) >= k
+        for j, p in index.get(lib.reverse_complement(sequence[-k:]), ())
+    ]
+    if not candidates:
+        return []
+    i, j, p = map(np.array, zip(*candidates))
+    reverse_complements = encode([lib.reverse_complement(s) for s in upper])
+    codes = encode(upper)
+    width = codes.shape[1]
+    offsets = np.arange(width)
+    columns = p[:, None] + offsets
+    partner = np.where(
+        columns < width, codes[j[:, None], np.minimum(columns, width - 1)], 4
+    )
+    primer = reverse_complements[i]
+    matches = (primer == partner) & (primer < 4)
+    overlaps = np.cumprod(matches, axis=1).sum(axis=1)
+    return sorted(
+        zip(i.tolist(), j.tolist(), overlaps.tolist(), p.tolist()),
+        key=lambda hit: (hit[0], -hit[2], hit[1]),
+    )
+
+
+def qc(
+    scheme_path: Path,
+    min_overlap: int = 8,
+    jobs: int = 1,
+    na_mm: float = 50,
+    primer_nm: float = 50,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compute per-primer GC content, Tm and longest homopolymer for a primer.bed
+    file or scheme directory, and screen each pool for 3' complementarity in
+    parallel if jobs > 1 (0 uses all CPUs). Returns tables of primers and of
+    dimers
+    """
+    import pandas as pd
+
+    scheme_path = Path(scheme_path)
+    if scheme_path.is_dir():
+        with lib.SchemeBundle(scheme_path) as bundle:
+            table = bundle.primer_table
+    else:
+        table = lib.read_bed(scheme_path)
+        lib.check_bed_columns(table.column_count, bed_type="primer")
+    df = table.to_pandas()
+    sequences = list(table["sequence"])
+    df["length"] = [len(s) for s in sequences]
+    df["gc"] = gc_fractions(sequences).round(4)
+    df["tm"] = melting_temperatures(sequences, na_mm=na_mm, primer_nm=primer_nm)
+    df["tm"] = df["tm"].round(2)
+    df["homopolymer"] = [longest_homopolymer(s) for s in sequences]
+    pools = df.groupby("poolName", sort=True).indices
+    pool_sequences = [[sequences[i] for i in rows] for rows in pools.values()]
+    if jobs == 1 or len(pools) < 2:
+        pool_hits = [screen_pool(s, min_overlap) for s in pool_sequences]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        from itertools import repeat
+
+        with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            pool_hits = list(
+                executor.map(screen_pool, pool_sequences, repeat(min_overlap))
+            )
+    names = list(table["name"])
+    dimers = []
+    for (pool, rows), hits in zip(pools.items(), pool_hits):
+        for i, j, overlap, position in hits:
+            dimers.append((pool, names[rows[i]], names[rows[j]], overlap, position))
+    dimers_df = pd.DataFrame(dimers, columns=DIMER_FIELDS)
+    by_name = dimers_df.groupby("name")["overlap"]
+    df["dimers"] = df["name"].map(by_name.size()).fillna(0).astype(int)
+    df["max_dimer_overlap"] = df["name"].map(by_name.max()).fillna(0).astype(int)
+    return df[QC_FIELDS], dimers_df
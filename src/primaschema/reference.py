@@ -0,0 +1,224 @@
+import logging
+import mmap
+import os
+from collections import namedtuple
+from pathlib import Path
+
+from primaschema.compression import is_gzip, read_bytes
+from primaschema.store import atomic_path
+
+
+# Columns of a samtools faidx index. line_bases is zero for records with irregular
+# line lengths, which are read in full rather than addressed by offset
+FaiRecord = namedtuple(
+    "FaiRecord", ["name", "length", "offset", "line_bases", "line_width"]
+)
+
+WHITESPACE = b" \t\r\n\v\f"
+
+
+def _record_layout(data, body_start: int, body_end: int) -> tuple[int, int, int]:
+    """
+    Return (length, line_bases, line_width) of a sequence body, with line_bases
+    of zero unless all lines but the last share the same length and terminator
+    """
+    body = bytes(data[body_start:body_end])
+    length = len(body.translate(None, WHITESPACE))
+    newline_end = body.find(b"\n")
+    if newline_end == -1 or not length:
+        return length, 0, 0
+    line_width = newline_end + 1
+    line_bases = len(body[:line_width].rstrip(WHITESPACE))
+    terminator = body[line_bases:line_width]
+    if not line_bases or terminator not in (b"\n", b"\r\n"):
+        return length, 0, 0
+    n_full_lines = length // line_bases
+    full_lines_end = n_full_lines * line_width
+    for i, byte in enumerate(terminator):
+        column = body[line_bases + i : full_lines_end : line_width]
+        if column.count(byte) != n_full_lines:
+            return length, 0, 0
+    tail = body[full_lines_end:].rstrip(WHITESPACE)
+    if len(tail) != length % line_bases or len(tail.translate(None, WHITESPACE)) != len(
+        tail
+    ):
+        return length, 0, 0
+    return length, line_bases, line_width
+
+
+def build_fai(data) -> list[FaiRecord]:
+    """Index the records of FASTA data held in a bytes-like object or mmap"""
+    records = []
+    header_start = 0 if data[:1] == b">" else data.find(b"\n>")
+    if header_start == -1:
+        return records
+    if data[header_start : header_start + 1] == b"\n":
+        header_start += 1
+    while header_start != -1:
+        header_end = data.find(b"\n", header_start)
+        if header_end == -1:
+            header_end = len(data)
+        name = bytes(data[header_start + 1 : header_end]).split(maxsplit=1)
+        name = name[0].decode() if name else ""
+        body_start = min(header_end + 1, len(data))
+        next_header = data.find(b"\n>", header_end)
+        body_end = len(data) if next_header == -1 else next_header + 1
+        length, line_bases, line_width = _record_layout(data, body_start, body_end)
+        records.append(FaiRecord(name, length, body_start, line_bases, line_width))
+        header_start = -1 if next_header == -1 else next_header + 1
+    return records
+
+
+def index_matches(data, records: list[FaiRecord]) -> bool:
+    """
+    Check that an index describes FASTA data, since a FASTA file replaced by
+    a copy preserving an older mtime would otherwise be read through a stale
+    index. Each record must start after a header line naming it, lie within
+    the data and be followed only by whitespace up to the next header
+    """
+    for r in records:
+        if not r.line_bases or r.offset < 1 or r.offset > len(data):
+            return False
+        header_start = data.rfind(b"\n", 0, r.offset - 1) + 1
+        header = bytes(data[header_start : r.offset]).split(maxsplit=1)
+        if not header or header[0] != b">" + r.name.encode():
+            return False
+        full_lines, tail = divmod(r.length, r.line_bases)
+        end = r.offset + full_lines * r.line_width + tail
+        if end > len(data):
+            return False
+        next_header = data.find(b">", end)
+        following = data[end : len(data) if next_header == -1 else next_header]
+        if bytes(following).strip(WHITESPACE):
+            return False
+    return True
+
+
+def read_fai(fai_path: Path) -> list[FaiRecord]:
+    records = []
+    with open(fai_path, "r") as fh:
+        for line in fh:
+            name, *values = line.rstrip("\n").split("\t")[:5]
+            records.append(FaiRecord(name, *map(int, values)))
+    return records
+
+
+class Reference:
+    """
+    FASTA reference containing one or more records, memory-mapped and indexed so
+    that slices are read lazily without loading whole sequences. gzip and BGZF
+    compressed files are instead decompressed into memory, BGZF blocks in
+    parallel. An existing samtools-style .fai index is reused if it is newer
+    than the FASTA file, and is otherwise written alongside uncompressed FASTA
+    files with regular line lengths when their directory is writable
+    """
+
+    def __init__(self, fasta_path: Path):
+        self.path = Path(fasta_path)
+        self._fh = None
+        if is_gzip(self.path):
+            self._data = read_bytes(self.path)
+        elif os.path.getsize(self.path):
+            self._fh = open(self.path, "rb")
+            self._data = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = b""
+        self._sequences = {}
+        self.records = {r.name: r for r in self._load_index()}
+        if not self.records:
+            raise ValueError(f"No records found in {self.path}")
+
+    def __repr__(self):
+        return f"Reference({str(self.path)!r})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._fh is not None:
+            self._fh.close()
+
+    @property
+    def fai_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".fai")
+
+    def _load_index(self) -> list[FaiRecord]:
+        fai_path = self.fai_path
+        if (
+            fai_path.exists()
+            and fai_path.stat().st_mtime_ns >= self.path.stat().st_mtime_ns
+        ):
+            try:
+                records = read_fai(fai_path)
+            except (OSError, ValueError, TypeError):
+                records = None
+            if records and index_matches(self._data, records):
+                logging.debug(f"Reusing index {fai_path}")
+                return records
+            logging.info(f"Rebuilding stale index {fai_path}")
+        records = build_fai(self._data)
+        if (
+            self._fh is not None
+            and records
+            and all(r.line_bases for r in records)
+            and os.access(self.path.parent, os.W_OK)
+        ):
+            try:
+                self._write_fai(records)
+            except OSError as e:
+                logging.debug(f"Could not write index {fai_path}: {e}")
+        return records
+
+    def write_index(self):
+        """Write a samtools-compatible .fai index alongside the FASTA file"""
+        if not all(r.line_bases for r in self.records.values()):
+            raise RuntimeError(f"Cannot index {self.path} with irregular line lengths")
+        self._write_fai(self.records.values())
+
+    def _write_fai(self, records):
+        with atomic_path(self.fai_path) as temp_path:
+            with open(temp_path, "w") as fh:
+                for r in records:
+                    fh.write("\t".join(map(str, r)) + "\n")
+        logging.debug(f"Wrote index {self.fai_path}")
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.records)
+
+    def contig_name(self, chrom: str) -> str:
+        """Return the record name for a BED chrom, falling back to a sole record"""
+        if chrom in self.records:
+            return chrom
+        elif len(self.records) == 1:
+            return next(iter(self.records))
+        raise RuntimeError(f"Contig {chrom} not found in {self.path}")
+
+    def fetch(self, name: str, start: int = 0, end: int | None = None) -> bytes:
+        """Return bases [start, end) of a record, reading only the bytes needed"""
+        r = self.records[name]
+        end = r.length if end is None else min(max(end, 0), r.length)
+        start = min(max(start, 0), end)
+        if not r.length:
+            return b""
+        elif not r.line_bases:
+            if name not in self._sequences:
+                body = self._data[r.offset : self._record_end(r)]
+                self._sequences[name] = bytes(body).translate(None, WHITESPACE)
+            return self._sequences[name][start:end]
+        first = r.offset + start // r.line_bases * r.line_width + start % r.line_bases
+        last = r.offset + end // r.line_bases * r.line_width + end % r.line_bases
+        return bytes(self._data[first:last]).translate(None, b"\r\n")
+
+    def _record_end(self, r: FaiRecord) -> int:
+        next_header = self._data.find(b"\n>", r.offset)
+        return len(self._data) if next_header == -1 else next_header
+
+    def sequence(self, name: str) -> bytes:
+        """Return the whole sequence of a record"""
+        return self.fetch(name)
@@ -0,0 +1,203 @@
+"""Long-running validation service watching a primer-schemes tree"""
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from socketserver import ThreadingUnixStreamServer
+from urllib.parse import unquote, urlsplit
+
+import primaschema.lib as lib
+
+
+class ValidationService:
+    """
+    Validation results for the schemes of a directory tree, kept current by
+    revalidating only bundles whose files (or the LinkML schema) changed since
+    the last refresh. Parsed schemas and checksum caches stay loaded between
+    refreshes
+    """
+
+    def __init__(self, root_dir: Path, force: bool = False):
+        self.root_dir = Path(root_dir)
+        self.force = force
+        self.results = {}  # scheme path relative to root_dir -> result
+        self.fingerprints = {}
+        self.schema_fingerprint = {}
+        self.lock = threading.RLock()
+
+    def __repr__(self):
+        return f"ValidationService({str(self.root_dir)!r}, {len(self.results)} schemes)"
+
+    def _check_schema(self):
+        schema_path = lib.get_primer_schemes_path() / "schema/primer_scheme.yml"
+        fingerprint = lib.fingerprint_file(schema_path, self.schema_fingerprint)
+        if fingerprint != self.schema_fingerprint:
+            if self.schema_fingerprint:
+                logging.info(f"Schema {schema_path} changed")
+            self.schema_fingerprint = fingerprint
+            self.fingerprints = {}
+
+    def _check_scheme(self, path: str) -> bool:
+        """Revalidate one scheme if its files changed, returning True if so"""
+        scheme_dir = self.root_dir / path
+        previous = self.fingerprints.get(path)
+        try:
+            fingerprint = lib.fingerprint_dir(scheme_dir, previous)
+        except FileNotFoundError:
+            fingerprint = {}
+        if previous is not None and lib.fingerprints_match(fingerprint, previous):
+            self.fingerprints[path] = fingerprint
+            return False
+        if "info.yml" not in fingerprint:
+            self.fingerprints.pop(path, None)
+            self.results.pop(path, None)
+            logging.info(f"REMOVED {path}")
+            return True
+        start = time.perf_counter()
+        result = lib.run_scheme_task(lib.validate, scheme_dir, {"force": self.force})
+        self.fingerprints[path] = fingerprint
+        self.results[path] = {
+            **result,
+            "validated_at": time.time(),
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+        logging.info(f"{'FAILED' if result['error'] else 'OK'} {path}")
+        return True
+
+    def refresh(self) -> list[str]:
+        """Revalidate new and changed schemes, returning their paths"""
+        with self.lock:
+            self._check_schema()
+            paths = {
+                str(scheme_dir.relative_to(self.root_dir))
+                for scheme_dir in lib.find_scheme_dirs(self.root_dir)
+            }
+            return [
+                path
+                for path in sorted(paths | self.results.keys())
+                if self._check_scheme(path)
+            ]
+
+    def result(self, path: str) -> dict | None:
+        """Return the current result for one scheme, revalidating it if changed"""
+        scheme_dir = (self.root_dir / path).resolve()
+        if not scheme_dir.is_relative_to(self.root_dir.resolve()):
+            return None
+        with self.lock:
+            self._check_schema()
+            if (scheme_dir / "info.yml").exists() or path in self.results:
+                self._check_scheme(path)
+            return self.results.get(path)
+
+    def summary(self) -> dict:
+        with self.lock:
+            failed = sorted(p for p, r in self.results.items() if r["error"])
+            return {
+                "root_dir": str(self.root_dir),
+                "schemes": len(self.results),
+                "failed": failed,
+                "results": dict(sorted(self.results.items())),
+            }
+
+    def watch(self, interval: float = 1.0, stop: threading.Event | None = None):
+        """Poll for changes every interval seconds until stop is set"""
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Refresh of {self.root_dir} failed: {e}")
+
+
+class ValidationRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /schemes for all results, GET /schemes/<path> for one scheme (checked
+    for changes first) and POST /refresh to revalidate changed schemes now
+    """
+
+    service: ValidationService = None
+
+    def send_json(self, data, status: int = 200):
+        body = json.dumps(data, indent=1).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path).strip("/")
+        if path == "schemes":
+            self.send_json(self.service.summary())
+        elif path.startswith("schemes/"):
+            scheme_path = path.removeprefix("schemes/")
+            result = self.service.result(scheme_path)
+            if result is None:
+                self.send_json({"error": f"Unknown scheme {scheme_path}"}, 404)
+            else:
+                self.send_json({"path": scheme_path, **result})
+        else:
+            self.send_json({"error": f"Unknown endpoint /{path}"}, 404)
+
+    def do_POST(self):
+        if urlsplit(self.path).path.strip("/") == "refresh":
+            self.send_json({"revalidated": self.service.refresh()})
+        else:
+            self.send_json({"error": f"Unknown endpoint {self.path}"}, 404)
+
+    def address_string(self) -> str:
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+class UnixHTTPServer(ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(
+    service: ValidationService,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Path | None = None,
+):
+    """Create an HTTP server for a service on a TCP port or a Unix socket"""
+    handler = type("Handler", (ValidationRequestHandler,), {"service": service})
+    if socket_path:
+        Path(socket_path).unlink(missing_ok=True)
+        return UnixHTTPServer(str(socket_path), handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(
+    root_dir: Path,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Path | None = None,
+    interval: float = 1.0,
+    force: bool = False,
+):
+    """
+    Validate all schemes in a tree, then serve results while revalidating
+    changed schemes every interval seconds
+    """
+    service = ValidationService(root_dir, force=force)
+    service.refresh()
+    server = make_server(service, host=host, port=port, socket_path=socket_path)
+    stop = threading.Event()
+    watcher = threading.Thread(target=service.watch, args=(interval, stop), daemon=True)
+    watcher.start()
+    address = socket_path or f"http://{host}:{server.server_address[1]}"
+    logging.info(f"Serving validation results for {root_dir} at {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        if socket_path:
+            Path(socket_path).unlink(missing_ok=True)
@@ -0,0 +1,142 @@
+import hashlib
+import logging
+import os
+import secrets
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+
+FICLONE = 0x40049409  # Linux ioctl sharing file extents on copy-on-write filesystems
+
+
+def hash_file(path: Path) -> str:
+    """Return SHA256 hex digest of a file's raw bytes"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@contextmanager
+def atomic_path(path: Path):
+    """
+    Yield a unique temporary path alongside path, which is renamed over path if
+    the block succeeds and removed otherwise
+    """
+    path = Path(path)
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.{secrets.token_hex(4)}.tmp")
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def reflink(src_path: Path, dest_path: Path):
+    """Create dest_path sharing the data blocks of src_path (Linux only)"""
+    import fcntl
+
+    with open(src_path, "rb") as src_fh, open(dest_path, "wb") as dest_fh:
+        try:
+            fcntl.ioctl(dest_fh.fileno(), FICLONE, src_fh.fileno())
+        except OSError:
+            dest_fh.close()
+            os.unlink(dest_path)
+            raise
+
+
+def link_or_copy(src_path: Path, dest_path: Path) -> str:
+    """
+    Hardlink src_path to dest_path, falling back to a reflink and then a copy.
+    Returns the method used
+    """
+    try:
+        os.link(src_path, dest_path)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        reflink(src_path, dest_path)
+        return "reflink"
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(src_path, dest_path)
+    return "copy"
+
+
+class ObjectStore:
+    """
+    Content-addressed store holding one copy of each distinct file, named by
+    its SHA256 digest, from which identical files are linked into place.
+    Objects are read-only, since hardlinked files share them, and are rehashed
+    before reuse in case one was modified regardless
+    """
+
+    def __init__(self, root_dir: Path):
+        self.root_dir = Path(root_dir)
+
+    def __repr__(self):
+        return f"ObjectStore({str(self.root_dir)!r})"
+
+    def object_path(self, digest: str) -> Path:
+        return self.root_dir / digest[:2] / digest[2:]
+
+    def add(self, path: Path) -> Path:
+        """
+        Add a read-only copy of a file to the store unless an intact copy is
+        present, returning its object path
+        """
+        digest = hash_file(path)
+        object_path = self.object_path(digest)
+        if object_path.exists():
+            if hash_file(object_path) == digest:
+                return object_path
+            logging.warning(f"Replacing modified store object {object_path}")
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_path(object_path) as temp_path:
+            shutil.copyfile(path, temp_path)
+            os.chmod(temp_path, 0o444)
+        return object_path
+
+    def link(self, path: Path, dest_path: Path) -> str:
+        """
+        Atomically place a file at dest_path via the store, returning the method
+        (hardlink, reflink or copy) used
+        """
+        try:
+            object_path = self.add(path)
+            with atomic_path(dest_path) as temp_path:
+                method = link_or_copy(object_path, temp_path)
+        except FileNotFoundError:  # Object pruned concurrently
+            object_path = self.add(path)
+            with atomic_path(dest_path) as temp_path:
+                method = link_or_copy(object_path, temp_path)
+        logging.debug(f"Placed {dest_path} by {method} of {object_path}")
+        return method
+
+    def prune(self) -> int:
+        """
+        Delete objects no longer hardlinked into place, as well as objects that
+        were reflinked or copied, whose placed files do not depend on them.
+        Returns the number of bytes freed
+        """
+        freed = 0
+        if not self.root_dir.exists():
+            return freed
+        for prefix_dir in self.root_dir.iterdir():
+            if not prefix_dir.is_dir():
+                continue
+            for object_path in prefix_dir.iterdir():
+                stat = object_path.lstat()
+                if stat.st_nlink == 1:
+                    object_path.unlink(missing_ok=True)
+                    freed += stat.st_size
+            try:
+                prefix_dir.rmdir()
+            except OSError:
+                pass
+        if freed:
+            logging.info(f"Pruned {freed} bytes from {self.root_dir}")
+        return freed
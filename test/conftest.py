@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path):
+    """Keep checksum caches and state files out of the user's cache directory"""
+    with pytest.MonkeyPatch.context() as mp:  # Unaffected by tests' monkeypatch.undo()
+        mp.setenv("PRIMASCHEMA_CACHE_DIR", str(tmp_path / "cache"))
+        yield
@@ -1,4 +1,6 @@
 import os
+import random
+import shutil
 import subprocess
 from pathlib import Path
 
@@ -67,6 +69,29 @@ def test_artic_v41_schema():
     )
 
 
+def test_linkml_schema_cache(tmp_path, monkeypatch):
+    schema_path = tmp_path / "primer_scheme.yml"
+    schema_path.write_text((schema_dir / "primer_scheme.yml").read_text())
+    lib._linkml_schemas.clear()
+    module, validator = lib.load_linkml_schema(schema_path)
+    assert lib.load_linkml_schema(schema_path) == (module, validator)
+    key = lib.linkml_schema_key(schema_path)
+    assert (tmp_path / "cache" / "linkml" / f"{key}.py").exists()
+    assert (tmp_path / "cache" / "linkml" / f"{key}.schema.json").exists()
+    lib._linkml_schemas.clear()  # Disk cache hit
+    from linkml.generators import jsonschemagen
+
+    monkeypatch.setattr(jsonschemagen, "JsonSchemaGenerator", None)
+    module, validator = lib.load_linkml_schema(schema_path)
+    assert hasattr(module, "PrimerScheme") and validator.jsonschema_objs
+    monkeypatch.undo()
+    with open(schema_path, "a") as fh:
+        fh.write("\n# Modified\n")
+    assert lib.linkml_schema_key(schema_path) != key
+    lib.load_linkml_schema(schema_path)
+    assert len(list((tmp_path / "cache" / "linkml").glob("*.py"))) == 2
+
+
 # Needs updating since reverting hash function to consume coordinates again. Needs BEDs creating for this case
 # def test_checksum_case_normalisation():
 #     seqs_a = ["ACGT", "CAGT"]
@@ -141,3 +166,779 @@ def test_diff():
 MN908947.3       27784     27808 SARS-CoV-2_28_LEFT_27837T         2      + TTTGTGCTTTTTAGCCTTTCTGTT   bed2"""
         == run_cmd.stdout.strip()
     )
+
+
+def test_validate_recursive_parallel():
+    results = lib.validate_recursive(data_dir / "primer-schemes", jobs=2, full=True)
+    assert list(results) == sorted(results)
+    assert len(results) == 4 and not any(r["error"] for r in results.values())
+
+
+def test_run_recursive_summary(tmp_path):
+    shutil.copytree(data_dir / "primer-schemes/eden/v1", tmp_path / "eden/v1")
+    shutil.copytree(data_dir / "broken/five-columns", tmp_path / "broken")
+    shutil.copy(data_dir / "primer-schemes/eden/v1/info.yml", tmp_path / "broken")
+    results = lib.run_recursive(lib.validate, lib.find_scheme_dirs(tmp_path), jobs=2)
+    assert results[tmp_path / "eden/v1"]["error"] is None
+    assert "RuntimeError" in results[tmp_path / "broken"]["error"]
+    with pytest.raises(RuntimeError):
+        lib.validate_recursive(tmp_path, jobs=2)
+
+
+def test_scheme_bundle():
+    bundle = lib.SchemeBundle(data_dir / "primer-schemes/artic/v4.1")
+    assert bundle.bed_type == "primer"
+    assert bundle.primer_checksum == "primaschema:9005b441227985c8"
+    assert bundle.reference_checksum == "primaschema:7d5621cd3b3e498d"
+    assert bundle.bed_df is bundle.primer_df
+    assert bundle.info["name"] == "artic-v4.1"
+
+
+def test_scheme_bundle_scheme_bed_only(tmp_path, monkeypatch):
+    for name in ("info.yml", "scheme.bed", "reference.fasta"):
+        shutil.copy(data_dir / "primer-schemes/artic/v4.1" / name, tmp_path)
+    bundle = lib.SchemeBundle(tmp_path)
+    assert bundle.bed_path.name == "scheme.bed" and bundle.bed_type == "scheme"
+    assert list(bundle.primer_df.columns) == lib.PRIMER_BED_FIELDS
+    assert bundle.primer_checksum == "primaschema:9005b441227985c8"
+    lib.validate(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    lib.build(tmp_path)
+    built_dir = tmp_path / "built/sars-cov-2/artic/v4.1"
+    assert lib.hash_bed(built_dir / "primer.bed") == "primaschema:9005b441227985c8"
+    assert (built_dir / "scheme.bed").read_bytes() == (
+        tmp_path / "scheme.bed"
+    ).read_bytes()
+
+
+def test_build_recursive_incremental(tmp_path, monkeypatch):
+    root_dir = tmp_path / "schemes"
+    shutil.copytree(data_dir / "primer-schemes", root_dir)
+    state_path = tmp_path / "state.json"
+    monkeypatch.chdir(tmp_path)
+    results = lib.build_recursive(root_dir, nested=True, state_path=state_path)
+    assert not any(r.get("skipped") for r in results.values())
+    results = lib.build_recursive(root_dir, nested=True, state_path=state_path)
+    assert all(r.get("skipped") for r in results.values())
+    with open(root_dir / "eden/v1/info.yml", "a") as fh:
+        fh.write("display_name: Eden V1\n")
+    results = lib.build_recursive(root_dir, nested=True, state_path=state_path)
+    assert [p.name for p, r in results.items() if not r.get("skipped")] == ["v1"]
+    assert "Eden V1" in (tmp_path / "built/sars-cov-2/eden/v1/info.yml").read_text()
+    (tmp_path / "built/sars-cov-2/artic/v4.1/scheme.bed").unlink()
+    results = lib.build_recursive(root_dir, nested=True, state_path=state_path)
+    assert [p.parent.name for p, r in results.items() if not r.get("skipped")] == [
+        "artic"
+    ]
+
+
+def test_build_recursive_output_dirs(tmp_path, monkeypatch):
+    root_dir = (Path(__file__).parent / "data/primer-schemes").resolve()
+    for cwd in ["a", "b"]:
+        (tmp_path / cwd).mkdir()
+        monkeypatch.chdir(tmp_path / cwd)
+        results = lib.build_recursive(root_dir, nested=True)
+        assert not any(r.get("skipped") for r in results.values())
+        assert (tmp_path / cwd / "built/sars-cov-2/eden/v1/primer.bed").exists()
+    results = lib.build_recursive(root_dir)
+    assert not any(r.get("skipped") for r in results.values())
+    assert (tmp_path / "b/built/eden-v1/primer.bed").exists()
+    assert not (tmp_path / "b/built/sars-cov-2").exists()
+    assert all(r.get("skipped") for r in lib.build_recursive(root_dir).values())
+    copy_dir = tmp_path / "schemes"
+    shutil.copytree(root_dir / "eden/v1", copy_dir / "eden/v1")
+    shutil.copytree(root_dir / "eden/v1", copy_dir / "eden/v1-copy")
+    for nested in (False, True):
+        with pytest.raises(RuntimeError, match="built to the same directory"):
+            lib.build_recursive(copy_dir, nested=nested)
+
+
+def test_streaming_primer_bed_hash_matches_dataframe_hash(tmp_path):
+    def hash_with_pandas(bed_path):  # Reference implementation
+        df = lib.parse_primer_bed(bed_path)
+        return lib.hash_string(df[lib.PRIMER_HASH_FIELDS].to_csv(index=False))
+
+    edge_case_path = tmp_path / "primer.bed"
+    edge_case_path.write_text(
+        "MN908947.3\t31\t55\tA_LEFT\t1\t+\tccaaccAACTTTCG,ATCT\n"
+        "\n"
+        "MN908947.3\t60\t80\tA_RIGHT\t2\t-\tAGCT TCAACAG  \n"
+    )
+    bed_paths = [edge_case_path, data_dir / "broken/five-columns/primer.bed"]
+    bed_paths += sorted((data_dir / "primer-schemes").glob("*/*/primer.bed"))
+    for bed_path in bed_paths:
+        assert lib.hash_primer_bed(bed_path) == hash_with_pandas(bed_path)
+        df = lib.parse_primer_bed(bed_path)
+        assert lib.hash_primer_bed_df(df) == hash_with_pandas(bed_path)
+
+
+def test_backfill_sequences_matches_biopython():
+    from Bio.Seq import Seq
+
+    rng = random.Random(42)
+    ref = "".join(rng.choice("ACGTMRWSYKVHDBXNacgtn") for _ in range(2000))
+    starts = [rng.randint(0, 2050) for _ in range(1000)]
+    ends = [start + rng.randint(-2, 40) for start in starts]
+    reverse = [rng.random() < 0.5 for _ in starts]
+    expected = [
+        str(Seq(ref)[s:e].reverse_complement()) if r else str(Seq(ref)[s:e])
+        for s, e, r in zip(starts, ends, reverse)
+    ]
+    assert lib.backfill_sequences(ref.encode(), starts, ends, reverse) == expected
+
+
+def test_multi_record_reference(tmp_path):
+    from Bio import SeqIO
+
+    rng = random.Random(7)
+    seqs = {
+        "seg1": "".join(rng.choice("ACGT") for _ in range(500)),
+        "seg2": "".join(rng.choice("ACGT") for _ in range(333)),
+    }
+    fasta_path = tmp_path / "reference.fasta"
+    with open(fasta_path, "w") as fh:
+        for name, seq in seqs.items():
+            lines = [seq[i : i + 60] for i in range(0, len(seq), 60)]
+            fh.write(f">{name} segment\n" + "\n".join(lines) + "\n")
+    bed_path = tmp_path / "scheme.bed"
+    bed_path.write_text(
+        "seg1\t10\t30\tA_1_LEFT\t1\t+\n"
+        "seg2\t300\t325\tA_1_RIGHT\t1\t-\n"
+        "seg1\t475\t500\tA_2_RIGHT\t2\t-\n"
+    )
+    lib.convert_scheme_bed_to_primer_bed(bed_path, fasta_path, out_dir=tmp_path)
+    records = {r.id: r.seq for r in SeqIO.parse(fasta_path, "fasta")}
+    assert list(lib.parse_primer_bed(tmp_path / "primer.bed")["sequence"]) == [
+        str(records["seg1"][10:30]),
+        str(records["seg2"][300:325].reverse_complement()),
+        str(records["seg1"][475:500].reverse_complement()),
+    ]
+    assert lib.hash_ref(fasta_path) == lib.hash_string("\n".join(seqs.values()))
+    with lib.Reference(fasta_path) as reference:
+        assert reference.fetch("seg2", 59, 62) == seqs["seg2"][59:62].encode()
+        reference.write_index()
+    with lib.Reference(fasta_path) as reference:
+        assert reference.records["seg2"].line_bases == 60
+        assert reference.sequence("seg2") == seqs["seg2"].encode()
+
+
+def test_reference_index_persisted(tmp_path, monkeypatch):
+    from primaschema import reference
+
+    for name in ("info.yml", "primer.bed", "reference.fasta"):
+        shutil.copy(data_dir / "primer-schemes/eden/v1" / name, tmp_path)
+    with lib.SchemeBundle(tmp_path) as bundle:
+        ref = bundle.reference
+        assert bundle.reference_checksum == "primaschema:7d5621cd3b3e498d"
+    assert ref._data.closed and ref._fh.closed
+    assert (tmp_path / "reference.fasta.fai").exists()
+    monkeypatch.setattr(reference, "build_fai", None)  # Index must be reused
+    with lib.Reference(tmp_path / "reference.fasta") as ref:
+        assert ref.fetch(ref.names[0], 0, 10) == b"ATTAAAGGTT"
+    assert lib.fingerprint_dir(tmp_path).keys() == {
+        "info.yml",
+        "primer.bed",
+        "reference.fasta",
+    }
+
+
+def test_reference_stale_index_rebuilt(tmp_path):
+    def write_fasta(path, sequence):
+        lines = [sequence[i : i + 60] for i in range(0, len(sequence), 60)]
+        path.write_text(">MN908947.3\n" + "\n".join(lines) + "\n")
+
+    random.seed(2)
+    old_sequence = "".join(random.choices("ACGT", k=300))
+    write_fasta(tmp_path / "old.fasta", old_sequence)
+    os.utime(tmp_path / "old.fasta", ns=(0, 0))
+    ref_path = tmp_path / "reference.fasta"
+    write_fasta(ref_path, old_sequence[:200])
+    assert lib.hash_ref(ref_path) == lib.hash_string(old_sequence[:200])
+    assert (tmp_path / "reference.fasta.fai").exists()
+    shutil.copy2(tmp_path / "old.fasta", ref_path)  # Keeps the older mtime
+    assert lib.hash_ref(ref_path) == lib.hash_string(old_sequence)
+    with lib.Reference(ref_path) as reference:
+        assert reference.records["MN908947.3"].length == 300
+
+
+def test_cli_import_is_lightweight():
+    run_cmd = run(
+        "python -c 'import sys, primaschema.cli; "
+        'print(" ".join(m for m in ("pandas", "numpy", "Bio", "jsonschema", '
+        '"linkml", "yaml") if m in sys.modules))\''
+    )
+    assert run_cmd.stdout.strip() == ""
+
+
+def test_cli_startup_time():
+    import time
+
+    budget = float(os.environ.get("PRIMASCHEMA_STARTUP_BUDGET", 2.0))
+    for cmd in (
+        "primaschema --version",
+        "primaschema hash-ref primer-schemes/eden/v1/reference.fasta",
+    ):
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            run(cmd)
+            timings.append(time.perf_counter() - start)
+        assert min(timings) < budget, f"{cmd} took {min(timings):.2f}s"
+
+
+def test_benchmark_synthetic_scheme(tmp_path):
+    from primaschema import benchmark
+
+    scheme_dir = benchmark.generate_scheme(
+        tmp_path / "schemes" / "a20", amplicons=20, alt_fraction=0.5, contigs=2
+    )
+    lib.validate(scheme_dir)
+    n_cached = len(lib.get_checksum_cache())
+    report = benchmark.run_benchmarks(
+        amplicons=[10], contigs=2, repeats=1, work_dir=tmp_path / "work"
+    )
+    assert len(lib.get_checksum_cache()) == n_cached  # Timed without the cache
+    (result,) = report["results"]
+    assert result["scale"]["amplicons"] == 10
+    assert set(result["timings"]) == set(benchmark.BENCHMARKS)
+    run(f"primaschema benchmark --amplicons 5 --repeats 1 --out {tmp_path}/b.json")
+    assert (tmp_path / "b.json").exists()
+
+
+def test_bed_table():
+    import pandas as pd
+
+    from primaschema.bed import BED_FIELD_TYPES
+
+    bed_path = data_dir / "primer-schemes/artic/v4.1/primer.bed"
+    table = lib.read_bed(bed_path)
+    assert table.fields == lib.PRIMER_BED_FIELDS and table.column_count == 7
+    assert table["chrom"][0] is table["chrom"][-1]
+    expected_df = pd.read_csv(
+        bed_path, sep="\t", names=lib.PRIMER_BED_FIELDS, dtype=BED_FIELD_TYPES
+    )
+    pd.testing.assert_frame_equal(table.to_pandas(), expected_df)
+    assert lib.hash_primer_table(table) == "primaschema:9005b441227985c8"
+    assert lib.read_bed(data_dir / "broken/five-columns/primer.bed").column_count == 5
+
+
+def test_bed_table_parse_errors(tmp_path):
+    from primaschema.bed import BedParseError
+
+    bed_path = tmp_path / "primer.bed"
+    bed_path.write_text(
+        "MN908947.3\t31\t55\tA_LEFT\t1\t+\n\nMN908947.3\tx\t80\tA_RIGHT\t1\t-\n"
+    )
+    with pytest.raises(BedParseError, match="line 3"):
+        lib.read_bed(bed_path)
+    bed_path.write_text("MN908947.3\t31\t55\tA_LEFT\t1\t+\tACGT\textra\n")
+    with pytest.raises(RuntimeError, match="expected 7 columns, found 8"):
+        lib.read_bed(bed_path, lib.PRIMER_BED_FIELDS)
+
+
+def test_structural_diff(tmp_path):
+    import gzip
+
+    from primaschema import diff
+
+    (tmp_path / "a.bed").write_text(
+        "MN908947.3\t10\t30\tS_1_LEFT\t1\t+\tACGTACGTACGTACGTACGT\n"
+        "MN908947.3\t300\t320\tS_1_RIGHT\t1\t-\tTTTTACGTACGTACGTAAAA\n"
+        "MN908947.3\t200\t220\tS_2_LEFT\t2\t+\tGGGGACGTACGTACGTCCCC\n"
+        "MN908947.3\t500\t520\tS_2_RIGHT\t2\t-\tCCCCACGTACGTACGTGGGG\n"
+        "MN908947.3\t600\t620\tS_3_LEFT\t1\t+\tAAAAACGTACGTACGTTTTT\n"
+    )
+    (tmp_path / "b.bed").write_text(
+        "MN908947.3\t11\t31\tS_1_LEFT\t1\t+\tCGTACGTACGTACGTACGTA\n"
+        "MN908947.3\t300\t320\tS_1_RIGHT\t1\t-\tTTTTACGTACGTACGTAAAA\n"
+        "MN908947.3\t200\t220\tS_2_LEFT\t1\t+\tGGGGACGTACGTACGTCCCA\n"
+        "MN908947.3\t500\t520\tS_2_RIGHT_v2\t2\t-\tCCCCACGTACGTACGTGGGG\n"
+        "MN908947.3\t700\t720\tS_4_LEFT\t2\t+\tAAAAACGTACGTACGTTTTT\n"
+    )
+    changes = diff.diff_structural(tmp_path / "a.bed", tmp_path / "b.bed")
+    assert {c["name"]: c["changes"] for c in changes} == {
+        "S_1_LEFT": ["moved", "resequenced"],
+        "S_2_LEFT": ["resequenced", "repooled"],
+        "S_2_RIGHT_v2": ["renamed"],
+        "S_3_LEFT": ["removed"],
+        "S_4_LEFT": ["added"],
+    }
+    report = diff.audit(tmp_path / "a.bed", [tmp_path / "a.bed", tmp_path / "b.bed"])
+    assert [c["summary"]["added"] for c in report["comparisons"]] == [0, 1]
+    assert report["comparisons"][1]["summary"]["moved"] == 1
+    for scheme in ("a", "b"):
+        (tmp_path / "schemes" / scheme).mkdir(parents=True)
+    shutil.copy(tmp_path / "a.bed", tmp_path / "schemes/a/primer.bed")
+    (tmp_path / "schemes/b/primer.bed.gz").write_bytes(
+        gzip.compress((tmp_path / "b.bed").read_bytes())
+    )
+    (tmp_path / "schemes/b/primer.bed.gz.npz").touch()
+    bed_paths = diff.find_primer_beds([tmp_path / "schemes"])
+    assert bed_paths == [
+        tmp_path / "schemes/a/primer.bed",
+        tmp_path / "schemes/b/primer.bed.gz",
+    ]
+    report = diff.audit(tmp_path / "a.bed", bed_paths)
+    assert [c["summary"]["added"] for c in report["comparisons"]] == [0, 1]
+    run_cmd = run(
+        "primaschema diff --structural primer-schemes/midnight/v1/primer.bed primer-schemes/midnight/v2/primer.bed"
+    )
+    assert run_cmd.stdout.splitlines()[1].startswith("added\tMN908947.3\t27784")
+
+
+def test_show_non_ref_alts():
+    assert lib.mismatch_positions("ACGTT", "acgat") == [3]
+    assert lib.mismatch_positions("ACG", "ACGTA") == [3, 4]
+    assert lib.edit_distance("ACGTACGT", "ACGACGTT") == 2
+    assert lib.show_non_ref_alts(data_dir / "primer-schemes/artic/v4.1").empty
+    df = lib.show_non_ref_alts_recursive(data_dir / "primer-schemes", jobs=2)
+    assert df[["scheme", "name", "mismatches", "edit_distance"]].values.tolist() == [
+        ["midnight/v2", "SARS-CoV-2_28_LEFT_27837T", "22", 1]
+    ]
+
+
+def test_checksum_cache(tmp_path, monkeypatch):
+    from primaschema.cache import ChecksumCache
+
+    ref_path = tmp_path / "reference.fasta"
+    shutil.copy(data_dir / "primer-schemes/eden/v1/reference.fasta", ref_path)
+    assert lib.hash_ref(ref_path) == "primaschema:7d5621cd3b3e498d"
+
+    def fail(*args):
+        raise AssertionError("Checksum recomputed despite cache")
+
+    monkeypatch.setattr(lib, "hash_reference", fail)
+    assert lib.hash_ref(ref_path) == "primaschema:7d5621cd3b3e498d"
+    bundle = lib.SchemeBundle(data_dir / "primer-schemes/eden/v1")
+    assert bundle.reference_checksum == "primaschema:7d5621cd3b3e498d"
+    ref_path.write_text(">changed\nACGT\n")
+    with pytest.raises(AssertionError):
+        lib.hash_ref(ref_path)
+    monkeypatch.undo()
+
+    cache = ChecksumCache(tmp_path / "lru.sqlite", max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, f"primaschema:{key}")
+    assert len(cache) == 2 and cache.get("a") is None
+    assert cache.get_or_compute("b", fail) == "primaschema:b"
+    cache.close()
+
+    with ChecksumCache(tmp_path / "lru.sqlite", touch_interval=0) as cache:
+        last_used = "SELECT last_used FROM checksums WHERE key = 'b'"
+        before = cache._connect().execute(last_used).fetchone()
+        assert cache.get("b") == "primaschema:b" and cache._touched
+        assert cache._connect().execute(last_used).fetchone() == before
+    with ChecksumCache(tmp_path / "lru.sqlite") as cache:
+        assert cache._connect().execute(last_used).fetchone() > before
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ChecksumCache(tmp_path / "lru.sqlite") as cache:
+        assert cache.get("b") == "primaschema:b"  # Connects in this thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(cache.put, "d", "primaschema:d").result()
+            assert executor.submit(cache.get, "b").result() == "primaschema:b"
+            assert executor.submit(cache.get, "d").result() == "primaschema:d"
+
+
+def test_build_links_shared_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root_dir = (Path(__file__).parent / "data/primer-schemes").resolve()
+    lib.build(root_dir / "artic/v4.1")
+    lib.build(root_dir / "eden/v1")
+    built_dir = tmp_path / "built/sars-cov-2"
+    assert os.path.samefile(
+        built_dir / "artic/v4.1/reference.fasta", built_dir / "eden/v1/reference.fasta"
+    )
+    objects = [p for p in (tmp_path / "built/.objects").rglob("*") if p.is_file()]
+    assert len(objects) == 3  # One shared reference and two primer.bed files
+    assert not list(built_dir.rglob(".*.tmp"))
+    assert (built_dir / "eden/v1/scheme.bed").read_text() == (
+        root_dir / "eden/v1/scheme.bed"
+    ).read_text()
+    assert all(not os.access(p, os.W_OK) or os.geteuid() == 0 for p in objects)
+    reference_path = built_dir / "eden/v1/reference.fasta"
+    reference_path.chmod(0o644)
+    with open(reference_path, "a") as fh:  # Modifies the shared object in place
+        fh.write("ACGT\n")
+    lib.build(root_dir / "eden/v1", overwrite=True)
+    assert (
+        reference_path.read_bytes()
+        == (root_dir / "eden/v1/reference.fasta").read_bytes()
+    )
+    shutil.rmtree(built_dir / "artic")
+    store = lib.ObjectStore(tmp_path / "built/.objects")
+    assert store.prune() > 0
+    assert len([p for p in store.root_dir.rglob("*") if p.is_file()]) == 2
+
+
+def test_build_manifest_incremental(tmp_path, monkeypatch):
+    root_dir = tmp_path / "schemes"
+    shutil.copytree(data_dir / "primer-schemes", root_dir)
+    state_path = tmp_path / "manifest.json"
+    calls = []
+    parse_scheme_metadata = lib.parse_scheme_metadata
+    monkeypatch.setattr(
+        lib,
+        "parse_scheme_metadata",
+        lambda path: calls.append(path) or parse_scheme_metadata(path),
+    )
+    kwargs = dict(schema_dir=schema_dir, out_dir=tmp_path, state_path=state_path)
+    lib.build_manifest(root_dir, **kwargs)
+    index = (tmp_path / "index.yml").read_text()
+    assert len(calls) == 4
+    lib.build_manifest(root_dir, **kwargs)
+    assert len(calls) == 4 and (tmp_path / "index.yml").read_text() == index
+    with open(root_dir / "eden/v1/info.yml", "a") as fh:
+        fh.write("display_name: Eden V1\n")
+    lib.build_manifest(root_dir, **kwargs)
+    assert calls[4:] == [root_dir / "eden/v1/info.yml"]
+    assert "Eden V1" in (tmp_path / "index.yml").read_text()
+    monkeypatch.chdir(tmp_path)
+    lib.build_manifest(Path("schemes"), **kwargs)  # Same files by relative path
+    assert len(calls) == 5
+    monkeypatch.undo()
+    lib.build_manifest(root_dir, jobs=2, full=True, **kwargs)
+    assert "Eden V1" in (tmp_path / "index.yml").read_text()
+
+
+def test_scheme_index(tmp_path):
+    from primaschema import db
+
+    root_dir = tmp_path / "schemes"
+    shutil.copytree(data_dir / "primer-schemes", root_dir)
+    db_path = tmp_path / "schemes.db"
+    assert db.index_schemes(root_dir, db_path, jobs=2)["indexed"] == 4
+    fields, rows = db.query(db_path, sequence="tttgtgctttttagcctttctgtt")
+    assert [(r[0], r[4]) for r in rows] == [
+        ("midnight-v2", "SARS-CoV-2_28_LEFT_27837T")
+    ]
+    fields, rows = db.query(db_path, reference_checksum="primaschema:7d5621cd3b3e498d")
+    assert fields[0] == "scheme" and len(rows) == 4
+    _, rows = db.query(db_path, pool=2, scheme_name="eden-v1", schemes_only=True)
+    assert rows == [("eden-v1", "eden/v1", "primaschema:9f9c80501b744d15", rows[0][3])]
+    shutil.rmtree(root_dir / "midnight/v1")
+    with open(root_dir / "eden/v1/info.yml", "a") as fh:
+        fh.write("display_name: Eden V1\n")
+    counts = db.index_schemes(root_dir, db_path)
+    assert counts == {"indexed": 1, "unchanged": 2, "removed": 1}
+    _, rows = db.query(db_path, schemes_only=True)
+    assert [r[0] for r in rows] == ["artic-v4.1", "eden-v1", "midnight-v2"]
+    run(f"primaschema query --db {db_path} --primer-name SARS2_A1F_31")
+
+
+def test_identify_scheme(tmp_path):
+    import gzip
+
+    from primaschema import identify
+
+    scheme_dir = data_dir / "primer-schemes/artic/v4.1"
+    with lib.Reference(scheme_dir / "reference.fasta") as ref:
+        reference = ref.sequence(ref.names[0]).decode()
+    ends = {r[3]: r[1:3] for r in lib.read_bed(scheme_dir / "primer.bed").records()}
+    reads = [
+        reference[start : ends[name[:-4] + "RIGHT"][1]]
+        for name, (start, _) in ends.items()
+        if name.endswith("_LEFT") and name[:-4] + "RIGHT" in ends
+    ]
+    with gzip.open(tmp_path / "reads.fastq.gz", "wt") as fh:
+        for i, read in enumerate(reads[::2]):
+            fh.write(f"@read{i}\n{read}\n+\n{'I' * len(read)}\n")
+    with open(tmp_path / "reads.fasta", "w") as fh:
+        for i, read in enumerate(reads[1::2]):
+            rc = identify.reverse_complement(read.encode()).decode()
+            fh.write(f">read{i}\n{rc[:60]}\n{rc[60:]}\nACGT\n")
+    read_paths = [tmp_path / "reads.fastq.gz", tmp_path / "reads.fasta"]
+    scores = identify.identify_scheme(
+        data_dir / "primer-schemes", read_paths, jobs=2, batch_size=10
+    )
+    assert scores[0]["scheme"] == "artic-v4.1"
+    assert scores[0]["reads"] == len(reads) and scores[0]["read_fraction"] == 1
+    assert scores[1]["primer_fraction"] < 0.5 < scores[0]["primer_fraction"]
+    whole_reads = identify.identify_scheme(
+        data_dir / "primer-schemes", read_paths, window=0
+    )
+    assert whole_reads[0]["primers_hit"] >= scores[0]["primers_hit"]
+    result = run(f"primaschema identify-scheme primer-schemes {read_paths[0]}")
+    assert result.stdout.splitlines()[1].startswith("artic-v4.1\t")
+
+
+def test_primer_index(tmp_path):
+    import numpy as np
+
+    from primaschema.intervals import PrimerIndex
+
+    shutil.copy(data_dir / "primer-schemes/artic/v4.1/scheme.bed", tmp_path)
+    bed_path = tmp_path / "scheme.bed"
+    index = PrimerIndex.cached(bed_path)
+    assert (tmp_path / "scheme.bed.npz").exists()
+    assert len(index.amplicon_names) == 99 and index.amplicon_names[0] == "SARS-CoV-2_1"
+    assert (index.amplicon_starts[0], index.amplicon_ends[0]) == (25, 431)
+    queries, primers = index.primers_overlapping([0, 400, 1000], [30, 420, 1001])
+    assert queries.tolist() == [0, 1]
+    assert list(index.primer_names[primers]) == [
+        "SARS-CoV-2_1_LEFT",
+        "SARS-CoV-2_1_RIGHT",
+    ]
+    starts, ends = np.array([30, 330, 50000]), np.array([420, 720, 50100])
+    assert index.assign_amplicons(starts, ends, "MN908947.3").tolist() == [0, 1, -1]
+    with pytest.raises(RuntimeError, match="Unknown chrom"):
+        index.assign_amplicons(starts, ends, "chr1")
+    cached = PrimerIndex.cached(bed_path)
+    assert np.array_equal(cached.primer_amplicons, index.primer_amplicons)
+    assert PrimerIndex.from_bed(data_dir / "primer-schemes/eden/v1/primer.bed")
+    assert index.primers_overlapping([40, 25], [40, 25])[0].size == 0  # Empty
+    (tmp_path / "pools.bed").write_text(
+        "chr1\t10\t30\tA_LEFT\t1\t+\tACGT\n"
+        "chr1\t5\t25\tA_LEFT_alt1\t2\t+\tACGT\n"
+        "chr1\t300\t320\tA_RIGHT\t2\t-\tACGT\n"
+    )
+    index = PrimerIndex.from_bed(tmp_path / "pools.bed")
+    assert (index.amplicon_starts.tolist(), index.amplicon_ends.tolist()) == (
+        [5],
+        [320],
+    )
+    assert index.amplicon_pools.tolist() == [1]
+    assert index.primer_amplicons.tolist() == [0, 0, 0]
+
+
+def test_serve(tmp_path, monkeypatch):
+    import json
+    import socket
+    import threading
+    import urllib.request
+
+    from primaschema import serve
+
+    root_dir = tmp_path / "schemes"
+    shutil.copytree(data_dir / "primer-schemes", root_dir)
+    service = serve.ValidationService(root_dir)
+    assert service.refresh() == ["artic/v4.1", "eden/v1", "midnight/v1", "midnight/v2"]
+    assert service.refresh() == []
+    server = serve.make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    with urllib.request.urlopen(f"{url}/schemes") as response:
+        summary = json.load(response)
+    assert summary["schemes"] == 4 and summary["failed"] == []
+
+    def fail(*args):
+        raise AssertionError("Checksum recomputed despite cache")
+
+    monkeypatch.setattr(lib, "hash_primer_table", fail)
+    monkeypatch.setattr(lib, "hash_reference", fail)
+    with open(root_dir / "eden/v1/info.yml", "a") as fh:
+        fh.write("# Revalidated, but with unchanged bed and reference\n")
+    with urllib.request.urlopen(f"{url}/schemes/eden/v1") as response:
+        result = json.load(response)
+    validated_at = summary["results"]["eden/v1"]["validated_at"]
+    assert result["error"] is None and result["validated_at"] > validated_at
+    monkeypatch.undo()
+    with open(root_dir / "eden/v1/primer.bed", "a") as fh:
+        fh.write("MN908947.3\t100\t120\tSARS2_X_100\t1\t+\tACGT\n")
+    with urllib.request.urlopen(f"{url}/schemes/eden/v1") as response:
+        result = json.load(response)
+    assert "primer checksums do not match" in result["error"]
+    with pytest.raises(urllib.error.HTTPError, match="404"):
+        urllib.request.urlopen(f"{url}/schemes/../../etc")
+    server.shutdown()
+    server.server_close()
+    socket_path = tmp_path / "serve.sock"
+    server = serve.make_server(service, socket_path=socket_path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with socket.socket(socket.AF_UNIX) as client:
+        client.connect(str(socket_path))
+        client.sendall(b"GET /schemes HTTP/1.0\r\n\r\n")
+        response = b"".join(iter(lambda: client.recv(65536), b""))
+    assert json.loads(response.split(b"\r\n\r\n", 1)[1])["failed"] == ["eden/v1"]
+    server.shutdown()
+    server.server_close()
+
+
+def test_metrics(tmp_path):
+    import json
+    import pstats
+
+    metrics_path, profile_path = tmp_path / "metrics.json", tmp_path / "run.prof"
+    run(
+        f"primaschema --metrics {metrics_path} validate-recursive primer-schemes "
+        f"--jobs 2 --full --state-file {tmp_path / 'state.json'} --profile {profile_path}"
+    )
+    report = json.loads(metrics_path.read_text())
+    assert report["argv"][0] == "validate-recursive"
+    assert report["stages"]["validate"]["calls"] == 4
+    assert report["stages"]["validate_with_linkml_schema"]["calls"] == 4
+    assert report["stages"]["cached_checksum"]["calls"] == 8
+    scheme_metrics = report["schemes"]["primer-schemes/eden/v1"]
+    assert scheme_metrics["stages"]["validate"]["calls"] == 1
+    assert scheme_metrics["peak_rss_kb"] > 0 and report["peak_rss_kb"] > 0
+    assert pstats.Stats(str(profile_path)).total_calls > 0
+
+
+def test_metrics_stage_memory(monkeypatch):
+    from primaschema import metrics
+
+    monkeypatch.setattr(metrics, "_enabled", True)
+    with metrics.collect_scheme() as scheme_metrics:
+        with metrics.stage("allocate"):
+            data = b"x" * (64 << 20)
+            del data
+        with metrics.stage("idle"):
+            pass
+    stages = scheme_metrics["stages"]
+    if metrics.current_rss_kb() is not None:
+        assert stages["allocate"]["rss_growth_kb"] > 32 << 10
+        assert stages["idle"]["rss_growth_kb"] < 32 << 10
+
+
+def test_batch_hashing():
+    import json
+
+    records = [
+        json.loads(line)
+        for line in run(
+            "primaschema hash-bed primer-schemes 'primer-schemes/*/v1/primer.bed' --jobs 2"
+        ).stdout.splitlines()
+    ]
+    paths = [r["path"] for r in records]
+    assert len(paths) == len(set(paths)) == 8
+    record = records[paths.index("primer-schemes/artic/v4.1/scheme.bed")]
+    assert record["type"] == "scheme" and record["error"] is None
+    assert record["checksum"] == "primaschema:9005b441227985c8"
+    records = run(
+        "primaschema hash-ref primer-schemes/eden/v1/reference.fasta --json"
+    ).stdout.splitlines()
+    assert json.loads(records[0])["checksum"] == "primaschema:7d5621cd3b3e498d"
+    records = list(lib.hash_paths("bed", [data_dir / "missing.bed"]))
+    assert records[0]["error"].startswith("FileNotFoundError")
+
+
+def test_compressed_inputs(tmp_path):
+    import gzip
+    import os
+
+    from Bio import bgzf
+
+    from primaschema import compression
+
+    scheme_dir = tmp_path / "eden-v1"
+    shutil.copytree(data_dir / "primer-schemes/eden/v1", scheme_dir)
+    with bgzf.BgzfWriter(scheme_dir / "reference.fasta.bgz", "wb") as fh:
+        fh.write((scheme_dir / "reference.fasta").read_bytes())
+    (scheme_dir / "reference.fasta").unlink()
+    for name in ("primer.bed", "scheme.bed"):
+        with gzip.open(scheme_dir / f"{name}.gz", "wb") as fh:
+            fh.write((scheme_dir / name).read_bytes())
+        (scheme_dir / name).unlink()
+    assert lib.hash_ref(scheme_dir / "reference.fasta.bgz") == (
+        "primaschema:7d5621cd3b3e498d"
+    )
+    assert lib.hash_bed(scheme_dir / "scheme.bed.gz") == "primaschema:9f9c80501b744d15"
+    lib.validate(scheme_dir)
+    lib.build(scheme_dir, nested=False)
+    assert (Path("built/eden-v1/reference.fasta").read_bytes()) == (
+        data_dir / "primer-schemes/eden/v1/reference.fasta"
+    ).read_bytes()
+    assert sorted(os.listdir("built/eden-v1")) == [
+        "info.yml",
+        "primer.bed",
+        "reference.fasta",
+        "scheme.bed",
+    ]
+    shutil.rmtree("built")
+
+    data = "".join(random.choices("ACGT\n", k=400000)).encode()
+    with bgzf.BgzfWriter(tmp_path / "random.bgz", "wb") as fh:
+        fh.write(data)
+    raw = (tmp_path / "random.bgz").read_bytes()
+    assert len(compression.bgzf_blocks(raw)) > 4
+    assert compression.read_bytes(tmp_path / "random.bgz", threads=4) == data
+    (tmp_path / "random.gz").write_bytes(gzip.compress(data))
+    assert compression.bgzf_blocks((tmp_path / "random.gz").read_bytes()) is None
+    assert compression.read_bytes(tmp_path / "random.gz") == data
+
+
+def test_tree_hash(tmp_path):
+    from primaschema import merkle
+
+    root_dir = tmp_path / "schemes"
+    shutil.copytree(data_dir / "primer-schemes", root_dir)
+    nodes_path = tmp_path / "nodes.json"
+    tree = merkle.tree_hash(root_dir, nodes_path=nodes_path, jobs=2)
+    assert tree.nodes["eden/v1"]["leaf"]["primer_checksum"] == (
+        "primaschema:9f9c80501b744d15"
+    )
+    assert tree.nodes["midnight"]["children"] == ["v1", "v2"]
+    mirror = merkle.MerkleTree.from_dir(data_dir / "primer-schemes")
+    assert mirror.digest == tree.digest and tree.compare(mirror) == []
+    shutil.rmtree(root_dir / "midnight/v1")
+    with open(root_dir / "eden/v1/info.yml", "a") as fh:
+        fh.write("display_name: Eden V1\n")
+    shutil.copytree(root_dir / "eden", root_dir / "eden2")
+    updated = merkle.tree_hash(root_dir, nodes_path=nodes_path)
+    assert updated.nodes["artic/v4.1"] == tree.nodes["artic/v4.1"]
+    assert tree.compare(updated) == [
+        ("changed", "eden/v1"),
+        ("added", "eden2/v1"),
+        ("removed", "midnight/v1"),
+    ]
+    assert merkle.MerkleTree.load(nodes_path).digest == updated.digest
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        run(f"primaschema tree-hash primer-schemes --compare {nodes_path}")
+    assert "added\teden2/v1" in e.value.stdout
+
+
+def test_qc(tmp_path):
+    from Bio.SeqUtils import MeltingTemp
+
+    from primaschema import qc
+
+    sequences = ["AACAAACCAACCAACTTTCGATCTC", "GGCGTTACCAAAAAATG", "ACGNT"]
+    tms = qc.melting_temperatures(sequences)
+    for sequence, tm in zip(sequences[:2], tms):
+        expected = MeltingTemp.Tm_NN(
+            sequence, nn_table=MeltingTemp.DNA_NN3, dnac1=25, dnac2=25, saltcorr=5
+        )
+        assert tm == pytest.approx(expected, abs=0.01)
+    assert qc.gc_fractions(sequences[:2]).tolist() == [10 / 25, 7 / 17]
+    assert qc.longest_homopolymer(sequences[1]) == 6
+    primer = "ACGTTGCAAGGCTTACCGATCCGGAATT"
+    partner = "TTTTTTTTTTAATTCCGGATCGGTTTT"
+    assert qc.screen_pool([primer, partner, "G" * 20]) == [(0, 1, 14, 10)]
+    df, dimers = qc.qc(data_dir / "primer-schemes/artic/v4.1", jobs=2)
+    assert len(df) == len(
+        lib.read_bed(data_dir / "primer-schemes/artic/v4.1/primer.bed")
+    )
+    assert df["tm"].between(50, 70).all() and df["gc"].between(0.2, 0.7).all()
+    assert (dimers["overlap"] >= 8).all()
+    run(f"primaschema qc primer-schemes/artic/v4.1 --out {tmp_path}/qc.tsv")
+    assert (tmp_path / "qc.tsv").read_text().startswith("chrom\t")
+
+
+def test_archive_export(tmp_path, monkeypatch):
+    from primaschema import archive
+
+    monkeypatch.chdir(tmp_path)
+    root_dir = (Path(__file__).parent / "data/primer-schemes").resolve()
+    lib.build_recursive(root_dir, nested=True, full=True)
+    manifest = archive.pack("built", "built.zip")
+    assert len(manifest["schemes"]) == 4
+    assert len(manifest["objects"]) < sum(map(len, manifest["schemes"].values()))
+    run("primaschema export --out compressed.zip --compress", cwd=tmp_path)
+    for archive_path in ["built.zip", "compressed.zip"]:
+        with archive.SchemeArchive(archive_path) as scheme_archive:
+            assert scheme_archive.schemes() == list(manifest["schemes"])
+            for scheme in scheme_archive.schemes():
+                for name in scheme_archive.files(scheme):
+                    data = (tmp_path / "built" / scheme / name).read_bytes()
+                    assert scheme_archive.read(scheme, name, verify=True) == data
+            assert scheme_archive.info("sars-cov-2/artic/v4.1")["name"] == "artic-v4.1"
+            with scheme_archive.open("sars-cov-2/eden/v1", "primer.bed") as fh:
+                assert fh.readline().startswith(b"MN908947.3\t")
+    with open("built.zip", "rb") as fh:
+        obj = manifest["objects"][manifest["schemes"]["sars-cov-2/eden/v1"]["info.yml"]]
+        fh.seek(obj["offset"])
+        assert (
+            fh.read(obj["size"])
+            == (tmp_path / "built/sars-cov-2/eden/v1/info.yml").read_bytes()
+        )